@@ -1,24 +1,41 @@
 import base64
+import csv
+import json
+import math
+import random
 import re
 import os
-from flask import Flask, request, jsonify
+import time
+import click
+from flask import Flask, Blueprint, current_app, request, jsonify
+from flask.cli import with_appcontext
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from google.cloud import vision
-from datetime import datetime, timedelta
+from sqlalchemy import event, inspect
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import threading
 import uuid
-import networkx as nx  
-
-# --- App Setup ---
-app = Flask(__name__)
-CORS(app)  # Allow your index.html (served from a different origin) to call this API
+from cache import Cache, make_backend, pack_rows, unpack_rows
+import fx
+import http_cache
+import scores
+import search
+from contacts import ContactResolver, backfill_contact_keys, contact_key_default
+from group_commit import GroupCommitWriter
+from shares import itemized_shares
+from serialization import make_json_provider, stream_export, stream_json_array, stream_json_object
 
 # --- Database Setup ---
+# The database is bound to an app inside create_app(), so importing this module
+# stays cheap and side-effect free (tests, CLI tools and workers import it).
 # We'll use SQLite for a simple, single-file database.
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'maxi.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+DEFAULT_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'maxi.db')
+db = SQLAlchemy()
+
+# All routes live on this blueprint and are attached to an app by create_app().
+api = Blueprint('api', __name__)
 
 # --- Hardcoded User for Demo ---
 # In a real app, this would come from a JWT token or session.
@@ -33,6 +50,7 @@ class User(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String(100), nullable=False)
     phone_number = db.Column(db.String(20), unique=True)
+    contact_key = db.Column(db.String(100), index=True, default=contact_key_default) # Normalized name (contacts.py)
     score = db.Column(db.Integer, default=97) # Add score from PRD
     
     # --- Pot Relationships ---
@@ -50,6 +68,9 @@ class Pot(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String(100), nullable=False)
     admin_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1) # Bumped on every write (HTTP ETags)
+    compacted_until = db.Column(db.DateTime) # Ledger before this is summed up in PotSnapshot rows
+    currency = db.Column(db.String(3), nullable=False, default=fx.BASE_CURRENCY) # Of balances and ledger amounts
     schedule = db.relationship('ScheduledContribution', backref='pot', uselist=False, lazy=True)
     members = db.relationship('User', secondary='pot_member', back_populates='pots')
     transactions = db.relationship('PotTransaction', backref='pot', lazy=True)
@@ -72,9 +93,36 @@ class PotTransaction(db.Model):
     user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
     type = db.Column(db.String(20), nullable=False) # "Contribution" or "Expense"
     description = db.Column(db.String(200), nullable=False)
-    amount = db.Column(db.Float, nullable=False) # Positive for "Contribution", Negative for "Expense"
+    amount = db.Column(db.Float, nullable=False) # Positive for "Contribution", Negative for "Expense"; pot currency
+    currency = db.Column(db.String(3)) # Paid in another currency than the pot's (None: the pot's)
+    original_amount = db.Column(db.Float) # ...and how much of it, before conversion
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    # Balances only scan a pot's tail (rows after its compacted_until)
+    __table_args__ = (db.Index('ix_pot_transaction_pot_date', 'pot_id', 'date'),)
+
+class PotSnapshot(db.Model):
+    """ One member's totals for one closed month of a pot's ledger (see compact_ledger) """
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    pot_id = db.Column(db.String(36), db.ForeignKey('pot.id'), nullable=False, index=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    period_start = db.Column(db.DateTime, nullable=False) # First day of the month
+    contributed = db.Column(db.Float, nullable=False, default=0) # Sum of "Contribution" amounts
+    net = db.Column(db.Float, nullable=False, default=0) # Sum of all amounts (contributions - expenses)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+
+class PotTransactionArchive(db.Model):
+    """ Raw PotTransaction rows moved out of the live ledger by compact_ledger(archive='table') """
+    id = db.Column(db.String(36), primary_key=True)
+    pot_id = db.Column(db.String(36), db.ForeignKey('pot.id'), nullable=False, index=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    type = db.Column(db.String(20), nullable=False)
+    description = db.Column(db.String(200), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3))
+    original_amount = db.Column(db.Float)
+    date = db.Column(db.DateTime, nullable=False)
+
 # --- NEW: Unified Request & Social Feed Models (PRD 3.3, 4.2, 5.2) ---
 class Request(db.Model):
     """ A unified table for both Invoices and Splits (PRD 2.1) """
@@ -84,8 +132,10 @@ class Request(db.Model):
     subtitle = db.Column(db.String(100)) # "INV-000-001" or "8 participants"
     creator_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
     total_amount = db.Column(db.Float, nullable=False, default=0)
+    currency = db.Column(db.String(3), nullable=False, default=fx.BASE_CURRENCY) # Settlement currency (totals, shares)
     status = db.Column(db.String(50), nullable=False, default='Pending') # Creator's status
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1) # Bumped on every write (HTTP ETags)
     
     # Invoice-specific fields (nullable)
     invoice_note = db.Column(db.Text) # "Next Steps" note (PRD 5.2)
@@ -105,13 +155,14 @@ class RequestParticipant(db.Model):
     """ Bridge table linking Users to Requests they are part of (PRD 4.2.2) """
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     request_id = db.Column(db.String(36), db.ForeignKey('request.id'), nullable=False)
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False, index=True)
     
     # Participant-specific status
     status = db.Column(db.String(50), nullable=False, default='Pending') # 'Pending', 'Promised', 'Paid', 'Disputed', 'Creditor'
     stage = db.Column(db.String(50), nullable=False, default='Delivered') # 'Delivered', 'Seen', 'Reacted'
     net_share = db.Column(db.Float, default=0) # Final calculated amount (PRD 4.2.1)
     fixed_split_amount = db.Column(db.Float, nullable=True) # NEW: Store the target amount if custom
+    paid_at = db.Column(db.DateTime, nullable=True) # When status became 'Paid' (trust scores)
 
 class RequestItem(db.Model):
     """ Line items for Invoices or Expenses for Splits """
@@ -119,6 +170,7 @@ class RequestItem(db.Model):
     request_id = db.Column(db.String(36), db.ForeignKey('request.id'), nullable=False)
     description = db.Column(db.String(200), nullable=False)
     amount = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3)) # Spent in another currency (None: the request's)
     
     # For splits: who paid for this item?
     paid_by_user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=True)
@@ -128,6 +180,15 @@ class RequestItem(db.Model):
     is_approved = db.Column(db.Boolean, default=False) 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Itemized splits: who shared this item (no rows = everyone, via the common pool)
+    shares = db.relationship('RequestItemShare', backref='item', lazy=True, cascade="all, delete-orphan")
+
+class RequestItemShare(db.Model):
+    """ One participant's part of an itemized split expense ("who ate what"), see shares.py """
+    item_id = db.Column(db.String(36), db.ForeignKey('request_item.id'), primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    weight = db.Column(db.Float, nullable=False, default=1) # Relative to the item's other sharers
+
 class Comment(db.Model):
     """ A single comment for the Social Feed (PRD 3.3) """
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -137,25 +198,133 @@ class Comment(db.Model):
     image_url = db.Column(db.String(200), nullable=True) # For photos/GIFs
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+class DataVersion(db.Model):
+    """ Version token of data without a version column of its own (see data_version) """
+    kind = db.Column(db.String(20), primary_key=True)
+    token = db.Column(db.String(32), nullable=False)
+
+class FxRate(db.Model):
+    """ Units of `currency` per euro from `effective_date` on (see fx.py) """
+    currency = db.Column(db.String(3), primary_key=True)
+    effective_date = db.Column(db.Date, primary_key=True)
+    rate = db.Column(db.Float, nullable=False)
+
+# Full-text index and its sync triggers are created/dropped with the tables (search.py).
+event.listen(db.metadata, 'after_create', search.create_index)
+event.listen(db.metadata, 'after_drop', search.drop_index)
+
+# --- Read Cache (see cache.py) ---
+def read_cache():
+    return current_app.extensions['cache']
+
+def data_version(kind):
+    """
+    Version token of `kind` ('users', 'fx'), for cache keys of data that has no
+    version column. It is a database row, so every worker and CLI process sees a bump once
+    it commits, and a rollback takes the bump back with the data.
+    """
+    return db.session.execute(db.select(DataVersion.token).where(DataVersion.kind == kind)).scalar() or '0'
+
+def bump_data_version(kind):
+    """
+    Moves `kind` to a new token, in the caller's transaction. Tokens are random, so
+    one is never reused: not after a rollback, nor after reset-db recreates the table.
+    """
+    token = uuid.uuid4().hex
+    if not db.session.execute(db.update(DataVersion).where(DataVersion.kind == kind).values(token=token)).rowcount:
+        db.session.execute(db.insert(DataVersion).values(kind=kind, token=token))
+
+def user_display(user_ids):
+    """ {user id: {'name', 'score'}} for the users that exist, cached per users version. """
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return {}
+    version = data_version('users')
+
+    def load(missing):
+        rows = db.session.execute(
+            db.select(User.id, User.name, User.score).where(User.id.in_([key[1] for key in missing])))
+        return {('user', row.id, version): {'name': row.name, 'score': row.score} for row in rows}
+
+    found = read_cache().fetch([('user', i, version) for i in user_ids], load)
+    return {key[1]: value for key, value in found.items()}
+
+def bump_version(model, obj_id):
+    """
+    Marks a Pot or Request as changed, invalidating cached copies (ETags).
+    Done in SQL (version = version + 1) so concurrent writers never lose a bump.
+    """
+    db.session.execute(db.update(model).where(model.id == obj_id).values(version=model.version + 1))
+
+# --- Exchange Rates (see fx.py) ---
+def fx_rates():
+    """
+    The FX rate table, loaded once per process and kept while the 'fx' data version
+    stays put. An import bumps it, so the next call in every process reloads.
+    """
+    version = data_version('fx')
+    loaded = current_app.extensions.get('fx_rates')
+    if loaded is None or loaded[0] != version:
+        rows = db.session.execute(db.select(FxRate.currency, FxRate.effective_date, FxRate.rate)).all()
+        loaded = current_app.extensions['fx_rates'] = (version, fx.RateTable(rows))
+    return loaded[1]
+
+def import_fx_rates(rows):
+    """
+    Stores (currency, effective_date, rate) rows, replacing the rate of any currency
+    and date already known: bulk insert / bulk update by primary key. Part of the
+    caller's transaction; returns the number of rows stored.
+    """
+    rows = [{'currency': currency, 'effective_date': effective_date, 'rate': rate}
+            for currency, effective_date, rate in rows]
+    known = {(currency, effective_date) for currency, effective_date in db.session.execute(
+        db.select(FxRate.currency, FxRate.effective_date).where(FxRate.currency.in_({row['currency'] for row in rows})))}
+    updates = [row for row in rows if (row['currency'], row['effective_date']) in known]
+    inserts = [row for row in rows if (row['currency'], row['effective_date']) not in known]
+    if inserts:
+        db.session.execute(db.insert(FxRate), inserts)
+    if updates:
+        db.session.execute(db.update(FxRate), updates)
+    bump_data_version('fx')
+    return len(rows)
+
+@api.errorhandler(fx.MissingRateError)
+def missing_rate(error):
+    return jsonify({'error': str(error)}), 422
+
 # --- SMART NETTING ALGORITHM (New Addition) ---
-def simplify_debts(transactions=None, input_balances=None):
+def simplify_debts(transactions=None, input_balances=None, currency=None, rates=None):
     """
     Simplifies debts using a Greedy Min-Cost Flow logic.
     
     You can pass EITHER:
     1. transactions: [{'payer': 'A', 'payee': 'B', 'amount': 10}, ...]
     2. input_balances: {'A': -10, 'B': 10} (Negative = Oves, Positive = Owed)
+
+    Multi-currency: with `rates` (an fx.RateTable) transactions may carry a
+    'currency' (default: `currency`). Each person's balance is kept per currency
+    and the whole vector is converted into `currency` in one step before matching.
     """
     balances = input_balances if input_balances else {}
 
     # If raw transactions provided, calculate net positions first
     if transactions:
-        for t in transactions:
-            payer = t['payer']
-            payee = t['payee']
-            amount = float(t['amount'])
-            balances[payer] = balances.get(payer, 0) - amount
-            balances[payee] = balances.get(payee, 0) + amount
+        if rates is not None:
+            currency = currency or fx.BASE_CURRENCY
+            per_currency = {(person, currency): amount for person, amount in balances.items()}
+            for t in transactions:
+                paid_in = t.get('currency') or currency
+                amount = float(t['amount'])
+                per_currency[t['payer'], paid_in] = per_currency.get((t['payer'], paid_in), 0) - amount
+                per_currency[t['payee'], paid_in] = per_currency.get((t['payee'], paid_in), 0) + amount
+            balances = rates.net(per_currency, currency)
+        else:
+            for t in transactions:
+                payer = t['payer']
+                payee = t['payee']
+                amount = float(t['amount'])
+                balances[payer] = balances.get(payer, 0) - amount
+                balances[payee] = balances.get(payee, 0) + amount
 
     # --- The Greedy Matching Algorithm ---
     debtors = []
@@ -202,171 +371,224 @@ def simplify_debts(transactions=None, input_balances=None):
     return simplified_transactions
 
 # --- Helper Function to Create DB and Seed Data ---
+class StaleSchemaError(Exception):
+    """ The database was created by an older version of the models (see missing_columns). """
+
+def missing_columns():
+    """
+    'table.column' for every model column that an existing table lacks. There are no
+    migrations: create_all only adds missing tables, never columns to existing ones.
+    """
+    inspector = inspect(db.engine)
+    existing = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name in existing:
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            missing += [f'{table.name}.{column.name}' for column in table.columns if column.name not in columns]
+    return missing
+
 def create_db_and_seed():
-    with app.app_context():
-        db.create_all()
+    """ Create the tables, fill contact keys older rows lack, and seed the demo data if empty. Needs an app context. """
+    db.create_all()
+    missing = missing_columns()
+    if missing:
+        raise StaleSchemaError(f"The database predates this version (missing {', '.join(missing)}). "
+                               "Recreate it with `flask --app app reset-db`.")
+    if backfill_contact_keys(db.session, User):
+        db.session.commit()
+
+    # Check if users already exist
+    if User.query.count() == 0:
+        print("Seeding database...")
+        # Create users
+        admin_user = User(id=CURRENT_USER_ID, name='You (Admin)', phone_number='+1111111111', score=97)
+        lisa = User(id=str(uuid.uuid4()), name='Lisa Thompson', phone_number='+2222222222', score=95)
+        kevin = User(id=str(uuid.uuid4()), name='Kevin (Guest)', phone_number='+3333333333', score=92)
+        james = User(id=str(uuid.uuid4()), name='James Park', phone_number='+4444444444', score=72)
         
-        # Check if users already exist
-        if User.query.count() == 0:
-            print("Seeding database...")
-            # Create users
-            admin_user = User(id=CURRENT_USER_ID, name='You (Admin)', phone_number='+1111111111', score=97)
-            lisa = User(id=str(uuid.uuid4()), name='Lisa Thompson', phone_number='+2222222222', score=95)
-            kevin = User(id=str(uuid.uuid4()), name='Kevin (Guest)', phone_number='+3333333333', score=92)
-            james = User(id=str(uuid.uuid4()), name='James Park', phone_number='+4444444444', score=72)
-            
-            # --- NEW: Seed Users from PDR ---
-            adidas_user = User(id=ADIDAS_USER_ID, name='Adidas', phone_number='+5555555555', score=98)
-            sarah_user = User(id=SARAH_USER_ID, name='Sarah Williams', phone_number='+6666666666', score=95)
-            mike_user = User(id=str(uuid.uuid4()), name='Mike Torres', phone_number='+7777777777', score=88)
-            
-            db.session.add_all([admin_user, lisa, kevin, james, adidas_user, sarah_user, mike_user])
-            db.session.commit() # Commit users so they can be referenced
-
-            # Create Pot 1: "FC Lions Team Fees" (PRD 4.3.4)
-            pot1 = Pot(id='pot-uuid-001', name='FC Lions Team Fees', admin_id=admin_user.id)
-            pot1.members.extend([admin_user, lisa, kevin, james])
-            db.session.add(pot1)
-            schedule1 = ScheduledContribution(pot_id=pot1.id, amount=20.00, frequency='Monthly', due_day=1)
-            db.session.add(schedule1)
-            t1_1 = PotTransaction(pot_id=pot1.id, user_id=admin_user.id, type='Contribution', description='Admin contributed', amount=20.00)
-            t1_2 = PotTransaction(pot_id=pot1.id, user_id=lisa.id, type='Contribution', description='Lisa contributed', amount=20.00)
-            t1_3 = PotTransaction(pot_id=pot1.id, user_id=kevin.id, type='Contribution', description='Kevin contributed', amount=10.00)
-            db.session.add_all([t1_1, t1_2, t1_3])
-            
-            # Create Pot 2: "Office Birthdays Q3" (PRD 4.3.4)
-            pot2 = Pot(id='pot-uuid-002', name='Office Birthdays Q3', admin_id=admin_user.id)
-            pot2.members.extend([admin_user, lisa, james])
-            db.session.add(pot2)
-            schedule2 = ScheduledContribution(pot_id=pot2.id, amount=10.00, frequency='One-Time', due_day=30)
-            db.session.add(schedule2)
-            t2_1 = PotTransaction(pot_id=pot2.id, user_id=admin_user.id, type='Contribution', description='Admin contributed', amount=10.00)
-            t2_2 = PotTransaction(pot_id=pot2.id, user_id=lisa.id, type='Contribution', description='Lisa contributed', amount=10.00)
-            t2_3 = PotTransaction(pot_id=pot2.id, user_id=james.id, type='Contribution', description='James contributed', amount=10.00)
-            t2_4 = PotTransaction(pot_id=pot2.id, user_id=admin_user.id, type='Expense', description="Spent on John's Gift", amount=-25.00)
-            db.session.add_all([t2_1, t2_2, t2_3, t2_4])
-            
-            # --- NEW: Seed Requests from PDR ---
-            
-            # 1. Adidas SME Invoice (PDR 8.1)
-            adidas_req = Request(
-                id='INV-MASTER-001',
-                type='invoice',
-                title='Client: You', # What Adidas sees
-                subtitle='INV-000-001',
-                creator_id=ADIDAS_USER_ID,
-                total_amount=3025.00,
-                status='Overdue',
-                invoice_vat_percent=21.0
-            )
-            db.session.add(adidas_req)
-            # Add participant (You)
-            adidas_participant = RequestParticipant(
-                request_id=adidas_req.id,
-                user_id=CURRENT_USER_ID,
-                status='Overdue',
-                stage='Seen',
-                net_share=-3025.00 # You owe this
-            )
-            db.session.add(adidas_participant)
-            # Add line items
-            adidas_item_1 = RequestItem(request_id=adidas_req.id, description='Consulting services', amount=2000.00, is_approved=True)
-            adidas_item_2 = RequestItem(request_id=adidas_req.id, description='Additional support', amount=500.00, is_approved=True)
-            db.session.add_all([adidas_item_1, adidas_item_2])
-            
-            # 2. Sarah's Social Split (PDR 8.1)
-            sarah_req = Request(
-                id='SPL-MASTER-001',
-                type='split',
-                title='Dinner at Sakura',
-                subtitle='3 participants',
-                creator_id=SARAH_USER_ID,
-                total_amount=750.00, # Only Sarah's expense is approved initially
-                status='1/3 Paid', # Creator's status
-                split_deadline=datetime.utcnow() + timedelta(days=2), # 2 day timer
-                photo_url='https://images.unsplash.com/photo-1551024601-bec78c92a26e?ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D&auto=format&fit=crop&w=800&q=80'
-            )
-            db.session.add(sarah_req)
-            # Add participants
-            sarah_participant_you = RequestParticipant(
-                request_id=sarah_req.id,
-                user_id=CURRENT_USER_ID,
-                status='Pending', # Your status
-                stage='Seen',
-                net_share=-250.00 # (750 / 3)
-            )
-            sarah_participant_mike = RequestParticipant(
-                request_id=sarah_req.id,
-                user_id=mike_user.id,
-                status='Paid',
-                stage='Reacted',
-                net_share=-250.00
-            )
-            sarah_participant_sarah = RequestParticipant(
-                request_id=sarah_req.id,
-                user_id=SARAH_USER_ID,
-                status='Creditor',
-                stage='Reacted',
-                net_share=500.00 # (750 paid - 250 share)
-            )
-            db.session.add_all([sarah_participant_you, sarah_participant_mike, sarah_participant_sarah])
-            # Add expenses
-            sarah_item_1 = RequestItem(request_id=sarah_req.id, description='Sushi dinner at Sakura', amount=750.00, paid_by_user_id=SARAH_USER_ID, is_approved=True)
-            # This one is NOT approved yet
-            sarah_item_2 = RequestItem(request_id=sarah_req.id, description='Uber ride (to & from)', amount=75.00, paid_by_user_id=mike_user.id, is_approved=False)
-            db.session.add_all([sarah_item_1, sarah_item_2])
-            
-            db.session.commit()
-            print("Database seeded!")
-
-def calculate_net_balances(request_id):
-    """
-    PRD 3.2.2: Smart Settlement Engine.
-    Returns: dict {'total': float, 'plan': list}
+        # --- NEW: Seed Users from PDR ---
+        adidas_user = User(id=ADIDAS_USER_ID, name='Adidas', phone_number='+5555555555', score=98)
+        sarah_user = User(id=SARAH_USER_ID, name='Sarah Williams', phone_number='+6666666666', score=95)
+        mike_user = User(id=str(uuid.uuid4()), name='Mike Torres', phone_number='+7777777777', score=88)
+        
+        db.session.add_all([admin_user, lisa, kevin, james, adidas_user, sarah_user, mike_user])
+        bump_data_version('users') # workers may still cache users of a dropped database
+        db.session.commit() # Commit users so they can be referenced
+
+        # Create Pot 1: "FC Lions Team Fees" (PRD 4.3.4)
+        pot1 = Pot(id='pot-uuid-001', name='FC Lions Team Fees', admin_id=admin_user.id)
+        pot1.members.extend([admin_user, lisa, kevin, james])
+        db.session.add(pot1)
+        schedule1 = ScheduledContribution(pot_id=pot1.id, amount=20.00, frequency='Monthly', due_day=1)
+        db.session.add(schedule1)
+        t1_1 = PotTransaction(pot_id=pot1.id, user_id=admin_user.id, type='Contribution', description='Admin contributed', amount=20.00)
+        t1_2 = PotTransaction(pot_id=pot1.id, user_id=lisa.id, type='Contribution', description='Lisa contributed', amount=20.00)
+        t1_3 = PotTransaction(pot_id=pot1.id, user_id=kevin.id, type='Contribution', description='Kevin contributed', amount=10.00)
+        db.session.add_all([t1_1, t1_2, t1_3])
+        
+        # Create Pot 2: "Office Birthdays Q3" (PRD 4.3.4)
+        pot2 = Pot(id='pot-uuid-002', name='Office Birthdays Q3', admin_id=admin_user.id)
+        pot2.members.extend([admin_user, lisa, james])
+        db.session.add(pot2)
+        schedule2 = ScheduledContribution(pot_id=pot2.id, amount=10.00, frequency='One-Time', due_day=30)
+        db.session.add(schedule2)
+        t2_1 = PotTransaction(pot_id=pot2.id, user_id=admin_user.id, type='Contribution', description='Admin contributed', amount=10.00)
+        t2_2 = PotTransaction(pot_id=pot2.id, user_id=lisa.id, type='Contribution', description='Lisa contributed', amount=10.00)
+        t2_3 = PotTransaction(pot_id=pot2.id, user_id=james.id, type='Contribution', description='James contributed', amount=10.00)
+        t2_4 = PotTransaction(pot_id=pot2.id, user_id=admin_user.id, type='Expense', description="Spent on John's Gift", amount=-25.00)
+        db.session.add_all([t2_1, t2_2, t2_3, t2_4])
+        
+        # --- NEW: Seed Requests from PDR ---
+        
+        # 1. Adidas SME Invoice (PDR 8.1)
+        adidas_req = Request(
+            id='INV-MASTER-001',
+            type='invoice',
+            title='Client: You', # What Adidas sees
+            subtitle='INV-000-001',
+            creator_id=ADIDAS_USER_ID,
+            total_amount=3025.00,
+            status='Overdue',
+            invoice_vat_percent=21.0
+        )
+        db.session.add(adidas_req)
+        # Add participant (You)
+        adidas_participant = RequestParticipant(
+            request_id=adidas_req.id,
+            user_id=CURRENT_USER_ID,
+            status='Overdue',
+            stage='Seen',
+            net_share=-3025.00 # You owe this
+        )
+        db.session.add(adidas_participant)
+        # Add line items
+        adidas_item_1 = RequestItem(request_id=adidas_req.id, description='Consulting services', amount=2000.00, is_approved=True)
+        adidas_item_2 = RequestItem(request_id=adidas_req.id, description='Additional support', amount=500.00, is_approved=True)
+        db.session.add_all([adidas_item_1, adidas_item_2])
+        
+        # 2. Sarah's Social Split (PDR 8.1)
+        sarah_req = Request(
+            id='SPL-MASTER-001',
+            type='split',
+            title='Dinner at Sakura',
+            subtitle='3 participants',
+            creator_id=SARAH_USER_ID,
+            total_amount=750.00, # Only Sarah's expense is approved initially
+            status='1/3 Paid', # Creator's status
+            split_deadline=datetime.utcnow() + timedelta(days=2), # 2 day timer
+            photo_url='https://images.unsplash.com/photo-1551024601-bec78c92a26e?ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D&auto=format&fit=crop&w=800&q=80'
+        )
+        db.session.add(sarah_req)
+        # Add participants
+        sarah_participant_you = RequestParticipant(
+            request_id=sarah_req.id,
+            user_id=CURRENT_USER_ID,
+            status='Pending', # Your status
+            stage='Seen',
+            net_share=-250.00 # (750 / 3)
+        )
+        sarah_participant_mike = RequestParticipant(
+            request_id=sarah_req.id,
+            user_id=mike_user.id,
+            status='Paid',
+            stage='Reacted',
+            net_share=-250.00,
+            paid_at=datetime.utcnow()
+        )
+        sarah_participant_sarah = RequestParticipant(
+            request_id=sarah_req.id,
+            user_id=SARAH_USER_ID,
+            status='Creditor',
+            stage='Reacted',
+            net_share=500.00 # (750 paid - 250 share)
+        )
+        db.session.add_all([sarah_participant_you, sarah_participant_mike, sarah_participant_sarah])
+        # Add expenses
+        sarah_item_1 = RequestItem(request_id=sarah_req.id, description='Sushi dinner at Sakura', amount=750.00, paid_by_user_id=SARAH_USER_ID, is_approved=True)
+        # This one is NOT approved yet
+        sarah_item_2 = RequestItem(request_id=sarah_req.id, description='Uber ride (to & from)', amount=75.00, paid_by_user_id=mike_user.id, is_approved=False)
+        db.session.add_all([sarah_item_1, sarah_item_2])
+
+        # Exchange rates (units per euro) for travellers' expenses, see fx.py
+        db.session.add_all([FxRate(currency=currency, effective_date=date(2025, 1, 1), rate=rate)
+                            for currency, rate in [('USD', 1.08), ('GBP', 0.85), ('CHF', 0.94), ('JPY', 162.0)]])
+        bump_data_version('fx')
+        
+        db.session.commit()
+        print("Database seeded!")
+
+class StaleWriteError(Exception):
+    """ A compare-and-swap write kept losing to concurrent writers (see claim_version). """
+
+SETTLEMENT_MAX_ATTEMPTS = 20
+SETTLEMENT_MAX_BACKOFF = 0.05 # seconds
+
+def claim_version(model, obj_id, expected_version, **values):
     """
-    req = Request.query.get(request_id)
-    if not req:
-        return {'total': 0.0, 'plan': []}
+    Compare-and-swap on a Pot or Request: applies `values` and bumps the version only
+    if nobody else has written since `expected_version` was read. Returns False when
+    the row moved on; the caller should roll back, re-read and try again.
+    """
+    result = db.session.execute(
+        db.update(model)
+        .where(model.id == obj_id, model.version == expected_version)
+        .values(version=model.version + 1, **values)
+    )
+    return result.rowcount == 1
+
+def compute_settlement(items, participants, assignments=()):
+    """
+    PRD 3.2.2: Smart Settlement Engine, pure core. Reads nothing, writes nothing.
+
+    items: approved items, each with .id, .amount, .paid_by_user_id
+    participants: each with .id, .user_id, .status, .fixed_split_amount
+    assignments: (item_id, user_id, weight) for itemized items (see shares.py)
 
-    # 1. Load Data
-    items = RequestItem.query.filter_by(request_id=request_id, is_approved=True).all()
-    participants = RequestParticipant.query.filter_by(request_id=request_id).all()
+    Returns {'total', 'net_shares': {user_id: net}, 'participants': [{'id', 'user_id',
+    'net_share', 'status'}], 'status', 'subtitle', 'plan': [{'from', 'to', 'amount'}] by
+    user id}. 'status' and 'subtitle' are None for a split without participants.
+    """
     participant_count = len(participants)
     
-    # 2. Calculate Total Group Spend
+    # 1. Calculate Total Group Spend
     total_spend = sum(item.amount for item in items)
-    req.total_amount = total_spend 
     
     if participant_count == 0:
-        db.session.commit()
-        return {'total': total_spend, 'plan': []}
+        return {'total': total_spend, 'net_shares': {}, 'participants': [], 'status': None, 'subtitle': None, 'plan': []}
 
-    # 3. Calculate "Who Paid What"
+    # 2. Calculate "Who Paid What"
     paid_balances = {p.user_id: 0.0 for p in participants}
     for item in items:
         if item.paid_by_user_id:
             paid_balances[item.paid_by_user_id] = paid_balances.get(item.paid_by_user_id, 0) + item.amount
 
-    # 4. Calculate "Who Should Pay What" (Expected Share)
-    expected_balances = {p.user_id: 0.0 for p in participants}
+    # 3. Calculate "Who Should Pay What" (Expected Share)
+    # Itemized items go to the people who shared them (matrix, see shares.py);
+    # everything else is the common pool, split by fixed amounts and then equally.
+    itemized, itemized_total = {}, 0.0
+    if assignments:
+        itemized, itemized_total = itemized_shares(
+            {item.id: item.amount for item in items}, assignments, [p.user_id for p in participants])
+
+    expected_balances = {p.user_id: itemized.get(p.user_id, 0.0) for p in participants}
     
     fixed_split_users = [p for p in participants if p.fixed_split_amount is not None]
     equal_split_users = [p for p in participants if p.fixed_split_amount is None]
     
     total_fixed_amount = sum(p.fixed_split_amount for p in fixed_split_users)
-    remaining_for_equal = total_spend - total_fixed_amount
+    remaining_for_equal = total_spend - itemized_total - total_fixed_amount
     
     for p in participants:
         if p.fixed_split_amount is not None:
-            expected_balances[p.user_id] = p.fixed_split_amount
+            expected_balances[p.user_id] += p.fixed_split_amount
         else:
             if len(equal_split_users) > 0:
-                expected_balances[p.user_id] = remaining_for_equal / len(equal_split_users)
-            else:
-                expected_balances[p.user_id] = 0
+                expected_balances[p.user_id] += remaining_for_equal / len(equal_split_users)
 
-    # 5. Calculate Net Position & Update DB
+    # 4. Calculate Net Position
     net_positions = {}
+    participant_results = []
     paid_count = 0
     
     for p in participants:
@@ -374,50 +596,524 @@ def calculate_net_balances(request_id):
         expected = expected_balances.get(p.user_id, 0)
         net = paid - expected
         
-        p.net_share = net
         net_positions[p.user_id] = net
+        status = p.status
 
-        if p.status == 'Paid':
+        if status == 'Paid':
             paid_count += 1
         elif net > 0.01:
-            p.status = "Creditor"
+            status = "Creditor"
             paid_count += 1
         elif net < -0.01:
-             if p.status not in ['Paid', 'Promised']:
-                p.status = 'Pending'
+             if status not in ['Paid', 'Promised']:
+                status = 'Pending'
         else:
-            p.status = 'Settled'
+            status = 'Settled'
             paid_count += 1
+        participant_results.append({'id': p.id, 'user_id': p.user_id, 'net_share': net, 'status': status})
+
+    # 5. Run Smart Netting
+    return {
+        'total': total_spend,
+        'net_shares': net_positions,
+        'participants': participant_results,
+        'status': f"{paid_count}/{participant_count} Paid",
+        'subtitle': f"{participant_count} participants",
+        'plan': simplify_debts(input_balances=net_positions)
+    }
+
+SettlementItem = namedtuple('SettlementItem', 'id amount paid_by_user_id currency created_at')
+
+def in_settlement_currency(items, currency):
+    """
+    `items` with every amount in the request's settlement `currency`. Items spent in
+    other currencies are converted all at once (fx.py), each at the rate in effect
+    when it was added (created_at; None, for previewed items, means today), so a
+    settlement only changes when its own items do. The rate table is only consulted
+    when there are any.
+    """
+    if all(item.currency in (None, currency) for item in items):
+        return items
+    amounts = fx_rates().convert([item.amount for item in items], [item.currency or currency for item in items],
+                                 currency, on=[item.created_at for item in items])
+    return [SettlementItem(item.id, amount, item.paid_by_user_id, currency, item.created_at)
+            for item, amount in zip(items, amounts.tolist())]
+
+def load_settlement_inputs(request_id, approved_only=True):
+    """
+    (version, currency, items, participants, assignments) of a request as plain rows;
+    None if it doesn't exist. Item amounts are as entered (see in_settlement_currency).
+    With approved_only=False pending items (and their shares) are included too, for
+    previews that approve them hypothetically.
+    """
+    head = db.session.execute(db.select(Request.version, Request.currency).where(Request.id == request_id)).first()
+    if head is None:
+        return None
+    version, currency = head
+    approved = RequestItem.is_approved.is_(True) if approved_only else db.true()
+    items = db.session.execute(
+        db.select(RequestItem.id, RequestItem.amount, RequestItem.paid_by_user_id, RequestItem.currency,
+                  RequestItem.created_at, RequestItem.is_approved)
+        .where(RequestItem.request_id == request_id, approved)
+    ).all()
+    participants = db.session.execute(
+        db.select(RequestParticipant.id, RequestParticipant.user_id, RequestParticipant.status,
+                  RequestParticipant.fixed_split_amount)
+        .where(RequestParticipant.request_id == request_id)
+    ).all()
+    assignments = db.session.execute(
+        db.select(RequestItemShare.item_id, RequestItemShare.user_id, RequestItemShare.weight)
+        .join(RequestItem).where(RequestItem.request_id == request_id, approved)
+    ).all()
+    return version, currency, items, participants, assignments
+
+def persist_settlement(request_id, version, settlement):
+    """
+    Writes a compute_settlement result computed from `version` of the request.
+    Returns False (nothing written) if the request has moved on since; see claim_version.
+    """
+    values = {'total_amount': settlement['total']}
+    if settlement['status'] is not None:
+        values.update(status=settlement['status'], subtitle=settlement['subtitle'])
+    if not claim_version(Request, request_id, version, **values):
+        return False
+    if settlement['participants']:
+        # Bulk UPDATE by primary key, one executemany for every participant
+        db.session.execute(db.update(RequestParticipant), [
+            {'id': p['id'], 'net_share': p['net_share'], 'status': p['status']}
+            for p in settlement['participants']
+        ])
+    return True
+
+def named_plan(plan):
+    """ Adds sender/receiver names to a raw (user id) settlement plan (cached, see user_display). """
+    users = user_display({tx['from'] for tx in plan} | {tx['to'] for tx in plan})
+    names = {user_id: user['name'] for user_id, user in users.items()}
+    return [{
+        'from': names[tx['from']],
+        'to': names[tx['to']],
+        'amount': tx['amount'],
+        'from_id': tx['from'],
+        'to_id': tx['to']
+    } for tx in plan if tx['from'] in names and tx['to'] in names]
+
+def calculate_net_balances(request_id, approve=()):
+    """
+    Smart Settlement Engine: computes the settlement of a request and stores it.
+    Returns: dict {'total': float, 'plan': list}
+
+    Optimistic concurrency: the settlement is computed from one version of the
+    request and only written back if that version is still current. A concurrent
+    write (another approval, a new expense...) makes the claim fail, and the whole
+    calculation is redone on fresh data, so no update is ever silently lost.
+    Settlements of different requests never wait on each other.
 
-    # 6. Run Smart Netting
-    settlement_plan_raw = simplify_debts(input_balances=net_positions)
+    approve: item ids to approve in the same transaction as the settlement. A lost
+    claim rolls the approval back with it, so StaleWriteError (409) means nothing
+    was stored and the client can simply retry.
+    """
+    for attempt in range(SETTLEMENT_MAX_ATTEMPTS):
+        settled = _settle_once(request_id, approve)
+        if settled is not None:
+            return settled
+        db.session.rollback()
+        # Jittered exponential back-off so the racers spread out
+        time.sleep(random.uniform(0, min(SETTLEMENT_MAX_BACKOFF, 0.001 * 2 ** attempt)))
+    raise StaleWriteError(f"Request {request_id} kept changing during settlement")
+
+def _settle_once(request_id, approve=()):
+    """ One settlement attempt; None if the request changed before it could be written. """
+    if approve:
+        # The claim below bumps the version, which covers the approval too
+        db.session.execute(db.update(RequestItem).where(RequestItem.id.in_(approve)).values(is_approved=True))
+    inputs = load_settlement_inputs(request_id)
+    if inputs is None:
+        return {'total': 0.0, 'plan': []}
+    version, currency, items, participants, assignments = inputs
 
-    req.status = f"{paid_count}/{participant_count} Paid"
-    req.subtitle = f"{participant_count} participants"
+    settlement = compute_settlement(in_settlement_currency(items, currency), participants, assignments)
+    if not persist_settlement(request_id, version, settlement):
+        return None
+    previous = {p.id: p.status for p in participants}
+    refresh_scores({p['user_id'] for p in settlement['participants'] if p['status'] != previous[p['id']]})
     db.session.commit()
-    
-    # 7. Map IDs to Names
-    final_plan = []
-    for tx in settlement_plan_raw:
-        sender = User.query.get(tx['from'])
-        receiver = User.query.get(tx['to'])
-        if sender and receiver:
-            final_plan.append({
-                'from': sender.name,
-                'to': receiver.name,
-                'amount': tx['amount'],
-                'from_id': tx['from'],
-                'to_id': tx['to']
-            })
 
-    # RETURN BOTH TOTAL AND PLAN
     return {
-        'total': total_spend,
-        'plan': final_plan
+        'total': settlement['total'],
+        'plan': named_plan(settlement['plan'])
+    }
+
+@api.errorhandler(StaleWriteError)
+def stale_write(error):
+    """ Every retry lost the race: tell the client to try again rather than guess. """
+    return jsonify({'error': str(error)}), 409
+
+# --- Trust Scores (see scores.py) ---
+SCORE_BATCH_SIZE = 50000
+
+def participation_history_query(user_ids=None):
+    stmt = db.select(
+        RequestParticipant.user_id, RequestParticipant.status,
+        Request.created_at, Request.split_deadline, RequestParticipant.paid_at
+    ).join(Request, Request.id == RequestParticipant.request_id)
+    if user_ids is not None:
+        stmt = stmt.where(RequestParticipant.user_id.in_(user_ids))
+    return stmt
+
+def refresh_scores(user_ids=None, now=None):
+    """
+    Recomputes User.score from payment history, for `user_ids` or (None) everybody.
+    Reads the history in yield_per chunks and writes only the scores that changed,
+    as bulk updates by primary key. Part of the caller's transaction; returns the
+    number of users updated.
+    """
+    if user_ids is not None and not user_ids:
+        return 0
+    accumulator = scores.ScoreAccumulator(now or datetime.utcnow())
+    result = db.session.execute(participation_history_query(user_ids).execution_options(yield_per=SCORE_BATCH_SIZE))
+    for chunk in result.partitions():
+        accumulator.add(chunk)
+    fresh = accumulator.scores()
+
+    current = db.select(User.id, User.score)
+    if user_ids is not None:
+        current = current.where(User.id.in_(fresh))
+    changed = [{'id': user_id, 'score': fresh[user_id]} for user_id, score in db.session.execute(current)
+               if user_id in fresh and fresh[user_id] != score]
+    for start in range(0, len(changed), SCORE_BATCH_SIZE):
+        db.session.execute(db.update(User), changed[start:start + SCORE_BATCH_SIZE])
+    if changed:
+        bump_data_version('users')
+    return len(changed)
+
+# --- Read Queries (shared by the WSGI routes, streamed responses and asgi.py) ---
+# Each read endpoint selects plain columns (joined with the names it needs, so no
+# per-row lazy loads) and maps rows to dicts one at a time. The regular response
+# collects them into a list; ?stream=1 writes them straight to the client. The
+# async serving mode (asgi.py) runs the very same statements on an async engine.
+STREAM_BATCH_SIZE = 500
+
+def wants_stream():
+    """ Large collection endpoints stream their list when called with ?stream=1 """
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+def iter_rows(stmt, mapper):
+    """ Runs `stmt` in batches (server-side cursor) and yields mapper(row) for each row. """
+    result = db.session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+    for row in result:
+        yield mapper(row)
+
+def deadline_fields(deadline, now):
+    return {
+        'isConsolidating': deadline > now if deadline else False,
+        'deadline': deadline.isoformat() if deadline else None
+    }
+
+def sent_requests_query(user_id):
+    return db.select(
+        Request.id, Request.type, Request.title, Request.subtitle,
+        Request.total_amount, Request.currency, Request.status, Request.split_deadline
+    ).where(Request.creator_id == user_id)
+
+def sent_request_entry(row, now):
+    status_color = 'text-orange-400' # default
+    if row.type == 'invoice':
+        if 'Overdue' in row.status:
+            status_color = 'text-red-500'
+        elif 'Paid' in row.status:
+            status_color = 'text-lime-400'
+    elif row.type == 'split':
+        if 'Paid' in row.status:
+            status_color = 'text-lime-400'
+        elif 'Consolidating' in row.status:
+            status_color = 'text-blue-400'
+    return {
+        'id': row.id,
+        'type': row.type,
+        'title': row.title,
+        'subtitle': row.subtitle,
+        'amount': row.total_amount,
+        'currency': row.currency,
+        'status': row.status,
+        'statusColor': status_color,
+        **deadline_fields(row.split_deadline, now)
+    }
+
+def received_requests_query(user_id):
+    return db.select(
+        Request.id, Request.type, Request.title, Request.split_deadline, Request.photo_url, Request.currency,
+        RequestParticipant.status, RequestParticipant.net_share,
+        User.name.label('creator_name'), User.score.label('creator_score')
+    ).join(Request, RequestParticipant.request_id == Request.id
+    ).join(User, Request.creator_id == User.id
+    ).where(RequestParticipant.user_id == user_id)
+
+def received_request_entry(row, now):
+    page = ''
+    req_type = None
+    if row.type == 'invoice':
+        page = 'page-sme-invoice'
+        req_type = 'sme'
+    elif row.type == 'split':
+        page = 'page-social-split'
+        req_type = 'social'
+    return {
+        'id': row.id,
+        'type': req_type,
+        'title': f"{row.creator_score}% {row.creator_name}", # e.g., "98% Adidas"
+        'subtitle': row.title,
+        'page': page,
+        'amount': abs(row.net_share), # Show the participant's net share
+        'currency': row.currency,
+        'status': row.status, # Use the participant's specific status
+        **deadline_fields(row.split_deadline, now),
+        'photo': row.photo_url
+    }
+
+def sent_versions_query(user_id, now):
+    return db.select(Request.id, Request.version, Request.split_deadline > now
+    ).where(Request.creator_id == user_id).order_by(Request.id)
+
+def received_versions_query(user_id, now):
+    return db.select(Request.id, Request.version, Request.split_deadline > now, User.score
+    ).join(RequestParticipant, RequestParticipant.request_id == Request.id
+    ).join(User, Request.creator_id == User.id
+    ).where(RequestParticipant.user_id == user_id).order_by(Request.id)
+
+def list_etag(kind, user_id, versions):
+    return http_cache.etag_for(kind, user_id, *(tuple(v) for v in versions))
+
+# Pots
+def pot_versions_query(user_id):
+    return db.select(Pot.id, Pot.version).where(Pot.id.in_(
+        db.select(pot_member.c.pot_id).where(pot_member.c.user_id == user_id)
+    )).order_by(Pot.id)
+
+LEDGER_EPOCH = datetime(1970, 1, 1)
+
+def ledger_tail(pot_id_column, compacted_until_column):
+    """ The live PotTransaction rows of a pot that its snapshots don't cover yet. """
+    return db.and_(
+        PotTransaction.pot_id == pot_id_column,
+        PotTransaction.date >= db.func.coalesce(compacted_until_column, LEDGER_EPOCH)
+    )
+
+def pot_balance_column(pot_id_column, compacted_until_column):
+    """ Balance = closed periods (PotSnapshot) + the live tail, so cost tracks recent activity. """
+    snapshots = db.select(db.func.coalesce(db.func.sum(PotSnapshot.net), 0.0)
+    ).where(PotSnapshot.pot_id == pot_id_column).scalar_subquery()
+    tail = db.select(db.func.coalesce(db.func.sum(PotTransaction.amount), 0.0)
+    ).where(ledger_tail(pot_id_column, compacted_until_column)).scalar_subquery()
+    return snapshots + tail
+
+def pot_balances_query(pot_ids):
+    """ (pot id, balance) for several pots at once (used by the group-commit writer). """
+    return db.select(Pot.id, pot_balance_column(Pot.id, Pot.compacted_until)).where(Pot.id.in_(pot_ids))
+
+def pot_summary_select():
+    member_count = db.select(db.func.count()).select_from(pot_member
+    ).where(pot_member.c.pot_id == Pot.id).scalar_subquery()
+    return db.select(
+        Pot.id, Pot.name, Pot.currency,
+        pot_balance_column(Pot.id, Pot.compacted_until).label('total_balance'),
+        member_count.label('member_count')
+    ).order_by(Pot.id)
+
+def pots_summary_query(user_id):
+    return pot_summary_select().where(Pot.id.in_(
+        db.select(pot_member.c.pot_id).where(pot_member.c.user_id == user_id)
+    ))
+
+def pot_summaries_query(pot_ids):
+    return pot_summary_select().where(Pot.id.in_(pot_ids))
+
+def pot_summary_entry(row):
+    return {
+        'id': row.id,
+        'name': row.name,
+        'totalBalance': row.total_balance,
+        'currency': row.currency,
+        'memberCount': row.member_count
+    }
+
+def pot_query(pot_id):
+    return db.select(Pot.id, Pot.name, Pot.admin_id, Pot.version, Pot.currency).where(Pot.id == pot_id)
+
+def pot_etag(pot, user_id):
+    return http_cache.etag_for('pot', pot.id, pot.version, user_id)
+
+def pot_balance_query(pot_id):
+    return db.select(pot_balance_column(Pot.id, Pot.compacted_until)).where(Pot.id == pot_id)
+
+def schedule_query(pot_id):
+    return db.select(
+        ScheduledContribution.amount, ScheduledContribution.frequency, ScheduledContribution.due_day
+    ).where(ScheduledContribution.pot_id == pot_id)
+
+def schedule_entry(row):
+    return {
+        'amount': row.amount,
+        'frequency': row.frequency,
+        'due_day': row.due_day,
+        'nextDueDate': '2025-12-01T00:00:00Z' # TODO: Calculate this
+    } if row else None
+
+def pot_tally_query(pot_id):
+    """ Contributions per member: snapshot totals plus the live tail (members with none get 0). """
+    snapshots = db.select(db.func.coalesce(db.func.sum(PotSnapshot.contributed), 0.0)
+    ).where(PotSnapshot.pot_id == Pot.id, PotSnapshot.user_id == User.id).scalar_subquery()
+    tail = db.select(db.func.coalesce(db.func.sum(PotTransaction.amount), 0.0)
+    ).where(
+        ledger_tail(Pot.id, Pot.compacted_until),
+        PotTransaction.user_id == User.id,
+        PotTransaction.type == 'Contribution'
+    ).scalar_subquery()
+    return db.select(
+        User.id, User.name, (snapshots + tail).label('total_paid')
+    ).select_from(pot_member
+    ).join(User, User.id == pot_member.c.user_id
+    ).join(Pot, Pot.id == pot_member.c.pot_id
+    ).where(pot_member.c.pot_id == pot_id
+    ).order_by(User.id)
+
+def tally_entry(row):
+    return {
+        'user_id': row.id,
+        'name': row.name,
+        'total_paid': row.total_paid
+    }
+
+def pot_details_head(pot, total_balance, schedule_data, tally_data, user_id):
+    """ Everything in the pot dashboard except the (possibly streamed) transactionFeed. """
+    return {
+        'id': pot.id,
+        'name': pot.name,
+        'admin_id': pot.admin_id,
+        'is_admin': pot.admin_id == user_id, # Helper for UI
+        'totalBalance': total_balance,
+        'currency': pot.currency, # Of the balance, the tally and every feed amount
+        'schedule': schedule_data,
+        'contributionTally': tally_data
+    }
+
+def pot_feed_query(pot_id):
+    return db.select(
+        PotTransaction.id, PotTransaction.type, PotTransaction.description,
+        PotTransaction.amount, PotTransaction.currency, PotTransaction.original_amount,
+        PotTransaction.date, User.name.label('user_name')
+    ).join(User, PotTransaction.user_id == User.id
+    ).where(PotTransaction.pot_id == pot_id
+    ).order_by(PotTransaction.date.desc())
+
+def pot_feed_entry(row):
+    return {
+        'id': row.id,
+        'type': row.type,
+        'description': row.description,
+        'amount': row.amount,
+        'originalCurrency': row.currency, # None unless paid in another currency
+        'originalAmount': row.original_amount,
+        'user_name': row.user_name,
+        'date': row.date.isoformat()
+    }
+
+def comments_query(request_id):
+    return db.select(
+        Comment.id, Comment.text_content, Comment.image_url, Comment.created_at,
+        User.name.label('user_name')
+    ).join(User, Comment.user_id == User.id
+    ).where(Comment.request_id == request_id
+    ).order_by(Comment.created_at.asc())
+
+def comment_entry(row):
+    return {
+        'id': row.id,
+        'text': row.text_content,
+        'image_url': row.image_url,
+        'user_name': row.user_name,
+        'created_at': row.created_at.isoformat()
+    }
+
+# Request details
+def request_query(request_id):
+    return db.select(
+        Request.id, Request.type, Request.title, Request.subtitle, Request.total_amount, Request.currency,
+        Request.status, Request.photo_url, Request.invoice_note, Request.invoice_vat_percent,
+        Request.split_deadline, Request.version,
+        User.name.label('creator_name'), User.score.label('creator_score')
+    ).join(User, Request.creator_id == User.id).where(Request.id == request_id)
+
+def request_etag(req, user_id, now):
+    consolidating = req.split_deadline > now if req.split_deadline else False
+    return http_cache.etag_for('request', req.id, req.version, consolidating, req.creator_score, user_id)
+
+def request_items_query(request_id):
+    return db.select(
+        RequestItem.id, RequestItem.description, RequestItem.amount, RequestItem.is_approved,
+        db.func.coalesce(RequestItem.currency, Request.currency).label('currency'),
+        User.name.label('paid_by_name')
+    ).join(Request, RequestItem.request_id == Request.id
+    ).outerjoin(User, RequestItem.paid_by_user_id == User.id
+    ).where(RequestItem.request_id == request_id
+    ).order_by(RequestItem.created_at.asc())
+
+def item_entry(row):
+    return {
+        'id': row.id,
+        'desc': row.description,
+        'amount': row.amount,
+        'currency': row.currency,
+        'paidBy': row.paid_by_name or 'N/A',
+        'is_approved': row.is_approved
+    }
+
+def request_participants_query(request_id):
+    return db.select(
+        RequestParticipant.user_id, RequestParticipant.status, RequestParticipant.stage,
+        RequestParticipant.net_share, User.name
+    ).join(User, RequestParticipant.user_id == User.id
+    ).where(RequestParticipant.request_id == request_id)
+
+def request_details_head(req, item_rows, participant_rows, user_id, now):
+    """ Everything in the request detail page except the (possibly streamed) comments. """
+    # Participant record for the *current user* (for payer's view)
+    current_user_participant = next((p for p in participant_rows if p.user_id == user_id), None)
+    return {
+        'id': req.id,
+        'type': req.type,
+        'title': req.title,
+        'subtitle': req.subtitle,
+        'total_amount': req.total_amount,
+        'currency': req.currency, # Of total_amount and every net_share
+        'creator_name': f"{req.creator_score}% {req.creator_name}",
+        'status': req.status, # Creator's overall status
+        'photo': req.photo_url,
+
+        # Payer-specific info (your status for this request)
+        'your_participant_record': {
+            'status': current_user_participant.status,
+            'stage': current_user_participant.stage,
+            'net_share': current_user_participant.net_share
+        } if current_user_participant else None,
+
+        # Creator-specific info (status of all participants)
+        'all_participants': [{
+            'name': p.name,
+            'status': p.status,
+            'stage': p.stage,
+            'net_share': p.net_share
+        } for p in participant_rows],
+
+        'items': [item_entry(row) for row in item_rows],
+
+        # Type-specific fields
+        'invoice_note': req.invoice_note,
+        'invoice_vat_percent': req.invoice_vat_percent,
+        **deadline_fields(req.split_deadline, now)
     }
 
 # --- API Endpoints: Group Pot (PRD 4.3) ---
-@app.route('/api/requests/<request_id>/expenses', methods=['POST'])
+@api.route('/api/requests/<request_id>/expenses', methods=['POST'])
 def add_split_expense(request_id):
     """ Add an expense to a split (PRD 3.2.2) """
     req = Request.query.get(request_id)
@@ -425,7 +1121,13 @@ def add_split_expense(request_id):
         return jsonify({'error': 'Request not found'}), 404
         
     data = request.json
-    user_id = data.get('user_id', CURRENT_USER_ID) # In real app, get from session
+    try:
+        user_id = parse_user_id(data.get('user_id')) # In real app, get from session
+        amount = parse_amount(data.get('amount'))
+        shared_by = parse_shared_by(data.get('shared_by'), participant_ids(request_id))
+        currency = parse_item_currency(data.get('currency'), req.currency)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Admin Gatekeeper Logic:
     # If the Creator adds it, it's auto-approved. If a participant adds it, it's pending.
@@ -435,11 +1137,14 @@ def add_split_expense(request_id):
     new_item = RequestItem(
         request_id=request_id,
         description=data['description'],
-        amount=float(data['amount']),
+        amount=amount,
+        currency=currency,
         paid_by_user_id=user_id,
-        is_approved=auto_approve
+        is_approved=auto_approve,
+        shares=[RequestItemShare(user_id=sharer, weight=weight) for sharer, weight in shared_by.items()]
     )
     db.session.add(new_item)
+    bump_version(Request, request_id)
     db.session.commit()
     
     # Recalculate balances immediately if approved
@@ -454,12 +1159,14 @@ def add_split_expense(request_id):
             'id': new_item.id,
             'desc': new_item.description,
             'amount': new_item.amount,
+            'currency': new_item.currency or req.currency,
             'paidBy': new_item.paid_by_user.name,
-            'is_approved': new_item.is_approved
+            'is_approved': new_item.is_approved,
+            'shared_by': shared_by
         }
     }), 201
 
-@app.route('/api/requests/items/<item_id>/approve', methods=['POST'])
+@api.route('/api/requests/items/<item_id>/approve', methods=['POST'])
 def approve_expense(item_id):
     """ Admin Gatekeeper: Approve a participant's expense """
     item = RequestItem.query.get(item_id)
@@ -470,12 +1177,9 @@ def approve_expense(item_id):
     if req.creator_id != CURRENT_USER_ID:
         return jsonify({'error': 'Only the Admin can approve expenses'}), 403
         
-    item.is_approved = True
-    db.session.commit()
-    
-    # Trigger Smart Settlement Engine
+    # Trigger Smart Settlement Engine, approving in the same transaction
     # Capture the DICTIONARY result
-    calculation_result = calculate_net_balances(req.id)
+    calculation_result = calculate_net_balances(req.id, approve=[item.id])
     
     return jsonify({
         'message': 'Expense approved and balances recalculated',
@@ -483,15 +1187,290 @@ def approve_expense(item_id):
         'settlement_plan': calculation_result['plan']    # Extracted Plan
     })
 
-@app.route('/api/pots', methods=['POST'])
+def parse_shared_by(value, participants=None):
+    """
+    Who shared an itemized expense: a list of user ids (equal parts) or {user_id: weight}.
+    Missing means everyone (the common pool). Raises ValueError on bad input, including
+    sharers outside `participants` (the request's user ids, when given): the settlement
+    would ignore them and leave the item in the common pool.
+    """
+    if value is None:
+        return {}
+    if isinstance(value, list):
+        if not all(isinstance(user_id, str) for user_id in value):
+            raise ValueError('shared_by must list user ids')
+        value = dict.fromkeys(value, 1.0)
+    if not isinstance(value, dict):
+        raise ValueError('shared_by must be a list of user ids or a {user_id: weight} object')
+    weights = {}
+    for user_id, weight in value.items():
+        if not isinstance(user_id, str):
+            raise ValueError('shared_by must list user ids')
+        try:
+            weight = float(weight)
+        except (TypeError, ValueError):
+            raise ValueError('shared_by weights must be numbers')
+        if not math.isfinite(weight) or weight <= 0:
+            raise ValueError('shared_by weights must be positive')
+        weights[user_id] = weight
+    if participants is not None:
+        strangers = sorted(set(weights) - set(participants))
+        if strangers:
+            raise ValueError(f"shared_by names users who aren't participants: {', '.join(strangers)}")
+    return weights
+
+def participant_ids(request_id):
+    """ User ids of a request's participants. """
+    return set(db.session.execute(
+        db.select(RequestParticipant.user_id).where(RequestParticipant.request_id == request_id)).scalars())
+
+def parse_item_currency(value, settle_in=None):
+    """
+    Currency an expense was spent in (None: the request's). ValueError if malformed, or
+    if it (or `settle_in`, the request's currency, when they differ) has no rate in
+    effect today: the item would be stored, then fail every settlement of its request.
+    """
+    currency = fx.parse_currency(value, default=None)
+    if currency is not None and currency != settle_in:
+        try:
+            for code in {currency, settle_in or fx.BASE_CURRENCY}:
+                fx_rates().rate(code)
+        except fx.MissingRateError as e:
+            raise ValueError(str(e))
+    return currency
+
+def parse_amount(value):
+    """ An expense amount: a positive, finite number (float('inf') and 'nan' parse, but aren't money). """
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('amount must be a number')
+    if not math.isfinite(amount) or amount <= 0:
+        raise ValueError('amount must be a positive number')
+    return amount
+
+def parse_user_id(value):
+    """ Who paid an expense (None: the current user); ValueError unless it is an id string. """
+    if value is None:
+        return CURRENT_USER_ID
+    if not isinstance(value, str):
+        raise ValueError('user_id must be a user id')
+    return value
+
+def parse_expense(entry, settle_in=None, participants=None):
+    """
+    (description, amount, currency, shared_by) from one batch entry, or raise ValueError
+    with what's wrong. `settle_in` is the request's currency (see parse_item_currency),
+    `participants` its user ids (see parse_shared_by).
+    """
+    if not isinstance(entry, dict):
+        raise ValueError('expense must be an object')
+    description = entry.get('description')
+    if not description:
+        raise ValueError('description is required')
+    amount = parse_amount(entry.get('amount'))
+    currency = parse_item_currency(entry.get('currency'), settle_in)
+    return description, amount, currency, parse_shared_by(entry.get('shared_by'), participants)
+
+@api.route('/api/requests/<request_id>/expenses/batch', methods=['POST'])
+def add_split_expenses(request_id):
+    """
+    Bulk version of add_split_expense: {'expenses': [{description, amount, currency?, user_id?}, ...]}.
+    All items go in with one transaction (nothing is stored if any entry is invalid)
+    and settlement runs once at the end instead of once per approved item.
+    """
+    req = Request.query.get(request_id)
+    if not req:
+        return jsonify({'error': 'Request not found'}), 404
+
+    expenses = (request.json or {}).get('expenses')
+    if not isinstance(expenses, list) or not expenses:
+        return jsonify({'error': 'expenses must be a non-empty list'}), 400
+
+    participants = participant_ids(request_id)
+    rows, share_rows, sharers, errors = [], [], {}, []
+    for index, entry in enumerate(expenses):
+        try:
+            description, amount, currency, shared_by = parse_expense(entry, req.currency, participants)
+            user_id = parse_user_id(entry.get('user_id')) # In real app, get from session
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        rows.append({
+            'id': str(uuid.uuid4()),
+            'request_id': request_id,
+            'description': description,
+            'amount': amount,
+            'currency': currency,
+            'paid_by_user_id': user_id,
+            'is_approved': user_id == req.creator_id, # Admin Gatekeeper, as in add_split_expense
+            'created_at': datetime.utcnow()
+        })
+        sharers[rows[-1]['id']] = shared_by
+        share_rows += [{'item_id': rows[-1]['id'], 'user_id': sharer, 'weight': weight}
+                       for sharer, weight in shared_by.items()]
+    if errors:
+        return jsonify({'error': 'Invalid expenses', 'details': errors}), 400
+
+    db.session.execute(db.insert(RequestItem), rows)
+    if share_rows:
+        db.session.execute(db.insert(RequestItemShare), share_rows)
+    bump_version(Request, request_id)
+    db.session.commit()
+
+    names = dict(db.session.execute(
+        db.select(User.id, User.name).where(User.id.in_({row['paid_by_user_id'] for row in rows}))
+    ).all())
+    calculation_result = calculate_net_balances(request_id) if any(row['is_approved'] for row in rows) else None
+
+    return jsonify({
+        'message': f'{len(rows)} expenses added',
+        'items': [{
+            'id': row['id'],
+            'desc': row['description'],
+            'amount': row['amount'],
+            'currency': row['currency'] or req.currency,
+            'paidBy': names.get(row['paid_by_user_id'], 'N/A'),
+            'is_approved': row['is_approved'],
+            'status': 'Approved' if row['is_approved'] else 'Pending Approval',
+            'shared_by': sharers[row['id']]
+        } for row in rows],
+        'new_total': calculation_result['total'] if calculation_result else req.total_amount,
+        'settlement_plan': calculation_result['plan'] if calculation_result else None
+    }), 201
+
+@api.route('/api/requests/<request_id>/items/approve', methods=['POST'])
+def approve_expenses(request_id):
+    """
+    Bulk version of approve_expense: {'item_ids': [...]} approved in one UPDATE,
+    in the same transaction as a single settlement run. Reports what happened to every id.
+    """
+    req = Request.query.get(request_id)
+    if not req:
+        return jsonify({'error': 'Request not found'}), 404
+    if req.creator_id != CURRENT_USER_ID:
+        return jsonify({'error': 'Only the Admin can approve expenses'}), 403
+
+    item_ids = (request.json or {}).get('item_ids')
+    if not isinstance(item_ids, list) or not item_ids:
+        return jsonify({'error': 'item_ids must be a non-empty list'}), 400
+    if not all(isinstance(item_id, str) for item_id in item_ids):
+        return jsonify({'error': 'item_ids must list item ids'}), 400
+
+    found = dict(db.session.execute(
+        db.select(RequestItem.id, RequestItem.is_approved)
+        .where(RequestItem.request_id == request_id, RequestItem.id.in_(item_ids))
+    ).all())
+    to_approve = [item_id for item_id, approved in found.items() if not approved]
+    calculation_result = calculate_net_balances(request_id, approve=to_approve)
+
+    def item_status(item_id):
+        if item_id not in found:
+            return 'Not found'
+        return 'Already approved' if found[item_id] else 'Approved'
+
+    return jsonify({
+        'message': f'{len(to_approve)} expenses approved and balances recalculated',
+        'items': [{'id': item_id, 'status': item_status(item_id)} for item_id in item_ids],
+        'new_total': calculation_result['total'],
+        'settlement_plan': calculation_result['plan']
+    })
+
+# --- Settlement Preview (what-if) ---
+def preview_settlement(request_id, inputs, changes):
+    """
+    Settlement of a request with hypothetical `changes` applied, computed in memory:
+    'add' new expenses (counted as approved), 'remove' items, 'unapprove' approved
+    items or 'approve' pending ones. Raises ValueError on malformed changes.
+    """
+    version, currency, items, participants, assignments = inputs
+    for key in ('add', 'remove', 'unapprove', 'approve'):
+        entries = changes.get(key) or []
+        if not isinstance(entries, list):
+            raise ValueError(f'{key} must be a list')
+        if key != 'add' and not all(isinstance(item_id, str) for item_id in entries):
+            raise ValueError(f'{key} must list item ids')
+    removed = set(changes.get('remove') or []) | set(changes.get('unapprove') or [])
+    approved = set(changes.get('approve') or [])
+    kept = [SettlementItem(i.id, i.amount, i.paid_by_user_id, i.currency, i.created_at) for i in items
+            if i.id not in removed and (i.is_approved or i.id in approved)]
+    kept_ids = {i.id for i in kept}
+    assignments = [a for a in assignments if a.item_id in kept_ids]
+
+    user_ids = [p.user_id for p in participants]
+    for index, entry in enumerate(changes.get('add') or []):
+        description, amount, item_currency, shared_by = parse_expense(entry, currency, user_ids)
+        item_id = f'preview-{index}'
+        kept.append(SettlementItem(item_id, amount, parse_user_id(entry.get('user_id')), item_currency, None))
+        assignments += [(item_id, sharer, weight) for sharer, weight in shared_by.items()]
+
+    settlement = compute_settlement(in_settlement_currency(kept, currency), participants, assignments)
+    users = user_display(p.user_id for p in participants)
+    return {
+        'request_id': request_id,
+        'version': version,
+        'currency': currency,
+        'total': settlement['total'],
+        'status': settlement['status'],
+        'participants': [{
+            'user_id': p['user_id'],
+            'name': users.get(p['user_id'], {}).get('name'),
+            'net_share': p['net_share'],
+            'status': p['status']
+        } for p in settlement['participants']],
+        'settlement_plan': named_plan(settlement['plan'])
+    }
+
+@api.route('/api/requests/<request_id>/preview', methods=['GET', 'POST'])
+def preview_request_settlement(request_id):
+    """
+    What-if settlement (never writes). GET previews the current state; POST takes
+    {'add': [{description, amount, currency?, user_id?, shared_by?}], 'remove': [item ids],
+    'unapprove': [item ids], 'approve': [item ids]}. Results are cached (cache.py) per
+    request version and change set, and carry an ETag for conditional requests.
+    """
+    changes = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+    if not isinstance(changes, dict):
+        return jsonify({'error': 'Changes must be an object'}), 400
+
+    version = db.session.execute(db.select(Request.version).where(Request.id == request_id)).scalar()
+    if version is None:
+        return jsonify({'error': 'Request not found'}), 404
+    # Foreign-currency items follow the rate table, so a rate import also changes the preview;
+    # added items are converted at today's rate, so their previews also change with the date
+    today = datetime.utcnow().date().isoformat() if changes.get('add') else ''
+    etag = http_cache.etag_for('preview', request_id, version, data_version('fx'), today,
+                               json.dumps(changes, sort_keys=True))
+    cached = http_cache.not_modified(etag)
+    if cached:
+        return cached
+
+    def compute():
+        inputs = load_settlement_inputs(request_id, approved_only=False)
+        if inputs[0] != version:
+            raise StaleWriteError(f"Request {request_id} changed during preview")
+        return preview_settlement(request_id, inputs, changes)
+
+    try:
+        preview = read_cache().get(('preview', etag), compute)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return http_cache.with_etag(jsonify(preview), etag)
+
+@api.route('/api/pots', methods=['POST'])
 def create_pot():
     """ API Spec 1: Create a New Pot (PRD 4.3.1) """
     data = request.json
     admin = User.query.get(CURRENT_USER_ID)
+    try:
+        currency = fx.parse_currency(data.get('currency'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     new_pot = Pot(
         id=f'pot-uuid-{str(uuid.uuid4())[:4]}',
         name=data['name'], 
-        admin_id=admin.id
+        admin_id=admin.id,
+        currency=currency
     )
     new_pot.members.append(admin)
     db.session.add(new_pot)
@@ -507,138 +1486,182 @@ def create_pot():
         'id': new_pot.id,
         'name': new_pot.name,
         'admin_id': new_pot.admin_id,
+        'currency': new_pot.currency,
         'totalBalance': 0.00
     }), 201
 
-@app.route('/api/pots', methods=['GET'])
+@api.route('/api/pots', methods=['GET'])
 def get_all_pots():
     """ NEW Endpoint: Get all pots for the current user """
-    user = User.query.get(CURRENT_USER_ID)
-    pots_data = []
-    for pot in user.pots:
-        total_balance = db.session.query(
-            db.func.sum(PotTransaction.amount)
-        ).filter_by(pot_id=pot.id).scalar() or 0.0
-        pots_data.append({
-            'id': pot.id,
-            'name': pot.name,
-            'totalBalance': total_balance,
-            'memberCount': len(pot.members)
-        })
-    return jsonify(pots_data), 200
-
-@app.route('/api/pots/<pot_id>', methods=['GET'])
+    versions = db.session.execute(pot_versions_query(CURRENT_USER_ID)).all()
+    etag = list_etag('pots', CURRENT_USER_ID, versions)
+    cached = http_cache.not_modified(etag)
+    if cached:
+        return cached
+
+    # Summaries are cached per pot version; only pots written since are queried.
+    keys = {pot_id: ('pot-summary', pot_id, version) for pot_id, version in versions}
+    def load(missing):
+        rows = db.session.execute(pot_summaries_query([key[1] for key in missing]))
+        return {keys[row.id]: pot_summary_entry(row) for row in rows}
+    summaries = read_cache().fetch(keys.values(), load)
+    pots_data = [summaries[key] for key in keys.values() if key in summaries]
+    return http_cache.with_etag(jsonify(pots_data), etag)
+
+@api.route('/api/pots/<pot_id>', methods=['GET'])
 def get_pot_details(pot_id):
     """ API Spec 2: Get Pot Dashboard Details (PRD 4.3.3) """
-    pot = Pot.query.get(pot_id)
+    pot = db.session.execute(pot_query(pot_id)).first()
     if not pot:
         return jsonify({'error': 'Pot not found'}), 404
-    total_balance = db.session.query(
-        db.func.sum(PotTransaction.amount)
-    ).filter_by(pot_id=pot.id).scalar() or 0.0
-    schedule = pot.schedule
-    schedule_data = {
-        'amount': schedule.amount,
-        'frequency': schedule.frequency,
-        'due_day': schedule.due_day,
-        'nextDueDate': '2025-12-01T00:00:00Z' # TODO: Calculate this
-    }
-    tally_data = []
-    for member in pot.members:
-        total_paid = db.session.query(
-            db.func.sum(PotTransaction.amount)
-        ).filter_by(
-            pot_id=pot.id, 
-            user_id=member.id, 
-            type='Contribution'
-        ).scalar() or 0.0
-        tally_data.append({
-            'user_id': member.id,
-            'name': member.name,
-            'total_paid': total_paid
-        })
-    transactions = PotTransaction.query.filter_by(pot_id=pot.id).order_by(PotTransaction.date.desc()).all()
-    feed_data = [{
-        'id': t.id,
-        'type': t.type,
-        'description': t.description,
-        'amount': t.amount,
-        'user_name': t.user.name,
-        'date': t.date.isoformat()
-    } for t in transactions]
-    return jsonify({
-        'id': pot.id,
-        'name': pot.name,
-        'admin_id': pot.admin_id,
-        'is_admin': pot.admin_id == CURRENT_USER_ID, # Helper for UI
-        'totalBalance': total_balance,
-        'schedule': schedule_data,
-        'contributionTally': tally_data,
-        'transactionFeed': feed_data
-    }), 200
+    etag = pot_etag(pot, CURRENT_USER_ID)
+    cached = http_cache.not_modified(etag)
+    if cached:
+        return cached
+    total_balance = db.session.execute(pot_balance_query(pot.id)).scalar()
+    schedule_data = schedule_entry(db.session.execute(schedule_query(pot.id)).first())
+    tally_data = [tally_entry(row) for row in db.session.execute(pot_tally_query(pot.id))]
+    details = pot_details_head(pot, total_balance, schedule_data, tally_data, CURRENT_USER_ID)
+    feed = iter_rows(pot_feed_query(pot.id), pot_feed_entry)
+    if wants_stream():
+        return http_cache.with_etag(stream_json_object(details, 'transactionFeed', feed), etag)
+    details['transactionFeed'] = list(feed)
+    return http_cache.with_etag(jsonify(details), etag)
     
-@app.route('/api/pots/<pot_id>/contributions', methods=['POST'])
+_writer_lock = threading.Lock()
+
+def contribution_writer():
+    """ The app's group-commit writer for contributions (see group_commit.py), created on first use. """
+    app = current_app._get_current_object()
+    writer = app.extensions.get('group_commit')
+    if writer is None:
+        with _writer_lock:
+            writer = app.extensions.get('group_commit')
+            if writer is None:
+                writer = GroupCommitWriter(
+                    db.engine, PotTransaction.__table__, Pot.__table__, User.__table__, pot_balances_query,
+                    window_ms=app.config['GROUP_COMMIT_WINDOW_MS'],
+                    max_batch=app.config['GROUP_COMMIT_MAX_BATCH']
+                )
+                app.extensions['group_commit'] = writer
+    return writer
+
+def in_pot_currency(pot_currency, amount, currency):
+    """
+    (amount, currency, original_amount) columns of a ledger row for money paid in
+    `currency` (None: the pot's): the amount is booked in the pot's currency at
+    today's rate, and the original is kept alongside.
+    """
+    if currency is None or currency == pot_currency:
+        return amount, None, None
+    return float(fx_rates().convert([amount], [currency], pot_currency)[0]), currency, amount
+
+@api.route('/api/pots/<pot_id>/contributions', methods=['POST'])
 def make_contribution(pot_id):
     """ API Spec 3: Make a Contribution ("Money In") (PRD 4.3.2) """
-    data = request.json
-    amount = float(data['amount'])
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Contribution must be an object'}), 400
+    # Validated up front: with group commit one bad row would fail the whole batch
+    try:
+        amount = parse_amount(data.get('amount'))
+        description = data.get('description', 'User contributed')
+        if not isinstance(description, str) or not description:
+            raise ValueError('description must be a non-empty string')
+        currency = fx.parse_currency(data.get('currency'), default=None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    pot_currency = db.session.execute(db.select(Pot.currency).where(Pot.id == pot_id)).scalar()
+    if pot_currency is None:
+        return jsonify({'error': 'Pot not found'}), 404
+    amount, currency, original_amount = in_pot_currency(pot_currency, amount, currency)
+
+    if current_app.config['CONTRIBUTION_GROUP_COMMIT']:
+        # Share one transaction with every contribution arriving in the same few ms.
+        result = contribution_writer().submit(pot_id, CURRENT_USER_ID, 'Contribution', description, amount,
+                                              currency, original_amount).result()
+        tx = result['transaction']
+        return jsonify({
+            'newTransaction': {
+                'id': tx['id'],
+                'type': tx['type'],
+                'description': tx['description'],
+                'amount': tx['amount'],
+                'originalCurrency': tx['currency'],
+                'originalAmount': tx['original_amount'],
+                'user_name': tx['user_name'],
+                'date': tx['date'].isoformat()
+            },
+            'totalBalance': result['totalBalance']
+        }), 201
+
     new_transaction = PotTransaction(
         pot_id=pot_id,
         user_id=CURRENT_USER_ID,
         type='Contribution',
-        description=data.get('description', 'User contributed'),
-        amount=amount
+        description=description,
+        amount=amount,
+        currency=currency,
+        original_amount=original_amount
     )
     db.session.add(new_transaction)
+    bump_version(Pot, pot_id)
     db.session.commit()
-    total_balance = db.session.query(
-        db.func.sum(PotTransaction.amount)
-    ).filter_by(pot_id=pot_id).scalar() or 0.0
+    total_balance = db.session.execute(pot_balance_query(pot_id)).scalar() or 0.0
     return jsonify({
         'newTransaction': {
             'id': new_transaction.id,
             'type': new_transaction.type,
             'description': new_transaction.description,
             'amount': new_transaction.amount,
+            'originalCurrency': new_transaction.currency,
+            'originalAmount': new_transaction.original_amount,
             'user_name': new_transaction.user.name,
             'date': new_transaction.date.isoformat()
         },
         'totalBalance': total_balance
     }), 201
 
-@app.route('/api/pots/<pot_id>/expenses', methods=['POST'])
+@api.route('/api/pots/<pot_id>/expenses', methods=['POST'])
 def log_pot_expense(pot_id):
     """ API Spec 4: Log an Expense ("Money Out") (PRD 4.3.5) """
     pot = Pot.query.get(pot_id)
     if pot.admin_id != CURRENT_USER_ID:
         return jsonify({'error': 'Only admin can log expenses'}), 403
     data = request.json
-    amount = float(data['amount'])
+    try:
+        currency = fx.parse_currency(data.get('currency'), default=None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    amount, currency, original_amount = in_pot_currency(pot.currency, -abs(float(data['amount'])), currency)
     new_transaction = PotTransaction(
         pot_id=pot_id,
         user_id=CURRENT_USER_ID,
         type='Expense',
         description=data['description'],
-        amount=-abs(amount) # Ensure amount is negative
+        amount=amount, # Always negative
+        currency=currency,
+        original_amount=original_amount
     )
     db.session.add(new_transaction)
+    bump_version(Pot, pot_id)
     db.session.commit()
-    total_balance = db.session.query(
-        db.func.sum(PotTransaction.amount)
-    ).filter_by(pot_id=pot_id).scalar() or 0.0
+    total_balance = db.session.execute(pot_balance_query(pot_id)).scalar() or 0.0
     return jsonify({
         'newTransaction': {
             'id': new_transaction.id,
             'type': new_transaction.type,
             'description': new_transaction.description,
             'amount': new_transaction.amount,
+            'originalCurrency': new_transaction.currency,
+            'originalAmount': new_transaction.original_amount,
             'user_name': new_transaction.user.name,
             'date': new_transaction.date.isoformat()
         },
         'totalBalance': total_balance
     }), 201
 
-@app.route('/api/pots/<pot_id>/schedule', methods=['PUT'])
+@api.route('/api/pots/<pot_id>/schedule', methods=['PUT'])
 def update_schedule(pot_id):
     """ API Spec 5: Set/Update Scheduled Contribution (PRD 4.3.2) """
     pot = Pot.query.get(pot_id)
@@ -649,6 +1672,7 @@ def update_schedule(pot_id):
     schedule.amount = float(data['amount'])
     schedule.frequency = data['frequency']
     schedule.due_day = int(data['due_day']) if data.get('due_day') else None
+    bump_version(Pot, pot_id)
     db.session.commit()
     return jsonify({
         'schedule': {
@@ -661,147 +1685,60 @@ def update_schedule(pot_id):
 
 # --- NEW: API Endpoints for Requests (Invoices/Splits) ---
 
-@app.route('/api/requests/sent', methods=['GET'])
+@api.route('/api/requests/sent', methods=['GET'])
 def get_sent_requests():
     """ Get all requests created by the current user (Creator Dashboard) """
-    requests = Request.query.filter_by(creator_id=CURRENT_USER_ID).all()
-    
-    sent_requests_data = []
-    for req in requests:
-        status_color = 'text-orange-400' # default
-        if req.type == 'invoice':
-            if 'Overdue' in req.status:
-                status_color = 'text-red-500'
-            elif 'Paid' in req.status:
-                status_color = 'text-lime-400'
-        elif req.type == 'split':
-            if 'Paid' in req.status:
-                status_color = 'text-lime-400'
-            elif 'Consolidating' in req.status:
-                status_color = 'text-blue-400'
-        
-        sent_requests_data.append({
-            'id': req.id,
-            'type': req.type,
-            'title': req.title,
-            'subtitle': req.subtitle,
-            'amount': req.total_amount,
-            'status': req.status,
-            'statusColor': status_color,
-            'isConsolidating': req.split_deadline > datetime.utcnow() if req.split_deadline else False,
-            'deadline': req.split_deadline.isoformat() if req.split_deadline else None
-        })
-    
-    return jsonify(sent_requests_data), 200
-
-@app.route('/api/requests/received', methods=['GET'])
+    now = datetime.utcnow()
+    etag = list_etag('sent', CURRENT_USER_ID, db.session.execute(sent_versions_query(CURRENT_USER_ID, now)))
+    cached = http_cache.not_modified(etag)
+    if cached:
+        return cached
+    rows = iter_rows(sent_requests_query(CURRENT_USER_ID), lambda row: sent_request_entry(row, now))
+    if wants_stream():
+        return http_cache.with_etag(stream_json_array(rows), etag)
+    return http_cache.with_etag(jsonify(list(rows)), etag)
+
+@api.route('/api/requests/received', methods=['GET'])
 def get_received_requests():
     """ Get all requests where the current user is a participant (Payer Dashboard) """
-    participations = RequestParticipant.query.filter_by(user_id=CURRENT_USER_ID).all()
-    
-    received_requests_data = []
-    for p in participations:
-        req = p.request
-        creator = req.creator # Get the User object who created this
-        
-        page = ''
-        amount_to_show = p.net_share # Show the participant's net share
-        
-        if req.type == 'invoice':
-            page = 'page-sme-invoice'
-            amount_to_show = abs(p.net_share) # For SME invoice, payer owes the net share
-            req_type = 'sme'
-        elif req.type == 'split':
-            page = 'page-social-split'
-            req_type = 'social'
-
-        received_requests_data.append({
-            'id': req.id,
-            'type': req_type,
-            'title': f"{creator.score}% {creator.name}", # e.g., "98% Adidas"
-            'subtitle': req.title,
-            'page': page,
-            'amount': abs(amount_to_show),
-            'status': p.status, # Use the participant's specific status
-            'isConsolidating': req.split_deadline > datetime.utcnow() if req.split_deadline else False,
-            'deadline': req.split_deadline.isoformat() if req.split_deadline else None,
-            'photo': req.photo_url
-        })
-        
-    return jsonify(received_requests_data), 200
-
-@app.route('/api/requests/<request_id>', methods=['GET'])
+    now = datetime.utcnow()
+    etag = list_etag('received', CURRENT_USER_ID, db.session.execute(received_versions_query(CURRENT_USER_ID, now)))
+    cached = http_cache.not_modified(etag)
+    if cached:
+        return cached
+    rows = iter_rows(received_requests_query(CURRENT_USER_ID), lambda row: received_request_entry(row, now))
+    if wants_stream():
+        return http_cache.with_etag(stream_json_array(rows), etag)
+    return http_cache.with_etag(jsonify(list(rows)), etag)
+
+@api.route('/api/requests/<request_id>', methods=['GET'])
 def get_request_details(request_id):
     """ Get the full details for one request (for Payer or Creator detail pages) """
-    req = Request.query.get(request_id)
+    now = datetime.utcnow()
+    req = db.session.execute(request_query(request_id)).first()
     if not req:
         return jsonify({'error': 'Request not found'}), 404
+    etag = request_etag(req, CURRENT_USER_ID, now)
+    cached = http_cache.not_modified(etag)
+    if cached:
+        return cached
+
+    # Items and participants only change with the request version
+    rows = read_cache().get(('request-rows', req.id, req.version), lambda: {
+        'items': pack_rows(db.session.execute(request_items_query(req.id))),
+        'participants': pack_rows(db.session.execute(request_participants_query(req.id))),
+    })
+    details = request_details_head(req, unpack_rows(rows['items']), unpack_rows(rows['participants']),
+                                   CURRENT_USER_ID, now)
 
-    # Get items
-    items = RequestItem.query.order_by(RequestItem.created_at.asc()).filter_by(request_id=req.id).all()
-    items_data = [{
-        'id': item.id,
-        'desc': item.description,
-        'amount': item.amount,
-        'paidBy': item.paid_by_user.name if item.paid_by_user else 'N/A',
-        'is_approved': item.is_approved
-    } for item in items]
-
-    # Get participants (for creator's view)
-    participants = RequestParticipant.query.filter_by(request_id=req.id).all()
-    participants_data = [{
-        'name': p.user.name,
-        'status': p.status,
-        'stage': p.stage,
-        'net_share': p.net_share
-    } for p in participants]
-    
-    # Get participant record for the *current user* (for payer's view)
-    current_user_participant = RequestParticipant.query.filter_by(request_id=req.id, user_id=CURRENT_USER_ID).first()
-
-    # Get comments (for social feed)
-    comments = Comment.query.filter_by(request_id=req.id).order_by(Comment.created_at.asc()).all()
-    comments_data = [{
-        'id': c.id,
-        'text': c.text_content,
-        'image_url': c.image_url,
-        'user_name': c.user.name,
-        'created_at': c.created_at.isoformat()
-    } for c in comments]
-    
-    details = {
-        'id': req.id,
-        'type': req.type,
-        'title': req.title,
-        'subtitle': req.subtitle,
-        'total_amount': req.total_amount,
-        'creator_name': f"{req.creator.score}% {req.creator.name}",
-        'status': req.status, # Creator's overall status
-        'photo': req.photo_url,
-        
-        # Payer-specific info (your status for this request)
-        'your_participant_record': {
-            'status': current_user_participant.status,
-            'stage': current_user_participant.stage,
-            'net_share': current_user_participant.net_share
-        } if current_user_participant else None,
-        
-        # Creator-specific info (status of all participants)
-        'all_participants': participants_data,
-        
-        'items': items_data,
-        'comments': comments_data,
-        
-        # Type-specific fields
-        'invoice_note': req.invoice_note,
-        'invoice_vat_percent': req.invoice_vat_percent,
-        'isConsolidating': req.split_deadline > datetime.utcnow() if req.split_deadline else False,
-        'deadline': req.split_deadline.isoformat() if req.split_deadline else None
-    }
-    
-    return jsonify(details), 200
+    # Get comments (for social feed), streamed last when requested
+    comments = iter_rows(comments_query(req.id), comment_entry)
+    if wants_stream():
+        return http_cache.with_etag(stream_json_object(details, 'comments', comments), etag)
+    details['comments'] = list(comments)
+    return http_cache.with_etag(jsonify(details), etag)
 
-@app.route('/api/requests/<request_id>/comments', methods=['POST'])
+@api.route('/api/requests/<request_id>/comments', methods=['POST'])
 def post_comment(request_id):
     """ Add a comment to the social feed (PRD 3.3) """
     data = request.json
@@ -812,6 +1749,7 @@ def post_comment(request_id):
         image_url=data.get('image_url')
     )
     db.session.add(new_comment)
+    bump_version(Request, request_id)
     db.session.commit()
     return jsonify({
         'id': new_comment.id,
@@ -821,18 +1759,23 @@ def post_comment(request_id):
         'created_at': new_comment.created_at.isoformat()
     }), 201 
 
-@app.route('/api/requests/invoice', methods=['POST'])
+def resolve_contacts(entries):
+    """ User ids for participant names/phones, creating unknown ones (see contacts.py). """
+    return current_app.extensions['contacts'].resolve(db.session, entries)
+
+@api.route('/api/requests/invoice', methods=['POST'])
 def create_invoice():
     """ Create a new SME Invoice (PRD 5.2) """
     data = request.json
     creator = User.query.get(CURRENT_USER_ID)
+    try:
+        currency = fx.parse_currency(data.get('currency'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Find or create participant
-    participant_user = User.query.filter_by(name=data['clientName']).first()
-    if not participant_user:
-        participant_user = User(id=str(uuid.uuid4()), name=data['clientName'], phone_number=str(uuid.uuid4()))
-        db.session.add(participant_user)
-        db.session.commit()
+    # Find or create participant (by normalized name or phone, see contacts.py)
+    participant_id, = resolve_contacts([data['clientName']])
+    db.session.commit()
 
     # 1. Create Request object
     new_req = Request(
@@ -842,6 +1785,7 @@ def create_invoice():
         subtitle=f'INV-{str(uuid.uuid4())[:4]}',
         creator_id=creator.id,
         total_amount=data['totalWithVat'],
+        currency=currency,
         status='Pending',
         invoice_note=data['nextSteps'],
         invoice_vat_percent=data['vat']
@@ -862,7 +1806,7 @@ def create_invoice():
     # 3. Create RequestParticipant object for the recipient
     new_participant = RequestParticipant(
         request_id=new_req.id,
-        user_id=participant_user.id,
+        user_id=participant_id,
         status='Pending',
         stage='Delivered',
         net_share= -abs(data['totalWithVat']) # They owe the full amount
@@ -875,14 +1819,21 @@ def create_invoice():
         'title': new_req.title,
         'subtitle': new_req.subtitle,
         'amount': new_req.total_amount,
+        'currency': new_req.currency,
         'status': new_req.status
     }), 201
 
-@app.route('/api/requests/split', methods=['POST'])
+@api.route('/api/requests/split', methods=['POST'])
 def create_split():
     """ Create a new Social Split (PRD 4.2) """
     data = request.json
     creator = User.query.get(CURRENT_USER_ID)
+    try:
+        # Settlement currency; each expense may have been spent in another one
+        currency = fx.parse_currency(data.get('currency'))
+        expense_currencies = [parse_item_currency(item.get('currency'), currency) for item in data['expenses']]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     deadline = None
     if data['deadlineHours'] > 0:
@@ -894,6 +1845,7 @@ def create_split():
         type='split',
         title=data['title'],
         creator_id=creator.id,
+        currency=currency,
         status='Consolidating' if deadline else 'Pending',
         split_deadline=deadline,
         photo_url=data.get('photo', None)
@@ -904,36 +1856,33 @@ def create_split():
     # Extract custom distribution
     custom_shares = data.get('split_distribution', {})
 
-    # 2. Create list of all participant users (including creator)
-    all_participants_users = [creator]
-    for name in data['participants']:
-        user = User.query.filter_by(name=name).first()
-        if not user:
-            user = User(id=str(uuid.uuid4()), name=name, phone_number=str(uuid.uuid4()))
-            db.session.add(user)
-        all_participants_users.append(user)
+    # 2. Resolve all participants in bulk (Frontend uses 'You' for the creator)
+    all_participants = [('You', creator.id)]
+    for name, user_id in zip(data['participants'], resolve_contacts(data['participants'])):
+        if user_id not in {known_id for _, known_id in all_participants}:
+            all_participants.append((name, user_id))
     db.session.commit()
 
     # 3. Create RequestItem objects for the creator's expenses
-    for item in data['expenses']:
+    for item, item_currency in zip(data['expenses'], expense_currencies):
         new_item = RequestItem(
             request_id=new_req.id,
             description=item['desc'],
             amount=item['amount'],
+            currency=item_currency,
             paid_by_user_id=creator.id,
             is_approved=True # Creator's items are auto-approved
         )
         db.session.add(new_item)
     
     # 4. Create RequestParticipant objects for all participants
-    for user in all_participants_users:
-        # Determine name key for lookup (Frontend uses 'You' for creator)
-        lookup_name = 'You' if user.id == creator.id else user.name
+    for lookup_name, user_id in all_participants:
+        # custom_shares is keyed by the names the frontend sent
         target = custom_shares.get(lookup_name, None)
 
         new_participant = RequestParticipant(
             request_id=new_req.id,
-            user_id=user.id,
+            user_id=user_id,
             status='Pending',
             stage='Delivered',
             fixed_split_amount=target # STORE THE TARGET HERE
@@ -950,14 +1899,58 @@ def create_split():
         'title': new_req.title,
         'subtitle': new_req.subtitle,
         'amount': new_req.total_amount,
+        'currency': new_req.currency,
         'status': new_req.status,
         'deadline': new_req.split_deadline.isoformat() if new_req.split_deadline else None
     }), 201
 
 
+# --- Instrumentation ---
+@api.route('/api/metrics/http-cache', methods=['GET'])
+def get_http_cache_metrics():
+    """ Conditional-GET hit rates and compression savings for this worker process """
+    return jsonify(http_cache.stats.snapshot()), 200
+
 # --- OCR Endpoint (Merged from OCR.py) ---
-# Note: This is conceptual and requires Google Cloud setup.
-# client = vision.ImageAnnotatorClient() 
+# The Google Vision client is a heavy import and needs Google Cloud credentials,
+# so it is only loaded the first time the 'vision' OCR backend is used.
+_vision_client = None
+
+def get_vision_client():
+    global _vision_client
+    if _vision_client is None:
+        from google.cloud import vision
+        _vision_client = vision.ImageAnnotatorClient()
+    return _vision_client
+
+def run_ocr(image_data, backend='fake'):
+    """ Returns the raw text of an invoice image using the configured OCR backend. """
+    if backend == 'vision':
+        from google.cloud import vision
+        response = get_vision_client().document_text_detection(image=vision.Image(content=image_data))
+        if response.error.message:
+            raise RuntimeError(response.error.message)
+        return response.full_text_annotation.text
+
+    # --- FAKE OCR RESPONSE FOR DEMO ---
+    # This avoids needing Google Cloud credentials. Set OCR_BACKEND='vision' for real OCR.
+    print("--- FAKE OCR ---")
+    return "Invoice To: Demo Client\nTotal: 123.45"
+
+_vision_async_client = None
+
+async def run_ocr_async(image_data, backend='fake'):
+    """ Non-blocking run_ocr for the async serving mode (asgi.py). """
+    global _vision_async_client
+    if backend == 'vision':
+        from google.cloud import vision
+        if _vision_async_client is None:
+            _vision_async_client = vision.ImageAnnotatorAsyncClient()
+        response = await _vision_async_client.document_text_detection(image=vision.Image(content=image_data))
+        if response.error.message:
+            raise RuntimeError(response.error.message)
+        return response.full_text_annotation.text
+    return run_ocr(image_data, backend) # The fake backend does no I/O
 
 def parse_ocr_text(text):
     total_match = re.search(r"(?:Total|Amount Due|TOTAL)\s*[$€]?\s*(\d+\.\d{2})", text, re.IGNORECASE)
@@ -966,44 +1959,384 @@ def parse_ocr_text(text):
     client_name = client_match.group(1).strip() if client_match else "Scanned Client, Inc."
     return {"client": client_name, "total": total, "full_text": text}
 
-@app.route("/scan-invoice", methods=["POST"])
+@api.route("/scan-invoice", methods=["POST"])
 def scan_invoice():
     data = request.get_json()
     if not data or "image" not in data:
         return jsonify({"error": "Missing image data"}), 400
     try:
-        # --- FAKE OCR RESPONSE FOR DEMO ---
-        # This avoids needing Google Cloud credentials.
-        # To use real OCR, comment out this block and uncomment the 'try' block below.
-        print("--- FAKE OCR ---")
-        fake_text = "Invoice To: Demo Client\nTotal: 123.45"
-        parsed_data = parse_ocr_text(fake_text)
-        return jsonify(parsed_data), 200
-        # --- END FAKE OCR ---
-
-        # --- REAL OCR BLOCK (requires setup) ---
-        # image_data = base64.b64decode(data["image"])
-        # image = vision.Image(content=image_data)
-        # response = client.document_text_detection(image=image)
-        # if response.error.message:
-        # ...
-        
+        image_data = base64.b64decode(data["image"])
+    except Exception as e:
+        return jsonify({"error": f"Invalid base64 image: {e}"}), 400
+    try:
+        full_text = run_ocr(image_data, current_app.config['OCR_BACKEND'])
+        return jsonify(parse_ocr_text(full_text)), 200
     except Exception as e:
         return jsonify({"error": f"An error occurred: {e}"}), 500
 
+# --- Ledger Compaction ---
+# PotTransaction is append-only. compact_ledger rolls closed months into PotSnapshot
+# rows (per pot and member) and moves each pot's compacted_until forward, so balance
+# and tally queries only scan the tail. Raw rows can stay where they are, move to
+# PotTransactionArchive, or be appended to a JSON-lines file; ledger_history_query
+# still returns the full history from the table options.
+ARCHIVE_MODES = (None, 'table', 'file')
+
+def month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def compactable_rows():
+    """ PotTransaction rows not yet covered by their pot's snapshots. """
+    compacted_until = db.select(Pot.compacted_until).where(Pot.id == PotTransaction.pot_id).scalar_subquery()
+    return PotTransaction.date >= db.func.coalesce(compacted_until, LEDGER_EPOCH)
+
+def compact_ledger(before, archive=None, archive_path=None):
+    """
+    Closes every month that ends before `before` (rounded down to a month start).
+    The current month is never closed, even for a future `before`: rows still to
+    come would fall behind the boundary and be left out of every balance.
+    archive: None (raw rows stay, just no longer scanned), 'table' or 'file'
+    (appended to `archive_path` as JSON lines before the rows are deleted).
+    Returns the number of ledger rows compacted. Runs in one transaction.
+    """
+    if archive not in ARCHIVE_MODES:
+        raise ValueError(f"Unknown archive mode: {archive!r}")
+    if archive == 'file' and not archive_path:
+        raise ValueError("archive='file' needs an archive_path")
+    boundary = month_start(min(before, datetime.utcnow()))
+    closed = db.and_(PotTransaction.date < boundary, compactable_rows())
+    columns = [PotTransaction.id, PotTransaction.pot_id, PotTransaction.user_id, PotTransaction.type,
+               PotTransaction.description, PotTransaction.amount, PotTransaction.currency,
+               PotTransaction.original_amount, PotTransaction.date]
+
+    totals = {}
+    archive_file = open(archive_path, 'a', encoding='utf-8') if archive == 'file' else None
+    try:
+        for row in db.session.execute(db.select(*columns).where(closed).execution_options(yield_per=STREAM_BATCH_SIZE)):
+            key = (row.pot_id, row.user_id, month_start(row.date))
+            entry = totals.setdefault(key, {'contributed': 0.0, 'net': 0.0, 'transaction_count': 0})
+            if row.type == 'Contribution':
+                entry['contributed'] += row.amount
+            entry['net'] += row.amount
+            entry['transaction_count'] += 1
+            if archive_file:
+                archive_file.write(json.dumps(dict(row._mapping, date=row.date.isoformat())) + '\n')
+    finally:
+        if archive_file:
+            archive_file.close()
+
+    if totals:
+        db.session.execute(db.insert(PotSnapshot), [
+            dict(entry, id=str(uuid.uuid4()), pot_id=pot_id, user_id=user_id, period_start=period)
+            for (pot_id, user_id, period), entry in totals.items()
+        ])
+    if archive == 'table':
+        db.session.execute(db.insert(PotTransactionArchive).from_select(
+            [c.key for c in columns], db.select(*columns).where(closed)))
+    if archive:
+        db.session.execute(db.delete(PotTransaction).where(closed))
+
+    db.session.execute(db.update(Pot).where(
+        db.or_(Pot.compacted_until.is_(None), Pot.compacted_until < boundary)
+    ).values(compacted_until=boundary, version=Pot.version + 1))
+    db.session.commit()
+    return sum(entry['transaction_count'] for entry in totals.values())
+
+def ledger_history_query(pot_id):
+    """ A pot's full ledger, archived rows included, oldest first. """
+    live = db.select(
+        PotTransaction.id, PotTransaction.user_id, PotTransaction.type, PotTransaction.description,
+        PotTransaction.amount, PotTransaction.currency, PotTransaction.original_amount, PotTransaction.date
+    ).where(PotTransaction.pot_id == pot_id)
+    archived = db.select(
+        PotTransactionArchive.id, PotTransactionArchive.user_id, PotTransactionArchive.type,
+        PotTransactionArchive.description, PotTransactionArchive.amount, PotTransactionArchive.currency,
+        PotTransactionArchive.original_amount, PotTransactionArchive.date
+    ).where(PotTransactionArchive.pot_id == pot_id)
+    history = db.union_all(live, archived).subquery()
+    return db.select(history).order_by(history.c.date, history.c.id)
+
+# --- Exports (CSV / JSON lines, streamed) ---
+# Rows come from a server-side cursor (iter_rows) and are encoded one at a time, so
+# memory stays flat however long the history is. Every export takes ?format=csv
+# (default) or jsonl, and ?from= / ?to= dates (ISO; a bare 'to' date is inclusive).
+def parse_export_date(value, end=False):
+    moment = datetime.fromisoformat(value)
+    if end and len(value) == 10: # YYYY-MM-DD: up to the end of that day
+        moment += timedelta(days=1)
+    return moment
+
+def export_range(column):
+    """ WHERE clauses for the request's ?from= / ?to= on `column`; ValueError if malformed. """
+    clauses = []
+    if request.args.get('from'):
+        clauses.append(column >= parse_export_date(request.args['from']))
+    if request.args.get('to'):
+        end = parse_export_date(request.args['to'], end=True)
+        clauses.append(column < end if len(request.args['to']) == 10 else column <= end)
+    return clauses
+
+def export_response(stmt, columns, mapper, filename):
+    return stream_export(iter_rows(stmt, mapper), columns, request.args.get('format', 'csv'), filename)
+
+def iso(moment):
+    return moment.isoformat() if moment else None
+
+LEDGER_EXPORT_COLUMNS = ['id', 'date', 'type', 'description', 'amount', 'currency', 'original_amount',
+                         'user_id', 'user_name']
+REQUEST_EXPORT_COLUMNS = ['id', 'type', 'title', 'subtitle', 'status', 'total_amount', 'currency', 'created_at',
+                          'split_deadline', 'invoice_vat_percent', 'invoice_note']
+ITEM_EXPORT_COLUMNS = ['id', 'request_id', 'request_title', 'description', 'amount', 'currency',
+                       'paid_by_user_id', 'paid_by_name', 'is_approved', 'created_at']
+COMMENT_EXPORT_COLUMNS = ['id', 'request_id', 'user_id', 'user_name', 'text', 'image_url', 'created_at']
+
+def ledger_export_entry(row):
+    return {
+        'id': row.id, 'date': iso(row.date), 'type': row.type, 'description': row.description,
+        'amount': row.amount, 'currency': row.currency, 'original_amount': row.original_amount,
+        'user_id': row.user_id, 'user_name': row.user_name
+    }
+
+def request_export_entry(row):
+    return dict(row._mapping, created_at=iso(row.created_at), split_deadline=iso(row.split_deadline))
+
+def item_export_entry(row):
+    return dict(row._mapping, created_at=iso(row.created_at))
+
+def comment_export_entry(row):
+    return dict(row._mapping, created_at=iso(row.created_at))
+
+@api.route('/api/export/pots/<pot_id>/ledger', methods=['GET'])
+def export_pot_ledger(pot_id):
+    """ A pot statement: its full ledger (archived rows included), oldest first """
+    pot = db.session.execute(pot_query(pot_id)).first()
+    if not pot:
+        return jsonify({'error': 'Pot not found'}), 404
+    if pot.admin_id != CURRENT_USER_ID:
+        return jsonify({'error': 'Only admin can export the ledger'}), 403
+    history = ledger_history_query(pot_id).subquery()
+    try:
+        stmt = db.select(history, User.name.label('user_name')
+        ).join(User, User.id == history.c.user_id
+        ).where(*export_range(history.c.date)
+        ).order_by(history.c.date, history.c.id)
+        return export_response(stmt, LEDGER_EXPORT_COLUMNS, ledger_export_entry, f'pot-{pot_id}-ledger')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api.route('/api/export/requests', methods=['GET'])
+def export_requests():
+    """ The current user's invoice/split book (?type=invoice|split), by creation date """
+    try:
+        stmt = db.select(*(getattr(Request, column) for column in REQUEST_EXPORT_COLUMNS)
+        ).where(Request.creator_id == CURRENT_USER_ID, *export_range(Request.created_at))
+        if request.args.get('type'):
+            stmt = stmt.where(Request.type == request.args['type'])
+        stmt = stmt.order_by(Request.created_at, Request.id)
+        return export_response(stmt, REQUEST_EXPORT_COLUMNS, request_export_entry, 'requests')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api.route('/api/export/requests/items', methods=['GET'])
+def export_request_items():
+    """ Line items of the current user's requests (?type=invoice|split), by creation date """
+    try:
+        stmt = db.select(
+            RequestItem.id, RequestItem.request_id, Request.title.label('request_title'),
+            RequestItem.description, RequestItem.amount,
+            db.func.coalesce(RequestItem.currency, Request.currency).label('currency'), RequestItem.paid_by_user_id,
+            User.name.label('paid_by_name'), RequestItem.is_approved, RequestItem.created_at
+        ).join(Request, Request.id == RequestItem.request_id
+        ).outerjoin(User, User.id == RequestItem.paid_by_user_id
+        ).where(Request.creator_id == CURRENT_USER_ID, *export_range(RequestItem.created_at))
+        if request.args.get('type'):
+            stmt = stmt.where(Request.type == request.args['type'])
+        stmt = stmt.order_by(RequestItem.created_at, RequestItem.id)
+        return export_response(stmt, ITEM_EXPORT_COLUMNS, item_export_entry, 'request-items')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@api.route('/api/export/comments', methods=['GET'])
+def export_comments():
+    """ Comment history of the current user's requests (or one of them, ?request_id=) """
+    try:
+        stmt = db.select(
+            Comment.id, Comment.request_id, Comment.user_id, User.name.label('user_name'),
+            Comment.text_content.label('text'), Comment.image_url, Comment.created_at
+        ).join(Request, Request.id == Comment.request_id
+        ).join(User, User.id == Comment.user_id
+        ).where(Request.creator_id == CURRENT_USER_ID, *export_range(Comment.created_at))
+        if request.args.get('request_id'):
+            stmt = stmt.where(Comment.request_id == request.args['request_id'])
+        stmt = stmt.order_by(Comment.created_at, Comment.id)
+        return export_response(stmt, COMMENT_EXPORT_COLUMNS, comment_export_entry, 'comments')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+# --- Search ---
+SEARCH_MAX_PER_PAGE = 100
+
+def search_result_entry(row):
+    scope = 'pot_id' if row.kind == 'pot_transaction' else 'request_id'
+    return {
+        'kind': row.kind,
+        'id': row.doc_id,
+        scope: row.scope_id,
+        'title': row.title,
+        'snippet': row.snippet,
+        'created_at': iso(row.created_at),
+        'score': round(-row.score, 4), # bm25() is lower-is-better
+    }
+
+@api.route('/api/search', methods=['GET'])
+def search_documents():
+    """
+    Ranked full-text search over the requests, items, comments and pot ledgers the
+    current user can see. ?q=, optional ?kind=, ?from=/?to=, ?page= and ?per_page=.
+    """
+    if not search.supported(db.session.connection()):
+        return jsonify({'error': 'Search needs the SQLite FTS5 index'}), 501
+    match = search.match_query(request.args.get('q'))
+    if not match:
+        return jsonify({'error': 'q is required'}), 400
+    kind = request.args.get('kind')
+    if kind and kind not in search.KINDS:
+        return jsonify({'error': f"kind must be one of {', '.join(search.KINDS)}"}), 400
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 20)), 1), SEARCH_MAX_PER_PAGE)
+        start = parse_export_date(request.args['from']) if request.args.get('from') else None
+        end = parse_export_date(request.args['to'], end=True) if request.args.get('to') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # One extra row tells whether there is a next page without a count(*) over all matches.
+    stmt = search.search_statement(CURRENT_USER_ID, match, kind, start, end,
+                                   limit=per_page + 1, offset=(page - 1) * per_page)
+    rows = db.session.execute(stmt).all()
+    return jsonify({
+        'query': request.args['q'],
+        'page': page,
+        'per_page': per_page,
+        'has_more': len(rows) > per_page,
+        'results': [search_result_entry(row) for row in rows[:per_page]],
+    })
+
+# --- CLI: Seeding is explicit and never happens on import or on serve ---
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """ Create the tables and seed the demo data (only backfills contact keys if users exist). """
+    try:
+        create_db_and_seed()
+    except StaleSchemaError as e:
+        raise click.ClickException(str(e))
+
+@click.command('reset-db')
+@with_appcontext
+def reset_db_command():
+    """ Drop all tables, then recreate and reseed the demo data. """
+    db.drop_all()
+    current_app.extensions['contacts'].clear()
+    read_cache().clear() # versions restart at 1
+    create_db_and_seed()
+    click.echo("--- Database has been reset and seeded for testing! ---")
+
+@click.command('compact-ledger')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Close months before this date (default: the start of this month).')
+@click.option('--archive', type=click.Choice(['none', 'table', 'file']), default='none',
+              help='Where the compacted raw rows go.')
+@click.option('--archive-path', default='pot_ledger_archive.jsonl', help="File for --archive file.")
+@with_appcontext
+def compact_ledger_command(before, archive, archive_path):
+    """ Roll closed months of every pot ledger into snapshot rows. """
+    rows = compact_ledger(before or datetime.utcnow(), None if archive == 'none' else archive, archive_path)
+    click.echo(f"Compacted {rows} ledger rows.")
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """ Create the full-text index if missing and refill it from the current rows. """
+    with db.engine.begin() as conn:
+        if not search.supported(conn):
+            raise click.ClickException('The search index needs SQLite (FTS5).')
+        documents = search.rebuild_index(conn)
+    click.echo(f"Indexed {documents} documents.")
+
+@click.command('recompute-scores')
+@with_appcontext
+def recompute_scores_command():
+    """ Recompute every user's trust score from payment history (run nightly: overdue is time-based). """
+    started = time.perf_counter()
+    updated = refresh_scores()
+    db.session.commit()
+    click.echo(f"Updated {updated} scores in {time.perf_counter() - started:.1f}s.")
+
+@click.command('import-fx-rates')
+@click.argument('path', type=click.File('r', encoding='utf-8'))
+@with_appcontext
+def import_fx_rates_command(path):
+    """ Load exchange rates from a CSV file with columns currency,effective_date (YYYY-MM-DD),rate (units per euro). """
+    try:
+        rows = [(fx.parse_currency(row['currency']), date.fromisoformat(row['effective_date']), float(row['rate']))
+                for row in csv.DictReader(path)]
+    except (KeyError, ValueError) as e:
+        raise click.ClickException(f'Bad rate file: {e}')
+    stored = import_fx_rates(rows)
+    db.session.commit()
+    click.echo(f"Stored {stored} exchange rates.")
+
+# --- Application Factory ---
+def create_app(config=None):
+    """
+    Builds the Flask app and binds the database. Does no I/O beyond that.
+    Seed or reset the demo database separately:
+        flask --app app seed
+        flask --app app reset-db
+    """
+    app = Flask(__name__)
+    CORS(app)  # Allow your index.html (served from a different origin) to call this API
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('MAXI_DATABASE_URI', DEFAULT_DATABASE_URI)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['OCR_BACKEND'] = os.environ.get('MAXI_OCR_BACKEND', 'fake') # 'fake' or 'vision'
+    app.config['JSON_BACKEND'] = os.environ.get('MAXI_JSON_BACKEND', 'auto') # 'auto', 'orjson' or 'stdlib'
+    # Batch contribution inserts into shared transactions (see group_commit.py)
+    app.config['CONTRIBUTION_GROUP_COMMIT'] = os.environ.get('MAXI_CONTRIBUTION_GROUP_COMMIT') == '1'
+    app.config['GROUP_COMMIT_WINDOW_MS'] = 5
+    app.config['GROUP_COMMIT_MAX_BATCH'] = 256
+    app.config['CONTACT_CACHE_SIZE'] = 10000 # Hot contacts kept per worker (contacts.py)
+    # Read cache for hot paths (cache.py): 'local' (per process), 'shared' (one SQLite file per host) or 'none'
+    app.config['CACHE_BACKEND'] = os.environ.get('MAXI_CACHE_BACKEND', 'local')
+    app.config['CACHE_PATH'] = os.environ.get('MAXI_CACHE_PATH', os.path.join(basedir, 'maxi-cache.db'))
+    app.config['CACHE_SIZE'] = 10000
+    if config:
+        app.config.update(config)
+
+    app.json = make_json_provider(app, app.config['JSON_BACKEND'])
+    http_cache.init_app(app)
+
+    db.init_app(app)
+    app.extensions['contacts'] = ContactResolver(User, app.config['CONTACT_CACHE_SIZE'])
+    app.extensions['cache'] = Cache(make_backend(app.config['CACHE_BACKEND'], app.config['CACHE_PATH'],
+                                                 app.config['CACHE_SIZE']))
+    app.register_blueprint(api)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(reset_db_command)
+    app.cli.add_command(compact_ledger_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(recompute_scores_command)
+    app.cli.add_command(import_fx_rates_command)
+    return app
+
 # --- Main Runner ---
 if __name__ == "__main__":
-    # Create the database and seed it on first run
-    db_path = os.path.join(basedir, 'maxi.db')
-    if not os.path.exists(db_path):
-        create_db_and_seed()
-    
-    # --- MODIFICATION: Run `create_db_and_seed` every time for testing ---
-    # This is helpful during development to ensure your seed data is always fresh.
-    # Comment this out when you want persistence between runs.
+    # Serving only. Seed the database explicitly first, e.g. `flask --app app reset-db`.
+    app = create_app()
     with app.app_context():
-        db.drop_all() # Drop all tables
-        create_db_and_seed() # Recreate and seed
-        print("--- Database has been reset and seeded for testing! ---")
-    
-    app.run(debug=True, port=5000)
\ No newline at end of file
+        missing = missing_columns()
+    if missing:
+        raise SystemExit(f"The database predates this version (missing {', '.join(missing)}). "
+                         "Recreate it with `flask --app app reset-db`.")
+    app.run(debug=True, port=5000)
@@ -0,0 +1,223 @@
+"""
+Async (ASGI) serving mode.
+
+    uvicorn --factory asgi:create_asgi_app --port 5000
+
+The read-heavy dashboard endpoints and /scan-invoice run as native async handlers
+on an async SQLAlchemy engine (aiosqlite for SQLite). They run the same statements,
+row mappers and ETag validators as the WSGI routes in app.py, so responses are
+identical. Every other route is served by the regular Flask app mounted underneath,
+which keeps the write paths on one code path.
+
+While a handler waits on the database or the OCR backend it holds no thread, so one
+process can keep thousands of dashboard connections open. Needs `starlette` and
+`aiosqlite` (plus `uvicorn` or another ASGI server to run it).
+"""
+import base64
+import contextlib
+from datetime import datetime
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import quote_etag
+
+import app as maxi
+import http_cache
+from serialization import aiter_json_array, aiter_json_object
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+def async_database_uri(uri):
+    """ The async-driver twin of a sync SQLAlchemy URI, e.g. sqlite:/// -> sqlite+aiosqlite:/// """
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {uri!r}; set ASYNC_DATABASE_URI")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def _wsgi_adapter(flask_app):
+    try:
+        from a2wsgi import WSGIMiddleware
+    except ImportError:
+        from starlette.middleware.wsgi import WSGIMiddleware
+    return WSGIMiddleware(flask_app)
+
+
+# --- Response helpers ---
+def _json(request, obj, etag=None, status=200):
+    headers = {'ETag': quote_etag(etag, weak=True)} if etag else None
+    body = request.app.state.dumpb(obj)
+    return Response(body, status_code=status, media_type='application/json', headers=headers)
+
+
+def _not_modified(request, endpoint, etag):
+    if http_cache.is_fresh(request.headers.get('if-none-match'), etag, endpoint):
+        return Response(status_code=304, headers={'ETag': quote_etag(etag, weak=True)})
+    return None
+
+
+def _wants_stream(request):
+    return request.query_params.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def _streamed(request, chunks, etag):
+    return StreamingResponse(chunks, media_type='application/json',
+                             headers={'ETag': quote_etag(etag, weak=True)})
+
+
+async def _stream_rows(sessions, stmt, mapper):
+    """ Rows from a server-side cursor on a session that lives as long as the stream. """
+    async with sessions() as session:
+        result = await session.stream(stmt.execution_options(yield_per=maxi.STREAM_BATCH_SIZE))
+        async for row in result:
+            yield mapper(row)
+
+
+async def _all(session, stmt):
+    return (await session.execute(stmt)).all()
+
+
+# --- Async read endpoints (mirror the WSGI routes of the same name) ---
+async def get_all_pots(request):
+    user_id = maxi.CURRENT_USER_ID
+    async with request.app.state.sessions() as session:
+        etag = maxi.list_etag('pots', user_id, await _all(session, maxi.pot_versions_query(user_id)))
+        cached = _not_modified(request, 'api.get_all_pots', etag)
+        if cached:
+            return cached
+        rows = await _all(session, maxi.pots_summary_query(user_id))
+    return _json(request, [maxi.pot_summary_entry(row) for row in rows], etag)
+
+
+async def get_pot_details(request):
+    user_id = maxi.CURRENT_USER_ID
+    sessions = request.app.state.sessions
+    async with sessions() as session:
+        pot = (await session.execute(maxi.pot_query(request.path_params['pot_id']))).first()
+        if not pot:
+            return JSONResponse({'error': 'Pot not found'}, status_code=404)
+        etag = maxi.pot_etag(pot, user_id)
+        cached = _not_modified(request, 'api.get_pot_details', etag)
+        if cached:
+            return cached
+        total_balance = (await session.execute(maxi.pot_balance_query(pot.id))).scalar()
+        schedule_data = maxi.schedule_entry((await session.execute(maxi.schedule_query(pot.id))).first())
+        tally_data = [maxi.tally_entry(row) for row in await _all(session, maxi.pot_tally_query(pot.id))]
+        details = maxi.pot_details_head(pot, total_balance, schedule_data, tally_data, user_id)
+        if not _wants_stream(request):
+            details['transactionFeed'] = [maxi.pot_feed_entry(row) for row in await _all(session, maxi.pot_feed_query(pot.id))]
+            return _json(request, details, etag)
+    feed = _stream_rows(sessions, maxi.pot_feed_query(pot.id), maxi.pot_feed_entry)
+    return _streamed(request, aiter_json_object(details, 'transactionFeed', feed, request.app.state.dumpb), etag)
+
+
+async def _request_list(request, endpoint, kind, versions_query, list_query, mapper):
+    user_id = maxi.CURRENT_USER_ID
+    now = datetime.utcnow()
+    sessions = request.app.state.sessions
+    async with sessions() as session:
+        etag = maxi.list_etag(kind, user_id, await _all(session, versions_query(user_id, now)))
+        cached = _not_modified(request, endpoint, etag)
+        if cached:
+            return cached
+        if not _wants_stream(request):
+            rows = await _all(session, list_query(user_id))
+            return _json(request, [mapper(row, now) for row in rows], etag)
+    rows = _stream_rows(sessions, list_query(user_id), lambda row: mapper(row, now))
+    return _streamed(request, aiter_json_array(rows, request.app.state.dumpb), etag)
+
+
+async def get_sent_requests(request):
+    return await _request_list(request, 'api.get_sent_requests', 'sent', maxi.sent_versions_query,
+                               maxi.sent_requests_query, maxi.sent_request_entry)
+
+
+async def get_received_requests(request):
+    return await _request_list(request, 'api.get_received_requests', 'received', maxi.received_versions_query,
+                               maxi.received_requests_query, maxi.received_request_entry)
+
+
+async def get_request_details(request):
+    user_id = maxi.CURRENT_USER_ID
+    now = datetime.utcnow()
+    sessions = request.app.state.sessions
+    async with sessions() as session:
+        req = (await session.execute(maxi.request_query(request.path_params['request_id']))).first()
+        if not req:
+            return JSONResponse({'error': 'Request not found'}, status_code=404)
+        etag = maxi.request_etag(req, user_id, now)
+        cached = _not_modified(request, 'api.get_request_details', etag)
+        if cached:
+            return cached
+        items = await _all(session, maxi.request_items_query(req.id))
+        participants = await _all(session, maxi.request_participants_query(req.id))
+        details = maxi.request_details_head(req, items, participants, user_id, now)
+        if not _wants_stream(request):
+            details['comments'] = [maxi.comment_entry(row) for row in await _all(session, maxi.comments_query(req.id))]
+            return _json(request, details, etag)
+    comments = _stream_rows(sessions, maxi.comments_query(req.id), maxi.comment_entry)
+    return _streamed(request, aiter_json_object(details, 'comments', comments, request.app.state.dumpb), etag)
+
+
+async def scan_invoice(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not data or "image" not in data:
+        return JSONResponse({"error": "Missing image data"}, status_code=400)
+    try:
+        image_data = base64.b64decode(data["image"])
+    except Exception as e:
+        return JSONResponse({"error": f"Invalid base64 image: {e}"}, status_code=400)
+    try:
+        full_text = await maxi.run_ocr_async(image_data, request.app.state.flask_app.config['OCR_BACKEND'])
+        return _json(request, maxi.parse_ocr_text(full_text))
+    except Exception as e:
+        return JSONResponse({"error": f"An error occurred: {e}"}, status_code=500)
+
+
+# --- Application Factory ---
+def create_asgi_app(config=None):
+    """
+    Builds the ASGI app: async handlers for the read endpoints and /scan-invoice,
+    everything else delegated to create_app(config) through a WSGI adapter.
+    """
+    flask_app = maxi.create_app(config)
+    flask_app.config.setdefault('ASYNC_POOL_SIZE', 20)
+    uri = flask_app.config.get('ASYNC_DATABASE_URI') or async_database_uri(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+    engine = create_async_engine(uri, pool_size=flask_app.config['ASYNC_POOL_SIZE'], max_overflow=0)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(asgi_app):
+        yield
+        await engine.dispose()
+
+    routes = [
+        Route('/api/pots', get_all_pots, methods=['GET']),
+        Route('/api/pots/{pot_id}', get_pot_details, methods=['GET']),
+        Route('/api/requests/sent', get_sent_requests, methods=['GET']),
+        Route('/api/requests/received', get_received_requests, methods=['GET']),
+        Route('/api/requests/{request_id}', get_request_details, methods=['GET']),
+        Route('/scan-invoice', scan_invoice, methods=['POST']),
+        # Same paths with other methods (and every other route) fall through to Flask.
+        Mount('/', app=_wsgi_adapter(flask_app)),
+    ]
+    middleware = [
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        Middleware(GZipMiddleware, minimum_size=flask_app.config['COMPRESS_MIN_BYTES']),
+    ]
+    asgi_app = Starlette(routes=routes, middleware=middleware, lifespan=lifespan)
+    asgi_app.state.flask_app = flask_app
+    asgi_app.state.engine = engine
+    asgi_app.state.sessions = async_sessionmaker(engine, expire_on_commit=False)
+    asgi_app.state.dumpb = flask_app.json.dumpb
+    return asgi_app
@@ -0,0 +1,164 @@
+"""
+Concurrency load test: current WSGI mode vs the async (ASGI) serving mode.
+
+Starts each server in its own process against the same database, then drives the
+dashboard read endpoints with an increasing number of concurrent connections. For
+every level it records throughput, p50/p99 latency and error rate; the
+"concurrency limit" of a mode is the highest level that still meets the SLO
+(error rate <= 1% and p99 <= --slo-ms). Results are written as JSON:
+
+    python bench_concurrency.py --levels 10 100 500 1000 2000 --duration 10
+
+Needs httpx and uvicorn. Raise `ulimit -n` before testing thousands of connections,
+and give the load generator its own cores if you can: on a single CPU it competes
+with the server and flattens the difference between the modes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench_endpoints import percentile
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+DASHBOARD_URLS = ['/api/requests/received', '/api/requests/sent', '/api/pots']
+
+SERVERS = {
+    # What `python app.py` runs today: Werkzeug, one thread per request.
+    'wsgi': [sys.executable, '-c',
+             "import sys, app; from werkzeug.serving import run_simple; "
+             "run_simple('127.0.0.1', int(sys.argv[1]), app.create_app(), threaded=True)"],
+    'asgi': [sys.executable, '-m', 'uvicorn', '--factory', 'asgi:create_asgi_app',
+             '--host', '127.0.0.1', '--log-level', 'warning', '--no-access-log', '--port'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, database):
+    port = free_port()
+    env = dict(os.environ, MAXI_DATABASE_URI=database)
+    proc = subprocess.Popen(SERVERS[mode] + [str(port)], cwd=HERE, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+async def run_level(base_url, concurrency, duration, timeout):
+    import httpx
+    latencies, errors = [], 0
+    # No keep-alive: httpx's pool gets CPU-bound with hundreds of idle connections, which
+    # would measure the client instead of the server (Werkzeug closes them anyway).
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    stop_at = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        async def worker(n):
+            nonlocal errors
+            i = n
+            while time.perf_counter() < stop_at:
+                url = DASHBOARD_URLS[i % len(DASHBOARD_URLS)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append((time.perf_counter() - started) * 1000.0)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    total = len(latencies) + errors
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+        'error_rate': round(errors / total, 4) if total else 1.0,
+    }
+
+
+def concurrency_limit(levels, slo_ms):
+    passing = [lvl['concurrency'] for lvl in levels
+               if lvl['error_rate'] <= 0.01 and lvl['p99_ms'] is not None and lvl['p99_ms'] <= slo_ms]
+    return max(passing) if passing else 0
+
+
+def seed_database(database):
+    import app as maxi
+    flask_app = maxi.create_app({'SQLALCHEMY_DATABASE_URI': database})
+    with flask_app.app_context():
+        maxi.create_db_and_seed()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare WSGI and ASGI serving under concurrent load.')
+    parser.add_argument('--database', help='SQLAlchemy URI of a file database (default: a seeded temp copy)')
+    parser.add_argument('--modes', nargs='*', default=['wsgi', 'asgi'], choices=sorted(SERVERS))
+    parser.add_argument('--levels', nargs='*', type=int, default=[10, 100, 500, 1000, 2000])
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per level')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Per-request timeout in seconds')
+    parser.add_argument('--slo-ms', type=float, default=1000.0, help='p99 latency budget for the limit')
+    parser.add_argument('--output', default='bench_concurrency.json')
+    args = parser.parse_args(argv)
+
+    database = args.database
+    if not database:
+        database = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'maxi.db')
+        seed_database(database)
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'database': database,
+        'duration_s': args.duration,
+        'slo_ms': args.slo_ms,
+        'modes': {},
+    }
+    for mode in args.modes:
+        proc, base_url = start_server(mode, database)
+        try:
+            levels = []
+            for concurrency in args.levels:
+                result = asyncio.run(run_level(base_url, concurrency, args.duration, args.timeout))
+                levels.append(result)
+                print(f"  {mode:<5} c={concurrency:<6} {result['throughput_rps']:>8.1f} req/s  "
+                      f"p50 {result['p50_ms']}ms  p99 {result['p99_ms']}ms  errors {result['error_rate']:.2%}")
+        finally:
+            proc.terminate()
+            proc.wait()
+        report['modes'][mode] = {'levels': levels, 'concurrency_limit': concurrency_limit(levels, args.slo_ms)}
+        print(f"  {mode}: concurrency limit {report['modes'][mode]['concurrency_limit']}")
+
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
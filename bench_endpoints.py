@@ -0,0 +1,206 @@
+"""
+Endpoint load benchmark.
+
+Runs every route registered in app.py against a database (normally one built by
+seed_large.py) and reports p50/p99 latency and SQL queries per call. Results are
+written as JSON so runs can be compared across changes:
+
+    python seed_large.py --database sqlite:///bench.db --users 10000 ...
+    python bench_endpoints.py --database sqlite:///bench.db --iterations 50 --output bench_results.json
+
+Write endpoints are exercised too, so never point this at a database you care about.
+"""
+import argparse
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+
+from seed_large import DEFAULT_DATABASE
+
+
+def percentile(samples, pct):
+    """ Nearest-rank percentile of a list of numbers. """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class QueryCounter:
+    """ Counts statements executed on an engine via SQLAlchemy's cursor event. """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def sample_ids(models):
+    """ Pick existing ids for URL parameters, preferring rows the demo user can act on. """
+    m = models
+    pot = m.Pot.query.filter_by(admin_id=m.CURRENT_USER_ID).first() or m.Pot.query.first()
+    req = (m.Request.query.filter_by(creator_id=m.CURRENT_USER_ID, type='split').first()
+           or m.Request.query.first())
+    return {
+        'pot_id': pot.id if pot else 'missing',
+        'request_id': req.id if req else 'missing',
+    }
+
+
+def build_cases(models, ids):
+    """
+    One case per route: (endpoint, method, path factory, json body factory).
+    Factories take the iteration number so write endpoints create fresh rows.
+    """
+    m = models
+    pot_id = ids['pot_id']
+    request_id = ids['request_id']
+
+    def new_item(i):
+        # approve_expense needs an unapproved item on a request the demo user created.
+        item = m.RequestItem(request_id=request_id, description=f'Bench item {i}',
+                             amount=10.0, paid_by_user_id=m.CURRENT_USER_ID, is_approved=False)
+        m.db.session.add(item)
+        m.db.session.commit()
+        return item.id
+
+    return {
+        'get_all_pots': ('GET', lambda i: '/api/pots', None),
+        'get_pot_details': ('GET', lambda i: f'/api/pots/{pot_id}', None),
+        'create_pot': ('POST', lambda i: '/api/pots',
+                       lambda i: {'name': f'Bench pot {i}', 'schedule': {'amount': 10, 'frequency': 'Monthly', 'due_day': 1}}),
+        'make_contribution': ('POST', lambda i: f'/api/pots/{pot_id}/contributions',
+                              lambda i: {'amount': 5, 'description': 'Bench contribution'}),
+        'log_pot_expense': ('POST', lambda i: f'/api/pots/{pot_id}/expenses',
+                            lambda i: {'amount': 1, 'description': 'Bench expense'}),
+        'update_schedule': ('PUT', lambda i: f'/api/pots/{pot_id}/schedule',
+                            lambda i: {'amount': 20, 'frequency': 'Monthly', 'due_day': 1}),
+        'get_sent_requests': ('GET', lambda i: '/api/requests/sent', None),
+        'get_received_requests': ('GET', lambda i: '/api/requests/received', None),
+        'get_request_details': ('GET', lambda i: f'/api/requests/{request_id}', None),
+        'post_comment': ('POST', lambda i: f'/api/requests/{request_id}/comments',
+                         lambda i: {'text': f'Bench comment {i}'}),
+        'add_split_expense': ('POST', lambda i: f'/api/requests/{request_id}/expenses',
+                              lambda i: {'description': f'Bench expense {i}', 'amount': 12.5, 'user_id': m.CURRENT_USER_ID}),
+        'approve_expense': ('POST', lambda i: f'/api/requests/items/{new_item(i)}/approve', None),
+        'add_split_expenses': ('POST', lambda i: f'/api/requests/{request_id}/expenses/batch',
+                               lambda i: {'expenses': [{'description': f'Bench receipt {i}.{n}', 'amount': 4.5}
+                                                       for n in range(10)]}),
+        'approve_expenses': ('POST', lambda i: f'/api/requests/{request_id}/items/approve',
+                             lambda i: {'item_ids': [new_item(f'{i}.{n}') for n in range(10)]}),
+        'preview_request_settlement': ('POST', lambda i: f'/api/requests/{request_id}/preview',
+                                       lambda i: {'add': [{'description': f'What if {i}', 'amount': 30}]}),
+        'export_pot_ledger': ('GET', lambda i: f'/api/export/pots/{pot_id}/ledger', None),
+        'export_requests': ('GET', lambda i: '/api/export/requests?format=jsonl', None),
+        'export_request_items': ('GET', lambda i: '/api/export/requests/items', None),
+        'export_comments': ('GET', lambda i: '/api/export/comments?format=jsonl', None),
+        'search_documents': ('GET', lambda i: '/api/search?q=dinner', None),
+        'create_invoice': ('POST', lambda i: '/api/requests/invoice',
+                           lambda i: {'clientName': 'User 1', 'totalWithVat': 121.0, 'nextSteps': 'Pay soon',
+                                      'vat': 21.0, 'items': [{'desc': 'Work', 'amount': 100.0}]}),
+        'create_split': ('POST', lambda i: '/api/requests/split',
+                         lambda i: {'title': f'Bench split {i}', 'deadlineHours': 0,
+                                    'participants': ['User 1', 'User 2', 'User 3'],
+                                    'expenses': [{'desc': 'Dinner', 'amount': 90.0}]}),
+        'scan_invoice': ('POST', lambda i: '/scan-invoice', lambda i: {'image': ''}),
+        'get_http_cache_metrics': ('GET', lambda i: '/api/metrics/http-cache', None),
+    }
+
+
+def run(models, flask_app, iterations=20, warmup=2, only=None):
+    """ Benchmark every route in the app; returns a results dict. """
+    results = {}
+    with flask_app.app_context():
+        counter = QueryCounter(models.db.engine)
+        ids = sample_ids(models)
+        cases = build_cases(models, ids)
+        client = flask_app.test_client()
+
+        # Cases are keyed by view name, without the blueprint prefix ('api.').
+        endpoints = sorted({rule.endpoint.rpartition('.')[2] for rule in flask_app.url_map.iter_rules()
+                            if rule.endpoint != 'static'})
+        missing = [e for e in endpoints if e not in cases]
+        if missing:
+            raise SystemExit(f"No benchmark case for route(s): {', '.join(missing)}")
+
+        for endpoint in endpoints:
+            if only and endpoint not in only:
+                continue
+            method, path, body = cases[endpoint]
+            latencies, queries, statuses = [], [], set()
+            for i in range(warmup + iterations):
+                url = path(i)  # may itself run setup queries, so resolve before counting
+                payload = body(i) if body else None
+                models.db.session.remove()
+                before = counter.count
+                started = time.perf_counter()
+                response = client.open(url, method=method, json=payload)
+                response.get_data()  # drain streamed bodies (exports) inside the timing
+                elapsed = time.perf_counter() - started
+                response.close()
+                if i >= warmup:
+                    latencies.append(elapsed * 1000.0)
+                    queries.append(counter.count - before)
+                    statuses.add(response.status_code)
+            results[endpoint] = {
+                'method': method,
+                'iterations': iterations,
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'mean_ms': round(statistics.fmean(latencies), 3),
+                'queries_per_call': round(statistics.fmean(queries), 2),
+                'max_queries': max(queries),
+                'status_codes': sorted(statuses),
+            }
+            r = results[endpoint]
+            print(f"  {endpoint:<24} p50 {r['p50_ms']:>9.2f}ms  p99 {r['p99_ms']:>9.2f}ms  "
+                  f"queries {r['queries_per_call']:>8.1f}  {r['status_codes']}")
+    return results
+
+
+def table_sizes(models, flask_app):
+    with flask_app.app_context():
+        conn = models.db.session.connection()
+        return {
+            table.name: conn.execute(models.db.select(models.db.func.count()).select_from(table)).scalar()
+            for table in models.db.metadata.sorted_tables
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every Maxi API route.')
+    parser.add_argument('--database', default=DEFAULT_DATABASE)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', nargs='*', help='Restrict to these endpoint names')
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args(argv)
+
+    import app as models
+
+    flask_app = models.create_app({'SQLALCHEMY_DATABASE_URI': args.database})
+    sizes = table_sizes(models, flask_app)
+    print(f"Benchmarking {args.database} ({sizes.get('user', 0)} users, {sizes.get('pot_transaction', 0)} pot transactions)")
+    results = run(models, flask_app, iterations=args.iterations, warmup=args.warmup, only=args.only)
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'database': args.database,
+        'python': platform.python_version(),
+        'iterations': args.iterations,
+        'table_sizes': sizes,
+        'endpoints': results,
+    }
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
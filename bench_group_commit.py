@@ -0,0 +1,112 @@
+"""
+Contribution burst benchmark: per-request commits vs the group-commit writer.
+
+Simulates a pot's due_day, when every member contributes at about the same time:
+N threads each POST to /api/pots/<id>/contributions as fast as they can, first
+with one transaction per request, then with CONTRIBUTION_GROUP_COMMIT on. Each
+mode runs on its own freshly seeded file database, since the cost being measured
+is the commit (fsync) itself. Results are written as JSON:
+
+    python bench_group_commit.py --threads 1 8 32 64 --requests 200
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from bench_endpoints import percentile
+
+MODES = {'per-request': False, 'group-commit': True}
+
+
+def build_app(group_commit, window_ms):
+    import app as maxi
+    database = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'maxi.db')
+    flask_app = maxi.create_app({'SQLALCHEMY_DATABASE_URI': database,
+                                 'CONTRIBUTION_GROUP_COMMIT': group_commit,
+                                 'GROUP_COMMIT_WINDOW_MS': window_ms})
+    with flask_app.app_context():
+        maxi.create_db_and_seed()
+        maxi.db.session.remove()
+    return flask_app
+
+
+def run_burst(flask_app, threads, per_thread, pot_id):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    gate = threading.Barrier(threads)
+
+    def worker():
+        client = flask_app.test_client()
+        mine, failed = [], 0
+        gate.wait()
+        for _ in range(per_thread):
+            started = time.perf_counter()
+            response = client.post(f'/api/pots/{pot_id}/contributions', json={'amount': 1})
+            if response.status_code == 201:
+                mine.append((time.perf_counter() - started) * 1000.0)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'threads': threads,
+        'requests': threads * per_thread,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+        'errors': sum(errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare per-request commits with group commit for contributions.')
+    parser.add_argument('--threads', nargs='*', type=int, default=[1, 8, 32, 64])
+    parser.add_argument('--requests', type=int, default=200, help='Contributions per thread')
+    parser.add_argument('--window-ms', type=float, default=5.0, help='GROUP_COMMIT_WINDOW_MS')
+    parser.add_argument('--pot', default='pot-uuid-001')
+    parser.add_argument('--output', default='bench_group_commit.json')
+    args = parser.parse_args(argv)
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'requests_per_thread': args.requests,
+        'window_ms': args.window_ms,
+        'modes': {},
+    }
+    for mode, group_commit in MODES.items():
+        levels = []
+        for threads in args.threads:
+            flask_app = build_app(group_commit, args.window_ms)
+            result = run_burst(flask_app, threads, args.requests, args.pot)
+            writer = flask_app.extensions.get('group_commit')
+            if writer:
+                writer.close()
+                result['batches'] = writer.batches
+            levels.append(result)
+            print(f"  {mode:<12} threads={threads:<4} {result['throughput_rps']:>8.1f} req/s  "
+                  f"p50 {result['p50_ms']}ms  p99 {result['p99_ms']}ms  errors {result['errors']}")
+        report['modes'][mode] = levels
+
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Large-pool netting benchmark: simplify_debts vs the streaming engine (netting.py).
+
+Each case runs in a fresh process so its peak RSS is its own. The pool is random
+whole-cent balances summing to zero; transfers are consumed and counted, never
+collected. Results are written as JSON:
+
+    python bench_netting.py --balances 10000000 --baseline-balances 1000000 --cap 3
+
+simplify_debts holds a dict per person, so its baseline runs on a smaller pool
+by default; pass --baseline-balances 10000000 if the machine has the memory.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import time
+from datetime import datetime
+
+
+def random_cents(n, seed):
+    import numpy as np
+    cents = np.random.default_rng(seed).integers(-100000, 100000, size=n, dtype=np.int64)
+    cents[-1] -= cents.sum()
+    return cents
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0 # ru_maxrss is in KiB on Linux
+
+
+def run_case(case):
+    mode, n, cap, seed = case
+    cents = random_cents(n, seed)
+    baseline_mb = peak_rss_mb()
+    started = time.perf_counter()
+    transfers, volume = 0, 0
+    if mode == 'simplify_debts':
+        from app import simplify_debts
+        balances = {i: c / 100.0 for i, c in enumerate(cents.tolist())}
+        del cents
+        for tx in simplify_debts(input_balances=balances):
+            transfers += 1
+            volume += round(tx['amount'] * 100)
+    else:
+        from netting import stream_transfers
+        for _, _, amount in stream_transfers(cents, cap):
+            transfers += 1
+            volume += amount
+    elapsed = time.perf_counter() - started
+    return {
+        'mode': mode,
+        'balances': n,
+        'max_transfers': cap,
+        'seconds': round(elapsed, 2),
+        'balances_per_second': round(n / elapsed),
+        'transfers': transfers,
+        'volume_cents': volume,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'peak_rss_over_input_mb': round(peak_rss_mb() - baseline_mb, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark netting over very large balance pools.')
+    parser.add_argument('--balances', type=int, default=10_000_000)
+    parser.add_argument('--baseline-balances', type=int, default=1_000_000,
+                        help='Pool size for the simplify_debts baseline (0 to skip)')
+    parser.add_argument('--cap', type=int, default=3, help='max_transfers for the capped run (0 to skip)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_netting.json')
+    args = parser.parse_args(argv)
+
+    cases = [('stream', args.balances, None, args.seed)]
+    if args.cap:
+        cases.append(('stream', args.balances, args.cap, args.seed))
+    if args.baseline_balances:
+        cases += [('simplify_debts', args.baseline_balances, None, args.seed),
+                  ('stream', args.baseline_balances, None, args.seed)]
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for case in cases:
+        with context.Pool(1) as pool:
+            result = pool.apply(run_case, (case,))
+        results.append(result)
+        print(f"  {result['mode']:<15} n={result['balances']:<10} cap={result['max_transfers']!s:<5} "
+              f"{result['seconds']:>7.2f}s  {result['balances_per_second']:>10} balances/s  "
+              f"{result['transfers']} transfers  peak {result['peak_rss_mb']} MB "
+              f"(+{result['peak_rss_over_input_mb']} MB over the input)")
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'results': results,
+    }
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
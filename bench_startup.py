@@ -0,0 +1,81 @@
+"""
+Cold-start benchmark.
+
+Each run starts a fresh interpreter and measures how long it takes to import
+app.py, build the app with create_app(), and serve the first request. The demo
+data is seeded into an in-memory database between those steps (not timed), so
+only startup cost is measured. Results are written as JSON:
+
+    python bench_startup.py --runs 10 --output bench_startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+HEAVY_MODULES = ['google.cloud.vision', 'networkx', 'numpy']
+
+CHILD = r'''
+import json, sys, time
+t0 = time.perf_counter()
+import app as maxi
+t1 = time.perf_counter()
+flask_app = maxi.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+t2 = time.perf_counter()
+with flask_app.app_context():
+    maxi.create_db_and_seed()
+    client = flask_app.test_client()
+    t3 = time.perf_counter()
+    status = client.get('/api/pots').status_code
+    t4 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'first_request_ms': (t4 - t3) * 1000,
+    'time_to_first_request_ms': (t2 - t0 + t4 - t3) * 1000,
+    'status': status,
+    'heavy_modules': [m for m in %r if m in sys.modules],
+}))
+''' % (HEAVY_MODULES,)
+
+
+def run_once():
+    here = os.path.abspath(os.path.dirname(__file__))
+    out = subprocess.run([sys.executable, '-c', CHILD], cwd=here, capture_output=True, text=True, check=True)
+    # Seeding prints progress; the measurement is the last line.
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure import time and time-to-first-request.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', default='bench_startup.json')
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.runs)]
+    summary = {}
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'time_to_first_request_ms'):
+        values = [r[key] for r in runs]
+        summary[key] = {'median': round(statistics.median(values), 2), 'max': round(max(values), 2)}
+        print(f"  {key:<26} median {summary[key]['median']:>8.2f}ms  max {summary[key]['max']:>8.2f}ms")
+    heavy = sorted({m for r in runs for m in r['heavy_modules']})
+    print(f"  heavy modules imported: {', '.join(heavy) or 'none'}")
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'runs': args.runs,
+        'summary': summary,
+        'heavy_modules': heavy,
+    }
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
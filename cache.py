@@ -0,0 +1,198 @@
+"""
+Read cache for the hot paths (pot summaries, request details, user names, previews).
+
+Entries are never invalidated in place. Every key carries the version of the
+data it was computed from, so a write only has to move the version forward:
+
+* Pots and requests already have a version column that every write bumps (see
+  bump_version / claim_version in app.py). The routes read it anyway for their
+  ETags, so the cache key costs no extra query, and a worker that didn't see the
+  write still finds the new version in the database.
+* Users and exchange rates have no version column. Their keys carry the token
+  of a DataVersion row instead (data_version in app.py), which score refreshes
+  and rate imports bump in their own transaction. Being in the database, a bump
+  made by one worker or by a CLI command (recompute-scores, import-fx-rates)
+  reaches every other process, whatever the backend; a rolled-back bump was
+  never visible to anyone else.
+
+Old versions are never read again and age out of the backend.
+
+Backends (CACHE_BACKEND):
+
+    local   LocalBackend: in-process LRU. Right for one process (and tests); with
+            several workers, each caches on its own.
+    shared  SharedBackend: a SQLite file (CACHE_PATH) that every worker on the
+            host reads and writes. It is also usable in tests with a temp file.
+    none    NullBackend: caches nothing.
+
+A backend is any object with get_many(keys), set_many(mapping) and clear().
+Keys are strings and values JSON-able data, so a networked store with the same
+three operations can be plugged in without touching the callers.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+
+def cache_key(parts):
+    return ':'.join(str(part) for part in parts)
+
+
+@lru_cache(maxsize=None)
+def _row_type(fields):
+    return namedtuple('CachedRow', fields)
+
+
+def pack_rows(rows):
+    """ Result rows -> JSON-able data; unpack_rows gives back tuples with the same attribute names. """
+    rows = list(rows)
+    return {'fields': list(rows[0]._fields) if rows else [], 'rows': [list(row) for row in rows]}
+
+
+def unpack_rows(data):
+    if not data['rows']:
+        return []
+    row_type = _row_type(tuple(data['fields']))
+    return [row_type(*values) for values in data['rows']]
+
+
+class LocalBackend:
+    """ Bounded in-process LRU. """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+        return found
+
+    def set_many(self, mapping):
+        with self._lock:
+            self._data.update(mapping)
+            for key in mapping:
+                self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SharedBackend:
+    """
+    Key/value table in a SQLite file shared by every process on the host (WAL mode,
+    one connection per thread). Past `capacity` entries the oldest writes are pruned.
+    """
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, capacity=100000):
+        self.path = path
+        self.capacity = capacity
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_stored_at ON cache (stored_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._connection().execute(f"SELECT key, value FROM cache WHERE key IN ({placeholders})", keys)
+        return {key: json.loads(value) for key, value in rows}
+
+    def set_many(self, mapping):
+        if not mapping:
+            return
+        now = time.time()
+        conn = self._connection()
+        conn.executemany("INSERT OR REPLACE INTO cache (key, value, stored_at) VALUES (?, ?, ?)",
+                         [(key, json.dumps(value), now) for key, value in mapping.items()])
+        self._writes += len(mapping)
+        if self._writes >= self.PRUNE_EVERY:
+            self._writes = 0
+            conn.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                         (self.capacity,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+
+class NullBackend:
+    """ Caches nothing (CACHE_BACKEND='none'). """
+
+    def get_many(self, keys):
+        return {}
+
+    def set_many(self, mapping):
+        pass
+
+    def clear(self):
+        pass
+
+
+class Cache:
+    """ Versioned read-through cache over a backend. Keys are tuples ending in a version. """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def fetch(self, keys, load):
+        """
+        {key: value} for every key in `keys`. Misses are computed with one call to
+        load(missing_keys) -> {key: value} and stored; keys it leaves out are not cached.
+        """
+        encoded = {cache_key(key): key for key in keys}
+        found = {encoded[k]: value for k, value in self.backend.get_many(encoded).items()}
+        missing = [key for key in encoded.values() if key not in found]
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            loaded = load(missing)
+            self.backend.set_many({cache_key(key): value for key, value in loaded.items()})
+            found.update(loaded)
+        return found
+
+    def get(self, key, load):
+        """ One value: load() on a miss. """
+        return self.fetch([key], lambda missing: {key: load()})[key]
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        return {'backend': type(self.backend).__name__, 'hits': self.hits, 'misses': self.misses}
+
+
+def make_backend(kind, path=None, capacity=10000):
+    if kind == 'local':
+        return LocalBackend(capacity)
+    if kind == 'shared':
+        return SharedBackend(path, capacity)
+    if kind == 'none':
+        return NullBackend()
+    raise ValueError(f"Unknown CACHE_BACKEND {kind!r} (expected 'local', 'shared' or 'none')")
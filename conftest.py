@@ -0,0 +1,53 @@
+import os
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, create_db_and_seed, db
+
+# Timing budgets are multiplied by this: MAXI_BENCH_SLACK=3 pytest -q on a slow machine.
+SLACK = float(os.environ.get('MAXI_BENCH_SLACK', '1'))
+
+
+@pytest.fixture
+def app():
+    """ A fresh app bound to a private in-memory database, never the demo maxi.db. """
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True})
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def seeded_app(request):
+    """
+    Like app, with the demo data seeded. Extra config comes from indirect
+    parametrization: @pytest.mark.parametrize('seeded_app', [{...}], indirect=True).
+    """
+    config = {'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True, **getattr(request, 'param', {})}
+    app = create_app(config)
+    with app.app_context():
+        create_db_and_seed()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(seeded_app):
+    return seeded_app.test_client()
+
+
+@pytest.fixture
+def statements(seeded_app):
+    """ Every SQL statement run while the test is active. """
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield seen
+    event.remove(db.engine, 'before_cursor_execute', record)
@@ -0,0 +1,152 @@
+"""
+Contact resolution: participant names or phone numbers -> User ids.
+
+create_split and create_invoice receive participants as free text. Each entry is
+reduced to a normalized key: a phone number ('+44 20-7946 0000' -> '+442079460000')
+matches User.phone_number, anything else matches User.contact_key, the indexed,
+case- and whitespace-insensitive form of the name. A whole participant list is
+resolved with at most one query per key kind plus one bulk INSERT for contacts
+nobody has seen before.
+
+Hot contacts are kept in a bounded LRU (one per app, CONTACT_CACHE_SIZE). Only
+rows read back from the database are cached, never ids of users created in a
+transaction that might still roll back.
+"""
+import re
+import threading
+import unicodedata
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import insert, select, update
+
+PHONE_PATTERN = re.compile(r'^\+?\d{6,15}$')
+PHONE_PUNCTUATION = re.compile(r'[\s\-().]')
+
+
+def normalize_name(name):
+    """ 'Sarah  WILLIAMS ' -> 'sarah williams' (Unicode-normalized, casefolded, single spaces). """
+    return ' '.join(unicodedata.normalize('NFKC', name).casefold().split())
+
+
+def normalize_phone(value):
+    """ The phone number in `value` as '+digits' / 'digits', or None if it isn't one. """
+    compact = PHONE_PUNCTUATION.sub('', value)
+    return compact if PHONE_PATTERN.match(compact) else None
+
+
+def contact_key(entry):
+    """ ('phone', number) or ('name', normalized name) for one participant entry. """
+    phone = normalize_phone(entry)
+    return ('phone', phone) if phone else ('name', normalize_name(entry))
+
+
+def contact_key_default(context):
+    """ Column default for User.contact_key, so every insert path (bulk ones too) fills it. """
+    return normalize_name(context.get_current_parameters()['name'])
+
+
+def backfill_contact_keys(session, user_model, batch_size=1000):
+    """
+    Fill User.contact_key for rows written before it existed (or by raw SQL that
+    skipped the column default). Runs in the caller's transaction; returns the count.
+    """
+    filled = 0
+    while True:
+        rows = session.execute(
+            select(user_model.id, user_model.name)
+            .where(user_model.contact_key.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return filled
+        session.execute(update(user_model), [{'id': user_id, 'contact_key': normalize_name(name)}
+                                             for user_id, name in rows])
+        filled += len(rows)
+
+
+class ContactResolver:
+    """ Bulk entry -> user id resolution with a bounded LRU of hot contacts. """
+
+    def __init__(self, user_model, capacity=10000):
+        self.users = user_model
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _cached(self, key):
+        with self._lock:
+            user_id = self._cache.get(key)
+            if user_id is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return user_id
+
+    def _remember(self, found):
+        with self._lock:
+            self._cache.update(found)
+            for key in found:
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+
+    def lookup(self, session, keys):
+        """ {key: user id} for the keys that exist; one query per key kind for cache misses. """
+        found, missing = {}, {'name': set(), 'phone': set()}
+        for key in set(keys):
+            user_id = self._cached(key)
+            if user_id is None:
+                missing[key[0]].add(key[1])
+            else:
+                found[key] = user_id
+
+        fetched = {}
+        if missing['name']:
+            # Names aren't unique. Ids are random UUIDs, so the lowest one isn't the oldest
+            # user, but it is the same user on every lookup, which is what matters here.
+            rows = session.execute(
+                select(self.users.contact_key, self.users.id)
+                .where(self.users.contact_key.in_(missing['name']))
+                .order_by(self.users.contact_key, self.users.id)
+            )
+            for name_key, user_id in rows:
+                fetched.setdefault(('name', name_key), user_id)
+        if missing['phone']:
+            rows = session.execute(
+                select(self.users.phone_number, self.users.id)
+                .where(self.users.phone_number.in_(missing['phone']))
+            )
+            fetched.update({('phone', phone): user_id for phone, user_id in rows})
+
+        self._remember(fetched)
+        found.update(fetched)
+        return found
+
+    def resolve(self, session, entries):
+        """
+        User ids for `entries` (names or phone numbers), in order. Unknown contacts
+        are created with one bulk INSERT in the caller's transaction (commit it).
+        """
+        keys = [contact_key(entry) for entry in entries]
+        found = self.lookup(session, keys)
+
+        new_rows = {}
+        for entry, key in zip(entries, keys):
+            if key not in found and key not in new_rows:
+                new_rows[key] = {
+                    'id': str(uuid.uuid4()),
+                    'name': entry.strip(),
+                    'phone_number': key[1] if key[0] == 'phone' else None,
+                }
+        if new_rows:
+            session.execute(insert(self.users), list(new_rows.values()))
+            found.update({key: row['id'] for key, row in new_rows.items()})
+        return [found[key] for key in keys]
@@ -0,0 +1,142 @@
+"""
+Currencies and exchange rates for multi-currency splits and pots.
+
+Every rate is stored against BASE_CURRENCY, as units of the currency per one
+euro (the ECB convention), with the date it takes effect (FxRate in app.py). A
+rate applies from its effective date until the next one for that currency;
+euro needs no row. Converting from A to B is amount * rate[B] / rate[A].
+
+RateTable holds the whole table as small per-currency numpy arrays. app.py
+builds it once per process and rebuilds it only when a rate import has moved
+the 'fx' data version in the database (see fx_rates), so converting costs one
+primary-key lookup rather than a rate query. A batch of amounts is converted
+with one lookup per distinct currency and one vectorized multiply, whatever its
+size:
+
+* convert(amounts, currencies, to): foreign-currency expenses of a split, in the
+  split's settlement currency, before compute_settlement;
+* net(balances, to): {(person, currency): amount} balance vectors -> one balance
+  per person in `to`, before simplify_debts matches them.
+
+numpy is imported on first use.
+"""
+import re
+from datetime import date, datetime
+
+BASE_CURRENCY = 'EUR'
+CODE = re.compile(r'^[A-Z]{3}$')
+
+
+class MissingRateError(LookupError):
+    """ No rate is known (or in effect yet) for a currency. """
+
+
+def parse_currency(value, default=BASE_CURRENCY):
+    """ ISO 4217 code ('usd' -> 'USD'); `default` when missing. Raises ValueError on anything else. """
+    if value is None or value == '':
+        return default
+    code = str(value).strip().upper()
+    if not CODE.match(code):
+        raise ValueError(f'currency must be a 3-letter ISO code, got {value!r}')
+    return code
+
+
+def _day(on):
+    """ date/datetime (None: today, UTC) -> proleptic ordinal, as stored in the table. """
+    if on is None:
+        on = datetime.utcnow()
+    if isinstance(on, datetime):
+        on = on.date()
+    return on.toordinal()
+
+
+def _days(on, count):
+    """ numpy array of `count` ordinals: `on` is one date for all, or a sequence of one per entry. """
+    import numpy as np
+
+    if on is None or isinstance(on, date):
+        return np.full(count, _day(on), dtype=np.int64)
+    return np.fromiter((_day(day) for day in on), dtype=np.int64, count=count)
+
+
+class RateTable:
+    """ Effective-dated rates per currency (rows of (currency, effective_date, rate)). """
+
+    def __init__(self, rows=()):
+        import numpy as np
+
+        by_currency = {}
+        for currency, effective_date, rate in rows:
+            by_currency.setdefault(currency, []).append((_day(effective_date), rate))
+        self._days, self._rates = {}, {}
+        for currency, entries in by_currency.items():
+            entries.sort()
+            self._days[currency] = np.array([day for day, _ in entries], dtype=np.int64)
+            self._rates[currency] = np.array([rate for _, rate in entries], dtype=float)
+
+    @property
+    def currencies(self):
+        return sorted({BASE_CURRENCY, *self._days})
+
+    def knows(self, currency):
+        return currency == BASE_CURRENCY or currency in self._days
+
+    def rate(self, currency, on=None):
+        """ Units of `currency` per euro in effect on `on` (default today). """
+        return float(self._rates_on(currency, _days(on, 1))[0])
+
+    def _rates_on(self, currency, days):
+        """ numpy array: units of `currency` per euro in effect on each of `days` (ordinals). """
+        import numpy as np
+
+        if currency == BASE_CURRENCY:
+            return np.ones(len(days))
+        if currency not in self._days:
+            raise MissingRateError(f'No exchange rate for {currency}')
+        index = np.searchsorted(self._days[currency], days, side='right') - 1
+        if len(index) and index.min() < 0:
+            first = date.fromordinal(int(days[index < 0].min()))
+            raise MissingRateError(f'No exchange rate for {currency} in effect on {first}')
+        return self._rates[currency][index]
+
+    def factors(self, currencies, to, on=None):
+        """
+        numpy array: what one unit of each of `currencies` is worth in `to`, on `on`
+        (one date, or one per currency).
+        """
+        import numpy as np
+
+        days = _days(on, len(currencies))
+        target = self._rates_on(to, days)
+        names, codes = np.unique(np.asarray(currencies, dtype=str), return_inverse=True)
+        factors = np.empty(len(currencies))
+        for code, name in enumerate(names.tolist()):
+            rows = codes == code
+            factors[rows] = target[rows] / self._rates_on(name, days[rows])
+        return factors
+
+    def convert(self, amounts, currencies, to, on=None):
+        """
+        `amounts` (one per entry of `currencies`) in `to`, as a numpy array rounded
+        to cents. `on` is one date for the lot or one per amount (each expense at the
+        rate of its own day). One vectorized rate lookup per distinct currency, one
+        multiply for the lot.
+        """
+        import numpy as np
+
+        amounts = np.asarray(amounts, dtype=float)
+        if not len(amounts):
+            return amounts
+        return np.round(amounts * self.factors(currencies, to, on), 2)
+
+    def net(self, balances, to, on=None):
+        """ {(person, currency): amount} -> {person: amount in `to`}, netted across currencies. """
+        import numpy as np
+
+        if not balances:
+            return {}
+        keys = list(balances)
+        people, index = np.unique(np.asarray([person for person, _ in keys], dtype=object), return_inverse=True)
+        converted = self.convert(list(balances.values()), [currency for _, currency in keys], to, on)
+        totals = np.bincount(index, weights=converted, minlength=len(people))
+        return dict(zip(people.tolist(), totals.tolist()))
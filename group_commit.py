@@ -0,0 +1,142 @@
+"""
+Group-commit writer for PotTransaction inserts.
+
+On a pot's due_day every member calls make_contribution at about the same time.
+With one transaction per request SQLite serializes all of them (one fsync each)
+and latency spikes. When CONTRIBUTION_GROUP_COMMIT is on, make_contribution hands
+its row to a single writer thread instead. The writer collects rows that arrive
+within GROUP_COMMIT_WINDOW_MS (up to GROUP_COMMIT_MAX_BATCH), inserts them in one
+transaction, reads the new balance of every affected pot with one query,
+commits, and then answers every caller with its own row and balance.
+
+Durability: a caller is only answered after the COMMIT containing its row has
+returned, so an acknowledged contribution is exactly as durable as with
+per-request commits (whatever the database's synchronous setting gives). If the
+process dies before that COMMIT, none of the rows in the batch were acknowledged.
+make_contribution validates rows before queueing them, but a batch that still
+fails (a constraint, a pot deleted meanwhile) is retried one row per transaction,
+so only the caller whose row is bad gets the error. The balance returned is the
+pot balance right after the commit, so it also includes other contributions from
+the same batch.
+
+A lone caller waits up to the window for company, so this only pays off under
+bursts; bench_group_commit.py measures both modes.
+"""
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import datetime
+
+from sqlalchemy import select
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """ One writer thread per app that batches PotTransaction inserts into shared transactions. """
+
+    def __init__(self, engine, transaction_table, pot_table, user_table, balances_query, window_ms=5, max_batch=256):
+        self.engine = engine
+        self.transactions = transaction_table
+        self.pots = pot_table
+        self.users = user_table
+        self.balances_query = balances_query # pot ids -> select of (pot id, balance)
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.batches = 0
+        self.rows = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # --- Caller side ---
+    def submit(self, pot_id, user_id, type, description, amount, currency=None, original_amount=None):
+        """ Queue one PotTransaction; returns a Future of {'transaction': dict, 'totalBalance': float}. """
+        row = {
+            'id': str(uuid.uuid4()),
+            'pot_id': pot_id,
+            'user_id': user_id,
+            'type': type,
+            'description': description,
+            'amount': amount,
+            'currency': currency,
+            'original_amount': original_amount,
+            'date': datetime.utcnow(),
+        }
+        future = Future()
+        self._ensure_started()
+        self._queue.put((row, future))
+        return future
+
+    def close(self):
+        """ Flush whatever is queued and stop the writer thread. """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                    self._thread.start()
+
+    # --- Writer side ---
+    def _collect(self):
+        """ Block for the first row, then gather more until the window closes or the batch is full. """
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        rows = [row for row, _ in batch]
+        pot_ids = sorted({row['pot_id'] for row in rows})
+        user_ids = sorted({row['user_id'] for row in rows})
+        p, u = self.pots.c, self.users.c
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(self.transactions.insert(), rows)
+                # One version bump per pot invalidates cached copies (see http_cache.py).
+                conn.execute(self.pots.update().where(p.id.in_(pot_ids)).values(version=p.version + 1))
+                balances = dict(conn.execute(self.balances_query(pot_ids)).all())
+                names = dict(conn.execute(select(u.id, u.name).where(u.id.in_(user_ids))).all())
+        except Exception as exc:
+            if len(batch) > 1:
+                for item in batch: # Isolate the bad row(s): everyone else still gets stored
+                    self._write([item])
+            else:
+                batch[0][1].set_exception(exc)
+            return
+
+        self.batches += 1
+        self.rows += len(rows)
+        for row, future in batch:
+            future.set_result({
+                'transaction': dict(row, user_name=names.get(row['user_id'])),
+                'totalBalance': balances.get(row['pot_id'], 0.0),
+            })
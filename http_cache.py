@@ -0,0 +1,164 @@
+"""
+HTTP caching helpers: ETags, conditional GET and response compression.
+
+Every Pot and Request carries a `version` that the write endpoints bump. Read
+endpoints turn the versions they depend on into a weak ETag *before* running their
+heavy queries, so a client that already has the latest copy gets a bare 304.
+
+Large JSON bodies are compressed with brotli (if the `brotli` package is installed
+and the client accepts it) or gzip. Hit rates and compression savings are counted
+per endpoint and exposed through `stats.snapshot()`.
+"""
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import defaultdict
+
+from flask import current_app, request
+from werkzeug.http import parse_etags
+
+
+class CacheStats:
+    """ Thread-safe per-endpoint counters for conditional GETs and compression. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._endpoints = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self._compression = defaultdict(lambda: {'responses': 0, 'bytes_in': 0, 'bytes_out': 0})
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def record(self, endpoint, hit):
+        with self._lock:
+            self._endpoints[endpoint]['hits' if hit else 'misses'] += 1
+
+    def record_compression(self, encoding, bytes_in, bytes_out):
+        with self._lock:
+            entry = self._compression[encoding]
+            entry['responses'] += 1
+            entry['bytes_in'] += bytes_in
+            entry['bytes_out'] += bytes_out
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {}
+            for name, counts in self._endpoints.items():
+                total = counts['hits'] + counts['misses']
+                endpoints[name] = dict(counts, hit_rate=round(counts['hits'] / total, 4) if total else 0.0)
+            return {'endpoints': endpoints, 'compression': {k: dict(v) for k, v in self._compression.items()}}
+
+
+stats = CacheStats()
+
+
+# --- Validators ---
+def etag_for(*parts):
+    """ A compact validator for the given version parts (ids, version numbers, viewer id...). """
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+def is_fresh(if_none_match, etag, endpoint):
+    """
+    True if the raw If-None-Match header already lists `etag`. Framework neutral,
+    so the async serving mode shares it; the outcome is counted for `endpoint`.
+    """
+    hit = parse_etags(if_none_match).contains_weak(etag)
+    stats.record(endpoint, hit)
+    return hit
+
+
+def not_modified(etag):
+    """ Returns a 304 response if the client already has `etag`, otherwise None. """
+    if not is_fresh(request.headers.get('If-None-Match'), etag, request.endpoint):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def with_etag(response, etag):
+    """ Attach a weak ETag (weak because the body may be re-encoded by compression). """
+    if isinstance(response, tuple):
+        response = current_app.make_response(response)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+# --- Compression ---
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if accepted['br'] and _brotli() is not None:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """ after_request hook: compress JSON bodies above COMPRESS_MIN_BYTES. """
+    config = current_app.config
+    if (response.status_code != 200
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    encoding = _choose_encoding()
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+
+    level = config['COMPRESS_LEVEL']
+    if response.is_streamed:
+        if not request.accept_encodings['gzip']:
+            return response
+        # Compress chunk by chunk so streamed feeds keep their flat memory profile.
+        response.response = _gzip_stream(response.response, level)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers.pop('Content-Length', None)
+        stats.record_compression('gzip-stream', 0, 0)
+        return response
+
+    body = response.get_data()
+    if len(body) < config['COMPRESS_MIN_BYTES']:
+        return response
+    if encoding == 'br':
+        compressed = _brotli().compress(body, quality=min(level, 11))
+    else:
+        compressed = gzip.compress(body, compresslevel=level)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    stats.record_compression(encoding, len(body), len(compressed))
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESS_MIN_BYTES', 1024)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.after_request(compress_response)
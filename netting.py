@@ -0,0 +1,134 @@
+"""
+Large-scale netting: simplify_debts for millions of balances.
+
+simplify_debts (app.py) builds a dict per person and sorts two lists of them,
+which is fine for one split but not for a stadium-sized event or a nightly
+platform-wide settlement. This module does the same greedy matching (largest
+debt against largest credit, every transfer settles at least one side) over
+compact arrays:
+
+* balances are whole cents in one int64 array, people are array indexes;
+* each side is sorted once with numpy and read back in chunks, and only the
+  partly settled people wait in a heap (one int each), so per-person cost is a
+  few bytes plus the caller's own id list;
+* transfers are yielded one at a time instead of collected into a list.
+
+Optional cap on transfers per person (max_transfers >= 2): someone on their last
+allowed transfer always settles in full with it. If that is more than the other
+side's balance, the other side relays the difference: a creditor who receives
+too much owes the rest onward, a debtor who pays too much is owed it back by
+someone else. Net positions are unchanged and there are still at most n - 1
+transfers. With a cap, the one partly settled person is always matched next
+(against the largest untouched person on the other side, who has made no
+transfer yet), so the cap always holds.
+
+numpy is imported on first use; bench_netting.py measures the 10M-balance case.
+"""
+import heapq
+from array import array
+
+CHUNK = 65536
+
+
+class _Side:
+    """ One side (debtors or creditors), popped largest amount first. """
+
+    def __init__(self, indexes, amounts, scale):
+        self._indexes = indexes # numpy arrays sorted by amount, descending
+        self._amounts = amounts
+        self._pos = 0
+        self._chunk = []
+        self._heap = [] # re-queued people as one int each: -(amount * scale + index)
+        self._scale = scale
+        self._refill()
+
+    def _refill(self):
+        stop = min(self._pos + CHUNK, len(self._indexes))
+        self._chunk = list(zip(self._amounts[self._pos:stop].tolist(), self._indexes[self._pos:stop].tolist()))
+        self._chunk.reverse() # pop() from the end
+        self._pos = stop
+
+    def pop(self, requeued_first=False):
+        if not self._chunk and self._pos < len(self._indexes):
+            self._refill()
+        if self._heap and (requeued_first or not self._chunk or -self._heap[0] >= self._chunk[-1][0] * self._scale):
+            return divmod(-heapq.heappop(self._heap), self._scale)
+        return self._chunk.pop() if self._chunk else None
+
+    def push(self, amount, index):
+        heapq.heappush(self._heap, -(amount * self._scale + index))
+
+
+def _side(cents, np, sign):
+    indexes = np.flatnonzero(cents < 0 if sign < 0 else cents > 0)
+    if len(cents) < 2 ** 31:
+        indexes = indexes.astype(np.int32)
+    amounts = np.abs(cents[indexes])
+    order = np.argsort(-amounts, kind='stable')
+    return _Side(indexes[order], amounts[order], max(len(cents), 1))
+
+
+def stream_transfers(cents, max_transfers=None):
+    """
+    Greedy settlement of `cents` (int64 array or sequence, index = person;
+    negative = owes). Yields (debtor index, creditor index, cents) lazily.
+    A non-zero total is left unmatched.
+    """
+    import numpy as np
+
+    if max_transfers is not None and max_transfers < 2:
+        raise ValueError('max_transfers must be at least 2')
+    cents = np.asarray(cents, dtype=np.int64)
+    debtors, creditors = _side(cents, np, -1), _side(cents, np, 1)
+    last = max_transfers - 1 if max_transfers else None
+    counts = array('i', bytes(4 * len(cents))) if last else None
+
+    while True:
+        # Uncapped: largest against largest. Capped: the partly settled person first.
+        debtor, creditor = debtors.pop(requeued_first=bool(last)), creditors.pop(requeued_first=bool(last))
+        if debtor is None or creditor is None:
+            return
+        (owed, d), (due, c) = debtor, creditor
+        amount = min(owed, due)
+        if last:
+            # Whoever is on their last transfer settles in full, even if that is the larger side.
+            if owed > due and counts[d] >= last:
+                amount = owed
+            elif due > owed and counts[c] >= last:
+                amount = due
+            counts[d] += 1
+            counts[c] += 1
+
+        yield d, c, amount
+        # Remainders go back in; a negative remainder switches sides (relay).
+        if owed > amount:
+            debtors.push(owed - amount, d)
+        elif owed < amount:
+            creditors.push(amount - owed, d)
+        if due > amount:
+            creditors.push(due - amount, c)
+        elif due < amount:
+            debtors.push(amount - due, c)
+
+
+def compact_balances(balances):
+    """ {person: amount} or iterable of (person, amount) -> (list of people, int64 cents array). """
+    import numpy as np
+
+    if hasattr(balances, 'items'):
+        balances = balances.items()
+    people, cents = [], array('q')
+    for person, amount in balances:
+        people.append(person)
+        cents.append(round(amount * 100))
+    return people, np.frombuffer(cents, dtype=np.int64)
+
+
+def stream_settlement(balances, max_transfers=None):
+    """
+    simplify_debts for large pools: takes {person: amount} or an iterable of
+    (person, amount) and yields {'from', 'to', 'amount'} transfers one at a time.
+    """
+    people, cents = compact_balances(balances)
+    for d, c, amount in stream_transfers(cents, max_transfers):
+        yield {'from': people[d], 'to': people[c], 'amount': amount / 100}
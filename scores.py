@@ -0,0 +1,101 @@
+"""
+Trust scores ("98% Adidas") computed from payment history.
+
+Every participation in which a user owed money counts once its outcome is known:
+
+    Paid                        1.0, minus up to LATE_PENALTY the later it was paid
+                                (linear over LATE_HORIZON_DAYS past the due date)
+    Disputed                    DISPUTE_CREDIT
+    Overdue, or Pending /       0.0
+    Promised past the due date
+    Pending / Promised before   not counted yet
+    the due date, Creditor,
+    Settled and the like
+
+The due date is the split deadline, or DEFAULT_TERMS_DAYS after the request was
+created (invoices). A user's score is the average credit in percent, pulled
+towards PRIOR by PRIOR_WEIGHT phantom participations so one late payment doesn't
+sink a newcomer. Users with no counted participations keep their current score.
+
+ScoreAccumulator takes the history in chunks (as fetched with yield_per) and
+keeps only two running sums per user, so a full recompute over millions of
+participations runs in bounded memory with numpy doing the per-row work. The
+same code refreshes a handful of users after a status change (see app.py).
+"""
+from datetime import datetime
+
+EPOCH = datetime(1970, 1, 1)
+NAN = float('nan')
+
+LATE_PENALTY = 0.5
+LATE_HORIZON_DAYS = 30
+DISPUTE_CREDIT = 0.25
+DEFAULT_TERMS_DAYS = 14
+PRIOR = 0.95
+PRIOR_WEIGHT = 3.0
+
+PAID, DISPUTED, OVERDUE, OPEN = range(4)
+STATUS_CODES = {'Paid': PAID, 'Disputed': DISPUTED, 'Overdue': OVERDUE, 'Pending': OPEN, 'Promised': OPEN}
+NOT_A_DEBT = -1
+
+
+def participation_credit(status, due, paid_at, now):
+    """
+    Vectorized outcome of a batch of participations.
+
+    status: int array of STATUS_CODES values (NOT_A_DEBT for anything else)
+    due, paid_at: float arrays of days since the epoch (paid_at NaN when unknown); now: float
+
+    Returns (counted, credit): a bool array and the credit earned (0 where not counted).
+    """
+    import numpy as np
+
+    counted = (status == PAID) | (status == DISPUTED) | (status == OVERDUE) | ((status == OPEN) & (due < now))
+    lateness = np.clip(np.nan_to_num(paid_at - due, nan=0.0), 0.0, LATE_HORIZON_DAYS) / LATE_HORIZON_DAYS
+    credit = np.where(status == PAID, 1.0 - LATE_PENALTY * lateness,
+                      np.where(status == DISPUTED, DISPUTE_CREDIT, 0.0))
+    return counted, np.where(counted, credit, 0.0)
+
+
+def epoch_days(moment):
+    """ datetime -> float days since 1970 (NaN for None); much cheaper than building datetime64 arrays. """
+    return (moment - EPOCH).total_seconds() / 86400.0 if moment is not None else NAN
+
+
+class ScoreAccumulator:
+    """ Running per-user sums over chunks of (user_id, status, created_at, split_deadline, paid_at) rows. """
+
+    def __init__(self, now):
+        import numpy as np
+
+        self.now = epoch_days(now)
+        self.index = {}
+        self.counted = np.zeros(0)
+        self.credit = np.zeros(0)
+
+    def add(self, rows):
+        import numpy as np
+
+        if not rows:
+            return
+        user_ids, statuses, created, deadlines, paid_at = zip(*rows)
+        n = len(rows)
+        users = np.fromiter((self.index.setdefault(u, len(self.index)) for u in user_ids), dtype=np.int64, count=n)
+        status = np.fromiter((STATUS_CODES.get(s, NOT_A_DEBT) for s in statuses), dtype=np.int8, count=n)
+        deadline, created_on, paid_on = (np.fromiter(map(epoch_days, column), dtype=float, count=n)
+                                         for column in (deadlines, created, paid_at))
+        due = np.where(np.isnan(deadline), created_on + DEFAULT_TERMS_DAYS, deadline)
+        counted, credit = participation_credit(status, due, paid_on, self.now)
+
+        size = len(self.index)
+        self.counted = np.pad(self.counted, (0, size - len(self.counted)))
+        self.credit = np.pad(self.credit, (0, size - len(self.credit)))
+        self.counted += np.bincount(users, weights=counted, minlength=size)
+        self.credit += np.bincount(users, weights=credit, minlength=size)
+
+    def scores(self):
+        """ {user_id: score 0..100} for every user with at least one counted participation. """
+        import numpy as np
+
+        percent = np.rint(100.0 * (self.credit + PRIOR_WEIGHT * PRIOR) / (self.counted + PRIOR_WEIGHT)).astype(int)
+        return {user_id: int(percent[i]) for user_id, i in self.index.items() if self.counted[i] > 0}
@@ -0,0 +1,139 @@
+"""
+Full-text search over requests, items, comments and pot ledgers (SQLite FTS5).
+
+Two tables live next to the models:
+
+    search_doc    rowid, kind, doc_id, scope_id, created_at   (UNIQUE kind, doc_id)
+    search_index  FTS5(body), rowid = search_doc.rowid
+
+scope_id is the request (for requests, items and comments) or the pot (for ledger
+rows) a document belongs to; searches are filtered to the scopes the user can see.
+The index is kept in sync by AFTER INSERT/UPDATE/DELETE triggers on the source
+tables, so every write path (ORM, bulk inserts, compaction deletes) updates it in
+the same transaction without the routes having to remember to.
+
+The tables and triggers are created with the models (`db.create_all()`); for an
+existing database run `flask --app app rebuild-search-index`. Other databases
+than SQLite get no index and the search endpoint answers 501.
+"""
+import re
+
+from sqlalchemy import DateTime, Float, String, text
+
+# kind: (table, body expression, scope column, date column), columns prefixed by '{row}.'
+SOURCES = {
+    'request': ('request', "coalesce({row}.title, '') || ' ' || coalesce({row}.subtitle, '')", 'id', 'created_at'),
+    'item': ('request_item', "{row}.description", 'request_id', 'created_at'),
+    'comment': ('comment', "{row}.text_content", 'request_id', 'created_at'),
+    'pot_transaction': ('pot_transaction', "{row}.description", 'pot_id', 'date'),
+}
+KINDS = tuple(SOURCES)
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS search_doc ("
+    " rowid INTEGER PRIMARY KEY, kind TEXT NOT NULL, doc_id TEXT NOT NULL,"
+    " scope_id TEXT NOT NULL, created_at TIMESTAMP, UNIQUE (kind, doc_id))",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')",
+]
+
+
+def _doc_rowid(kind, row):
+    return f"(SELECT rowid FROM search_doc WHERE kind = '{kind}' AND doc_id = {row}.id)"
+
+
+def _triggers(kind):
+    table, body, scope, created = SOURCES[kind]
+    new_body, new_scope, new_created = body.format(row='new'), f'new.{scope}', f'new.{created}'
+    watched = sorted({scope, 'id'} | set(re.findall(r'\{row\}\.(\w+)', body)))
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS search_{table}_insert AFTER INSERT ON {table} BEGIN"
+        f" INSERT INTO search_doc (kind, doc_id, scope_id, created_at) VALUES ('{kind}', new.id, {new_scope}, {new_created});"
+        f" INSERT INTO search_index (rowid, body) VALUES ({_doc_rowid(kind, 'new')}, {new_body});"
+        f" END",
+        f"CREATE TRIGGER IF NOT EXISTS search_{table}_update AFTER UPDATE OF {', '.join(watched)} ON {table} BEGIN"
+        f" UPDATE search_index SET body = {new_body} WHERE rowid = {_doc_rowid(kind, 'old')};"
+        f" UPDATE search_doc SET doc_id = new.id, scope_id = {new_scope} WHERE kind = '{kind}' AND doc_id = old.id;"
+        f" END",
+        f"CREATE TRIGGER IF NOT EXISTS search_{table}_delete AFTER DELETE ON {table} BEGIN"
+        f" DELETE FROM search_index WHERE rowid = {_doc_rowid(kind, 'old')};"
+        f" DELETE FROM search_doc WHERE kind = '{kind}' AND doc_id = old.id;"
+        f" END",
+    ]
+
+
+def supported(connection):
+    return connection.dialect.name == 'sqlite'
+
+
+def create_index(target, connection, **kw):
+    """ metadata 'after_create' hook: search tables plus the sync triggers. """
+    if not supported(connection):
+        return
+    for statement in SCHEMA + [trigger for kind in KINDS for trigger in _triggers(kind)]:
+        connection.exec_driver_sql(statement)
+
+
+def drop_index(target, connection, **kw):
+    """ metadata 'after_drop' hook (the triggers went with their tables). """
+    if supported(connection):
+        connection.exec_driver_sql("DROP TABLE IF EXISTS search_index")
+        connection.exec_driver_sql("DROP TABLE IF EXISTS search_doc")
+
+
+def rebuild_index(connection):
+    """ (Re)create the index and fill it from the current rows. Returns the document count. """
+    create_index(None, connection)
+    connection.exec_driver_sql("DELETE FROM search_index")
+    connection.exec_driver_sql("DELETE FROM search_doc")
+    for kind, (table, body, scope, created) in SOURCES.items():
+        connection.exec_driver_sql(
+            f"INSERT INTO search_doc (kind, doc_id, scope_id, created_at)"
+            f" SELECT '{kind}', t.id, t.{scope}, t.{created} FROM {table} t")
+        connection.exec_driver_sql(
+            f"INSERT INTO search_index (rowid, body)"
+            f" SELECT d.rowid, {body.format(row='t')} FROM search_doc d JOIN {table} t"
+            f" ON d.kind = '{kind}' AND d.doc_id = t.id")
+    return connection.exec_driver_sql("SELECT count(*) FROM search_doc").scalar()
+
+
+def match_query(query):
+    """ User input -> a safe FTS5 query: every word must match, as a prefix. None if no words. """
+    terms = re.findall(r'\w+', query or '')
+    return ' '.join(f'"{term}"*' for term in terms) or None
+
+
+SEARCH_SQL = """
+SELECT d.kind, d.doc_id, d.scope_id, d.created_at,
+       coalesce(r.title, p.name) AS title,
+       snippet(search_index, 0, '**', '**', '…', 12) AS snippet,
+       bm25(search_index) AS score
+FROM search_index
+JOIN search_doc d ON d.rowid = search_index.rowid
+LEFT JOIN request r ON d.kind != 'pot_transaction' AND r.id = d.scope_id
+LEFT JOIN pot p ON d.kind = 'pot_transaction' AND p.id = d.scope_id
+WHERE search_index MATCH :match
+  AND CASE WHEN d.kind = 'pot_transaction'
+      THEN d.scope_id IN (SELECT pot_id FROM pot_member WHERE user_id = :user_id)
+      ELSE d.scope_id IN (SELECT id FROM request WHERE creator_id = :user_id
+                          UNION SELECT request_id FROM request_participant WHERE user_id = :user_id)
+      END
+  {filters}
+ORDER BY score
+LIMIT :limit OFFSET :offset
+"""
+
+
+def search_statement(user_id, match, kind=None, start=None, end=None, limit=20, offset=0):
+    """ Ranked matches visible to `user_id` (best first); `end` is exclusive. """
+    filters, params = [], {'match': match, 'user_id': user_id, 'limit': limit, 'offset': offset}
+    if kind:
+        filters.append("AND d.kind = :kind")
+        params['kind'] = kind
+    if start:
+        filters.append("AND d.created_at >= :start")
+        params['start'] = start
+    if end:
+        filters.append("AND d.created_at < :end")
+        params['end'] = end
+    return text(SEARCH_SQL.format(filters=' '.join(filters))).bindparams(**params).columns(
+        kind=String, doc_id=String, scope_id=String, created_at=DateTime, title=String, snippet=String, score=Float)
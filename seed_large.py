@@ -0,0 +1,306 @@
+"""
+Synthetic large-scale data generator (load testing).
+
+`create_db_and_seed` only builds the 7-user demo. This script builds a database
+with production-like volumes through bulk inserts so the endpoints can be
+benchmarked against realistic table sizes, e.g.:
+
+    python seed_large.py --database sqlite:///bench.db \
+        --users 100000 --pots 50000 --pot-transactions 5000000 \
+        --requests 1000000 --comments 10000000
+
+The demo user (CURRENT_USER_ID) is always user #0 and is given a slice of the
+pots and requests, so the "current user" endpoints have something to return.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_DATABASE = 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'bench.db')
+
+
+def _chunks(rows, size):
+    """ Group a row generator into lists of at most `size` rows. """
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _random_date(rng, now, days):
+    return now - timedelta(seconds=rng.randrange(days * 86400))
+
+
+class DatasetGenerator:
+    """ Produces rows for every table, keeping only the small lookups (members, participants) in memory. """
+
+    def __init__(self, models, users, pots, pot_transactions, requests, comments,
+                 members_per_pot=8, participants_per_request=4, items_per_request=3,
+                 hot_pots=20, hot_requests=50, history_days=365, seed=42):
+        self.m = models
+        self.users = max(users, 2)
+        self.pots = pots
+        self.pot_transactions = pot_transactions
+        self.requests = requests
+        self.comments = comments
+        self.members_per_pot = min(members_per_pot, self.users)
+        self.participants_per_request = min(participants_per_request, self.users)
+        self.items_per_request = items_per_request
+        self.hot_pots = min(hot_pots, pots)
+        self.hot_requests = min(hot_requests, requests)
+        self.history_days = history_days
+        self.rng = random.Random(seed)
+        self.now = datetime.utcnow()
+        self.pot_members = []      # pot index -> list of user ids
+        self.request_users = []    # request index -> list of participant user ids
+        self.request_dates = []    # request index -> created_at
+
+    def user_id(self, i):
+        return self.m.CURRENT_USER_ID if i == 0 else f'user-{i:09d}'
+
+    def pot_id(self, i):
+        return f'pot-{i:09d}'
+
+    def request_id(self, i):
+        return f'req-{i:09d}'
+
+    def _random_users(self, k, include=None):
+        ids = {self.user_id(i) for i in self.rng.sample(range(self.users), k)}
+        if include:
+            ids.add(include)
+        return list(ids)
+
+    def _other_user(self, user_id):
+        while True:
+            other = self.user_id(self.rng.randrange(self.users))
+            if other != user_id:
+                return other
+
+    # --- Users ---
+    def user_rows(self):
+        for i in range(self.users):
+            yield {
+                'id': self.user_id(i),
+                'name': f'User {i}',
+                'phone_number': f'+1{i:010d}',
+                'score': self.rng.randint(50, 100),
+            }
+
+    # --- Pots ---
+    def pot_rows(self):
+        for i in range(self.pots):
+            hot = i < self.hot_pots
+            admin = self.m.CURRENT_USER_ID if hot else self.user_id(self.rng.randrange(self.users))
+            self.pot_members.append(self._random_users(self.members_per_pot, include=admin))
+            yield {'id': self.pot_id(i), 'name': f'Pot {i}', 'admin_id': admin}
+
+    def pot_member_rows(self):
+        for i, members in enumerate(self.pot_members):
+            for user_id in members:
+                yield {'pot_id': self.pot_id(i), 'user_id': user_id}
+
+    def schedule_rows(self):
+        for i in range(self.pots):
+            yield {
+                'id': f'sched-{i:09d}',
+                'pot_id': self.pot_id(i),
+                'amount': float(self.rng.choice([5, 10, 20, 50])),
+                'frequency': self.rng.choice(['Monthly', 'Weekly', 'One-Time']),
+                'due_day': self.rng.randint(1, 28),
+            }
+
+    def pot_transaction_rows(self):
+        if not self.pots:
+            return
+        for i in range(self.pot_transactions):
+            pot = self.rng.randrange(self.pots)
+            is_expense = self.rng.random() < 0.1
+            amount = round(self.rng.uniform(1, 100), 2)
+            yield {
+                'id': f'ptx-{i:010d}',
+                'pot_id': self.pot_id(pot),
+                'user_id': self.rng.choice(self.pot_members[pot]),
+                'type': 'Expense' if is_expense else 'Contribution',
+                'description': 'Generated expense' if is_expense else 'Generated contribution',
+                'amount': -amount if is_expense else amount,
+                'date': _random_date(self.rng, self.now, self.history_days),
+            }
+
+    # --- Requests ---
+    def request_rows(self):
+        for i in range(self.requests):
+            hot = i < self.hot_requests
+            creator = self.m.CURRENT_USER_ID if hot else self.user_id(self.rng.randrange(self.users))
+            is_split = self.rng.random() < 0.7
+            if is_split:
+                users = self._random_users(self.participants_per_request, include=creator)
+            else:
+                users = [self._other_user(creator)]
+            # Make sure the demo user also shows up on the payer side of some requests.
+            if i % 1000 == 0 and self.m.CURRENT_USER_ID not in users:
+                users.append(self.m.CURRENT_USER_ID)
+            self.request_users.append(users)
+            created_at = _random_date(self.rng, self.now, self.history_days)
+            self.request_dates.append(created_at)
+            yield {
+                'id': self.request_id(i),
+                'type': 'split' if is_split else 'invoice',
+                'title': f'Dinner #{i}' if is_split else f'Client: User {i}',
+                'subtitle': f'{len(users)} participants' if is_split else f'INV-{i:09d}',
+                'creator_id': creator,
+                'total_amount': 0.0,
+                'status': 'Pending',
+                'created_at': created_at,
+                'invoice_vat_percent': 0.0 if is_split else 21.0,
+                'split_deadline': created_at + timedelta(days=2) if is_split else None,
+            }
+
+    def request_participant_rows(self):
+        n = 0
+        for i, users in enumerate(self.request_users):
+            share = -round(100.0 / len(users), 2)
+            for user_id in users:
+                status = self.rng.choice(['Pending', 'Paid', 'Promised', 'Overdue'])
+                yield {
+                    'id': f'rp-{n:010d}',
+                    'request_id': self.request_id(i),
+                    'user_id': user_id,
+                    'status': status,
+                    'stage': self.rng.choice(['Delivered', 'Seen', 'Reacted']),
+                    'net_share': share,
+                    # Paid within a few weeks; some of it late (trust scores)
+                    'paid_at': self.request_dates[i] + timedelta(hours=self.rng.randrange(24 * 40))
+                               if status == 'Paid' else None,
+                }
+                n += 1
+
+    def request_item_rows(self):
+        n = 0
+        for i, users in enumerate(self.request_users):
+            for _ in range(self.items_per_request):
+                yield {
+                    'id': f'ri-{n:010d}',
+                    'request_id': self.request_id(i),
+                    'description': f'Item {n}',
+                    'amount': round(self.rng.uniform(5, 200), 2),
+                    'paid_by_user_id': self.rng.choice(users),
+                    'is_approved': self.rng.random() < 0.8,
+                    'created_at': self.now,
+                }
+                n += 1
+
+    def comment_rows(self):
+        if not self.requests:
+            return
+        for i in range(self.comments):
+            req = self.rng.randrange(self.requests)
+            yield {
+                'id': f'cmt-{i:010d}',
+                'request_id': self.request_id(req),
+                'user_id': self.rng.choice(self.request_users[req]),
+                'text_content': f'Comment {i}',
+                'created_at': _random_date(self.rng, self.now, self.history_days),
+            }
+
+    def tables(self):
+        """ (table, row generator) pairs in foreign-key order. """
+        m = self.m
+        return [
+            (m.User.__table__, self.user_rows),
+            (m.Pot.__table__, self.pot_rows),
+            (m.pot_member, self.pot_member_rows),
+            (m.ScheduledContribution.__table__, self.schedule_rows),
+            (m.PotTransaction.__table__, self.pot_transaction_rows),
+            (m.Request.__table__, self.request_rows),
+            (m.RequestParticipant.__table__, self.request_participant_rows),
+            (m.RequestItem.__table__, self.request_item_rows),
+            (m.Comment.__table__, self.comment_rows),
+        ]
+
+
+def generate(models, chunk_size=50000, **params):
+    """
+    Drop, recreate and fill the database bound to `models.db`.
+    Returns {table_name: {'rows': int, 'seconds': float}}.
+    """
+    db = models.db
+    generator = DatasetGenerator(models, **params)
+    stats = {}
+
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as conn:
+        if conn.dialect.name == 'sqlite':
+            # Durability does not matter for a throwaway benchmark database.
+            conn.exec_driver_sql('PRAGMA journal_mode=OFF')
+            conn.exec_driver_sql('PRAGMA synchronous=OFF')
+        for table, rows in generator.tables():
+            started = time.perf_counter()
+            count = 0
+            for chunk in _chunks(rows(), chunk_size):
+                conn.execute(table.insert(), chunk)
+                count += len(chunk)
+            stats[table.name] = {'rows': count, 'seconds': round(time.perf_counter() - started, 3)}
+            print(f"  {table.name:<24} {count:>10} rows in {stats[table.name]['seconds']:.1f}s")
+
+        # Denormalised totals, computed in SQL rather than row by row.
+        conn.exec_driver_sql(
+            "UPDATE request SET total_amount = COALESCE(("
+            "SELECT SUM(amount) FROM request_item "
+            "WHERE request_item.request_id = request.id AND request_item.is_approved), 0)"
+        )
+    return stats
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Generate a large synthetic Maxi dataset.')
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='SQLAlchemy URI of the target database (dropped and recreated)')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--pots', type=int, default=50000)
+    parser.add_argument('--pot-transactions', type=int, default=5000000)
+    parser.add_argument('--requests', type=int, default=1000000)
+    parser.add_argument('--comments', type=int, default=10000000)
+    parser.add_argument('--members-per-pot', type=int, default=8)
+    parser.add_argument('--participants-per-request', type=int, default=4)
+    parser.add_argument('--items-per-request', type=int, default=3)
+    parser.add_argument('--hot-pots', type=int, default=20, help='Pots administered by the demo user')
+    parser.add_argument('--hot-requests', type=int, default=50, help='Requests created by the demo user')
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    import app as models
+
+    print(f"Generating dataset into {args.database} ...")
+    started = time.perf_counter()
+    flask_app = models.create_app({'SQLALCHEMY_DATABASE_URI': args.database})
+    with flask_app.app_context():
+        generate(
+            models,
+            chunk_size=args.chunk_size,
+            users=args.users,
+            pots=args.pots,
+            pot_transactions=args.pot_transactions,
+            requests=args.requests,
+            comments=args.comments,
+            members_per_pot=args.members_per_pot,
+            participants_per_request=args.participants_per_request,
+            items_per_request=args.items_per_request,
+            hot_pots=args.hot_pots,
+            hot_requests=args.hot_requests,
+            seed=args.seed,
+        )
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Itemized ("who ate what") share computation for splits.
+
+A split item can name the participants who shared it, each with a weight
+(RequestItemShare rows; weight 2 = "had twice as much"). Items nobody is assigned
+to keep the old behaviour and go into the common pool that calculate_net_balances
+divides equally (or by fixed_split_amount).
+
+The itemized part is computed as one items x participants weight matrix W:
+rows are normalised to sum to 1, and the expected share of every participant is
+the amounts vector times that matrix. numpy is only imported when a split actually
+has itemized items, so plain splits (and app start-up) never pay for it.
+"""
+
+
+def itemized_shares(amounts, assignments, participant_ids):
+    """
+    Expected share of every participant in the itemized items.
+
+    amounts: {item_id: amount} of the approved items
+    assignments: iterable of (item_id, user_id, weight)
+    participant_ids: the split's participants (the matrix columns)
+
+    Returns ({user_id: share}, itemized_total). Assignments to unknown items or to
+    non-participants are ignored; an item whose remaining weights sum to zero is
+    left to the common pool and not counted in itemized_total.
+    """
+    import numpy as np
+
+    item_index = {item_id: i for i, item_id in enumerate(amounts)}
+    user_index = {user_id: j for j, user_id in enumerate(participant_ids)}
+    triples = [(item_index[item_id], user_index[user_id], weight)
+               for item_id, user_id, weight in assignments
+               if item_id in item_index and user_id in user_index and weight]
+    if not triples:
+        return {}, 0.0
+
+    rows, cols, weights = (np.asarray(column) for column in zip(*triples))
+    matrix = np.zeros((len(item_index), len(user_index)))
+    np.add.at(matrix, (rows, cols), weights.astype(float))
+
+    amount_vector = np.fromiter(amounts.values(), dtype=float, count=len(amounts))
+    row_weight = matrix.sum(axis=1)
+    itemized = row_weight > 0
+    per_unit = np.divide(amount_vector, row_weight, out=np.zeros_like(amount_vector), where=itemized)
+    share_vector = per_unit @ matrix
+
+    shares = dict(zip(participant_ids, share_vector.tolist()))
+    return shares, float(amount_vector[itemized].sum())
@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('aiosqlite')
+
+from starlette.testclient import TestClient
+
+from app import create_app, create_db_and_seed, db
+from asgi import async_database_uri, create_asgi_app
+
+READ_URLS = [
+    '/api/pots',
+    '/api/pots/pot-uuid-001',
+    '/api/requests/SPL-MASTER-001',
+    '/api/requests/INV-MASTER-001',
+    '/api/requests/sent',
+    '/api/requests/received',
+]
+
+
+@pytest.fixture
+def clients(tmp_path):
+    # A file database: the sync and async engines must see the same data.
+    config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "maxi.db"}', 'TESTING': True}
+    wsgi_app = create_app(config)
+    with wsgi_app.app_context():
+        create_db_and_seed()
+        db.session.remove()
+    with TestClient(create_asgi_app(config)) as asgi_client:
+        yield wsgi_app.test_client(), asgi_client
+
+
+def test_async_database_uri():
+    assert async_database_uri('sqlite:////tmp/x.db') == 'sqlite+aiosqlite:////tmp/x.db'
+    with pytest.raises(ValueError):
+        async_database_uri('oracle://scott@db/x')
+
+
+@pytest.mark.parametrize('url', READ_URLS)
+def test_async_routes_match_wsgi_routes(clients, url):
+    wsgi, asgi = clients
+    expected = wsgi.get(url)
+    actual = asgi.get(url)
+    assert actual.status_code == expected.status_code == 200
+    assert actual.json() == expected.get_json()
+    assert actual.headers['etag'] == expected.headers['ETag']
+
+
+@pytest.mark.parametrize('url', ['/api/pots/pot-uuid-002', '/api/requests/SPL-MASTER-001', '/api/requests/sent'])
+def test_async_streaming_matches(clients, url):
+    wsgi, asgi = clients
+    assert asgi.get(url + '?stream=1').json() == wsgi.get(url).get_json()
+
+
+def test_async_conditional_get(clients):
+    _, asgi = clients
+    etag = asgi.get('/api/pots/pot-uuid-001').headers['etag']
+    assert asgi.get('/api/pots/pot-uuid-001', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_missing_resources_404(clients):
+    _, asgi = clients
+    assert asgi.get('/api/pots/nope').status_code == 404
+    assert asgi.get('/api/requests/nope').status_code == 404
+
+
+def test_writes_fall_through_to_flask(clients):
+    _, asgi = clients
+    before = asgi.get('/api/pots/pot-uuid-001')
+    created = asgi.post('/api/pots/pot-uuid-001/contributions', json={'amount': 5})
+    assert created.status_code == 201
+    after = asgi.get('/api/pots/pot-uuid-001', headers={'If-None-Match': before.headers['etag']})
+    assert after.status_code == 200
+    assert after.json()['totalBalance'] == before.json()['totalBalance'] + 5
+
+    assert asgi.post('/api/pots', json={'name': 'New', 'schedule': {'amount': 5, 'frequency': 'Monthly'}}).status_code == 201
+
+
+def test_async_scan_invoice(clients):
+    wsgi, asgi = clients
+    response = asgi.post('/scan-invoice', json={'image': ''})
+    assert response.status_code == 200
+    assert response.json() == wsgi.post('/scan-invoice', json={'image': ''}).get_json()
+    assert response.json()['client'] == 'Demo Client'
+    assert asgi.post('/scan-invoice', json={}).status_code == 400
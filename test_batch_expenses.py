@@ -0,0 +1,126 @@
+import pytest
+
+import app as maxi
+from app import RequestItem, CURRENT_USER_ID, SARAH_USER_ID
+
+
+@pytest.fixture
+def split_id(client):
+    response = client.post('/api/requests/split', json={
+        'title': 'Trip', 'deadlineHours': 0, 'participants': ['Sarah Jones', 'Mike Ross'],
+        'expenses': [{'desc': 'Hotel', 'amount': 300}]
+    })
+    return response.get_json()['id']
+
+
+@pytest.fixture
+def settlements(monkeypatch):
+    """ Counts calculate_net_balances runs. """
+    calls = []
+    original = maxi.calculate_net_balances
+    monkeypatch.setattr(maxi, 'calculate_net_balances', lambda request_id, **kwargs: calls.append(request_id) or original(request_id, **kwargs))
+    return calls
+
+
+def test_batch_add_recomputes_once(client, split_id, settlements):
+    expenses = [{'description': f'Receipt {i}', 'amount': 10 + i} for i in range(5)]
+    response = client.post(f'/api/requests/{split_id}/expenses/batch', json={'expenses': expenses})
+
+    assert response.status_code == 201
+    body = response.get_json()
+    assert [item['desc'] for item in body['items']] == [f'Receipt {i}' for i in range(5)]
+    assert all(item['is_approved'] and item['status'] == 'Approved' for item in body['items'])
+    assert body['new_total'] == 300 + sum(10 + i for i in range(5))
+    assert body['settlement_plan']
+    assert settlements == [split_id]
+
+
+def test_batch_add_by_participant_waits_for_approval(client, split_id, settlements):
+    expenses = [{'description': 'Taxi', 'amount': 40, 'user_id': SARAH_USER_ID},
+                {'description': 'Snacks', 'amount': 12, 'user_id': SARAH_USER_ID}]
+    body = client.post(f'/api/requests/{split_id}/expenses/batch', json={'expenses': expenses}).get_json()
+
+    assert [item['status'] for item in body['items']] == ['Pending Approval'] * 2
+    assert body['new_total'] == 300 and body['settlement_plan'] is None
+    assert settlements == []
+
+
+def test_batch_add_is_all_or_nothing(client, split_id):
+    expenses = [{'description': 'Fine', 'amount': 5}, {'description': 'Broken', 'amount': 'abc'}, {'amount': 3}]
+    response = client.post(f'/api/requests/{split_id}/expenses/batch', json={'expenses': expenses})
+
+    assert response.status_code == 400
+    assert [d['index'] for d in response.get_json()['details']] == [1, 2]
+    assert RequestItem.query.filter_by(request_id=split_id).count() == 1
+    assert client.post(f'/api/requests/{split_id}/expenses/batch', json={'expenses': []}).status_code == 400
+    assert client.post('/api/requests/nope/expenses/batch', json={'expenses': [{'description': 'x', 'amount': 1}]}).status_code == 404
+
+
+@pytest.mark.parametrize('amount', ['inf', '-inf', 'nan', 0, -5])
+def test_amounts_must_be_positive_and_finite(client, split_id, amount):
+    expense = {'description': 'Odd', 'amount': amount}
+    assert client.post(f'/api/requests/{split_id}/expenses/batch', json={'expenses': [expense]}).status_code == 400
+    assert client.post(f'/api/requests/{split_id}/expenses', json=expense).status_code == 400
+    assert client.post(f'/api/requests/{split_id}/preview', json={'add': [expense]}).status_code == 400
+    assert RequestItem.query.filter_by(request_id=split_id).count() == 1
+
+
+@pytest.mark.parametrize('bad_id', [{'a': 1}, ['a'], 7])
+def test_ids_must_be_strings(client, split_id, bad_id):
+    approve = client.post(f'/api/requests/{split_id}/items/approve', json={'item_ids': [bad_id]})
+    assert approve.status_code == 400
+    expense = {'description': 'Taxi', 'amount': 10, 'user_id': bad_id}
+    batch = client.post(f'/api/requests/{split_id}/expenses/batch', json={'expenses': [expense]})
+    assert batch.status_code == 400 and batch.get_json()['details'][0]['index'] == 0
+    assert client.post(f'/api/requests/{split_id}/expenses', json=expense).status_code == 400
+    assert RequestItem.query.filter_by(request_id=split_id).count() == 1
+
+
+def test_sharers_must_be_participants(client, split_id):
+    expense = {'description': 'Wine', 'amount': 60, 'shared_by': ['nobody-id']}
+    single = client.post(f'/api/requests/{split_id}/expenses', json=expense)
+    assert single.status_code == 400 and 'nobody-id' in single.get_json()['error']
+    assert client.post(f'/api/requests/{split_id}/expenses/batch', json={'expenses': [expense]}).status_code == 400
+    assert client.post(f'/api/requests/{split_id}/preview', json={'add': [expense]}).status_code == 400
+    assert RequestItem.query.filter_by(request_id=split_id).count() == 1
+
+    expense['shared_by'] = [CURRENT_USER_ID]
+    added = client.post(f'/api/requests/{split_id}/expenses', json=expense)
+    assert added.status_code == 201 and added.get_json()['item']['shared_by'] == {CURRENT_USER_ID: 1.0}
+
+
+def test_batch_approve_recomputes_once(client, split_id, settlements):
+    expenses = [{'description': f'Receipt {i}', 'amount': 20, 'user_id': SARAH_USER_ID} for i in range(4)]
+    added = client.post(f'/api/requests/{split_id}/expenses/batch', json={'expenses': expenses}).get_json()
+    pending = [item['id'] for item in added['items']]
+    already = RequestItem.query.filter_by(request_id=split_id, is_approved=True).first().id
+
+    response = client.post(f'/api/requests/{split_id}/items/approve', json={'item_ids': pending + [already, 'missing']})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [item['status'] for item in body['items']] == ['Approved'] * 4 + ['Already approved', 'Not found']
+    assert body['new_total'] == 380
+    # Hotel 300 (creator) + 80 (Sarah) over three people: only the creator is owed.
+    assert {tx['to_id'] for tx in body['settlement_plan']} == {CURRENT_USER_ID}
+    assert settlements == [split_id]
+    assert RequestItem.query.filter_by(request_id=split_id, is_approved=False).count() == 0
+
+
+def test_batch_approve_matches_one_by_one(client, split_id):
+    expenses = [{'description': f'Receipt {i}', 'amount': 15 + i, 'user_id': SARAH_USER_ID} for i in range(3)]
+    ids = [item['id'] for item in client.post(f'/api/requests/{split_id}/expenses/batch', json={'expenses': expenses}).get_json()['items']]
+
+    batch = client.post(f'/api/requests/{split_id}/items/approve', json={'item_ids': ids}).get_json()
+    details = client.get(f'/api/requests/{split_id}').get_json()
+
+    assert batch['new_total'] == details['total_amount'] == 300 + 15 + 16 + 17
+
+
+def test_batch_approve_is_admin_only(client):
+    # SPL-MASTER-001 belongs to Sarah, not the current user.
+    item = RequestItem.query.filter_by(request_id='SPL-MASTER-001', is_approved=False).first()
+    response = client.post('/api/requests/SPL-MASTER-001/items/approve', json={'item_ids': [item.id]})
+    assert response.status_code == 403
+    assert client.post('/api/requests/SPL-MASTER-001/items/approve', json={}).status_code == 403
+    assert client.post('/api/requests/nope/items/approve', json={'item_ids': ['x']}).status_code == 404
@@ -0,0 +1,130 @@
+from datetime import date
+
+import pytest
+
+from app import (create_app, create_db_and_seed, db, bump_data_version, data_version, fx_rates, import_fx_rates,
+                 user_display, User, CURRENT_USER_ID, SARAH_USER_ID)
+from cache import Cache, LocalBackend, NullBackend, SharedBackend, make_backend, pack_rows, unpack_rows
+
+
+def test_local_backend_is_a_bounded_lru():
+    backend = LocalBackend(capacity=2)
+    backend.set_many({'a': 1, 'b': 2})
+    assert backend.get_many(['a']) == {'a': 1}
+    backend.set_many({'c': 3})  # evicts b, the least recently used
+    assert backend.get_many(['a', 'b', 'c']) == {'a': 1, 'c': 3}
+
+
+def test_shared_backend_is_shared(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    worker_a, worker_b = SharedBackend(path), SharedBackend(path)
+    worker_a.set_many({'k': {'name': 'x', 'n': [1, 2]}})
+    assert worker_b.get_many(['k', 'missing']) == {'k': {'name': 'x', 'n': [1, 2]}}
+    worker_b.clear()
+    assert worker_a.get_many(['k']) == {}
+
+
+def test_shared_backend_prunes_oldest(tmp_path, monkeypatch):
+    monkeypatch.setattr(SharedBackend, 'PRUNE_EVERY', 1)
+    backend = SharedBackend(str(tmp_path / 'cache.db'), capacity=3)
+    for n in range(6):
+        backend.set_many({f'k{n}': n})
+    assert backend.get_many([f'k{n}' for n in range(6)]) == {'k3': 3, 'k4': 4, 'k5': 5}
+
+
+@pytest.mark.parametrize('backend', [LocalBackend(), NullBackend()])
+def test_fetch_loads_only_misses(backend):
+    cache = Cache(backend)
+    loads = []
+
+    def load(missing):
+        loads.append(sorted(missing))
+        return {key: key[1] * 10 for key in missing}
+
+    assert cache.fetch([('n', 1), ('n', 2)], load) == {('n', 1): 10, ('n', 2): 20}
+    assert cache.fetch([('n', 2), ('n', 3)], load) == {('n', 2): 20, ('n', 3): 30}
+    if isinstance(backend, LocalBackend):
+        assert loads == [[('n', 1), ('n', 2)], [('n', 3)]]
+        assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_make_backend():
+    assert isinstance(make_backend('local'), LocalBackend)
+    with pytest.raises(ValueError):
+        make_backend('memcached')
+
+
+def test_pack_rows_round_trip(seeded_app):
+    rows = db.session.execute(db.select(User.id, User.name).order_by(User.id)).all()
+    unpacked = unpack_rows(pack_rows(rows))
+    assert [(r.id, r.name) for r in unpacked] == [(r.id, r.name) for r in rows]
+    assert unpack_rows(pack_rows([])) == []
+
+
+def test_pot_summaries_are_cached_per_version(client, statements):
+    first = client.get('/api/pots').get_json()
+    statements.clear()
+    assert client.get('/api/pots').get_json() == first
+    assert not any('member_count' in s for s in statements)
+
+    client.post('/api/pots/pot-uuid-001/contributions', json={'amount': 5})
+    statements.clear()
+    after = {pot['id']: pot for pot in client.get('/api/pots').get_json()}
+    before = {pot['id']: pot for pot in first}
+    assert after['pot-uuid-001']['totalBalance'] == before['pot-uuid-001']['totalBalance'] + 5
+    assert after['pot-uuid-002'] == before['pot-uuid-002']
+    [summary_query] = [s for s in statements if 'member_count' in s]
+    assert summary_query.endswith('IN (?) ORDER BY pot.id')  # only the pot that changed
+
+
+def test_request_details_follow_the_version(client, statements):
+    url = '/api/requests/SPL-MASTER-001'
+    first = client.get(url).get_json()
+    statements.clear()
+    assert client.get(url).get_json() == first
+    assert not any('request_item' in s for s in statements)
+
+    client.post('/api/requests/SPL-MASTER-001/expenses', json={'description': 'Taxi', 'amount': 30})
+    items = client.get(url).get_json()['items']
+    assert [item['desc'] for item in items][-1] == 'Taxi'
+
+
+def test_user_versions_follow_the_transaction(seeded_app):
+    assert user_display([SARAH_USER_ID])[SARAH_USER_ID]['score'] == 95
+    db.session.execute(db.update(User).where(User.id == SARAH_USER_ID).values(score=40))
+    bump_data_version('users')
+    assert user_display([SARAH_USER_ID])[SARAH_USER_ID]['score'] == 40  # our own write
+    db.session.rollback()
+    assert user_display([SARAH_USER_ID])[SARAH_USER_ID]['score'] == 95  # the old token is back
+
+    before = data_version('users')
+    db.session.execute(db.update(User).where(User.id == SARAH_USER_ID).values(score=40))
+    bump_data_version('users')
+    db.session.commit()
+    assert data_version('users') != before
+    assert user_display([SARAH_USER_ID])[SARAH_USER_ID]['score'] == 40
+
+
+@pytest.mark.parametrize('backend', ['local', 'shared'])
+def test_workers_share_invalidations(tmp_path, backend):
+    """ Two app instances (workers) on one database, each with its own or one shared cache. """
+    config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "maxi.db"}', 'TESTING': True,
+              'CACHE_BACKEND': backend, 'CACHE_PATH': str(tmp_path / 'cache.db')}
+    worker_a, worker_b = create_app(config), create_app(config)
+    with worker_a.app_context():
+        create_db_and_seed()
+        assert user_display([CURRENT_USER_ID])[CURRENT_USER_ID]['score'] == 97
+        assert fx_rates().rate('USD') == 1.08
+        db.session.remove()
+    with worker_b.app_context():
+        db.session.execute(db.update(User).where(User.id == CURRENT_USER_ID).values(score=12))
+        bump_data_version('users')
+        import_fx_rates([('USD', date(2025, 1, 1), 1.20)])
+        db.session.commit()
+        db.session.remove()
+    with worker_a.app_context():
+        assert user_display([CURRENT_USER_ID])[CURRENT_USER_ID]['score'] == 12
+        assert fx_rates().rate('USD') == 1.20
+        assert worker_a.test_client().get('/api/pots').status_code == 200
+        db.session.remove()
+        db.drop_all()
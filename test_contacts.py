@@ -0,0 +1,91 @@
+from app import create_db_and_seed, db, RequestParticipant, User, SARAH_USER_ID
+from contacts import ContactResolver, contact_key, normalize_name, normalize_phone
+
+
+def test_normalization():
+    assert normalize_name('  Sarah   WILLIAMS ') == 'sarah williams'
+    assert normalize_name('Ｓａｒａｈ') == 'sarah'  # full-width letters (NFKC)
+    assert normalize_phone('+1 (222) 222-2222') == '+12222222222'
+    assert normalize_phone('Table 12') is None
+    assert contact_key('+44 20 7946 0000') == ('phone', '+442079460000')
+    assert contact_key('Mike Torres') == ('name', 'mike torres')
+
+
+def test_resolve_matches_names_and_phones(seeded_app):
+    resolver = seeded_app.extensions['contacts']
+    ids = resolver.resolve(db.session, ['sarah williams', 'SARAH  Williams', '+6666666666', '+66 6666-6666'])
+    assert ids == [SARAH_USER_ID] * 4
+
+
+def test_resolve_creates_unknown_contacts_once(seeded_app):
+    users_before = User.query.count()
+    ids = seeded_app.extensions['contacts'].resolve(db.session, ['New Friend', 'new friend', '+49 151 000000'])
+    db.session.commit()
+
+    assert ids[0] == ids[1] != ids[2]
+    assert User.query.count() == users_before + 2
+    friend = db.session.get(User, ids[0])
+    assert (friend.name, friend.phone_number, friend.contact_key) == ('New Friend', None, 'new friend')
+    assert db.session.get(User, ids[2]).phone_number == '+49151000000'
+
+
+def test_resolve_is_bulk_and_cached(seeded_app, statements):
+    resolver = seeded_app.extensions['contacts']
+    names = ['Lisa Thompson', 'James Park', 'Mike Torres', '+5555555555'] + [f'Stranger {i}' for i in range(50)]
+
+    first = resolver.resolve(db.session, names)
+    db.session.commit()
+    verbs = [statement.split()[0].upper() for statement in statements]
+    assert verbs.count('SELECT') == 2  # one per key kind, however long the list
+    assert verbs.count('INSERT') == 1  # all strangers in one bulk insert
+
+    statements.clear()
+    assert resolver.resolve(db.session, names[:4]) == first[:4]
+    assert statements == []  # hot contacts come from the LRU
+
+
+def test_lru_is_bounded(seeded_app):
+    resolver = ContactResolver(User, capacity=2)
+    for name in ['Lisa Thompson', 'James Park', 'Lisa Thompson', 'Mike Torres']:
+        resolver.resolve(db.session, [name])
+    assert len(resolver._cache) == 2
+    assert resolver.hits == 1
+    assert ('name', 'james park') not in resolver._cache
+
+
+def test_contact_key_lookup_uses_index(seeded_app):
+    plan = ' '.join(str(row) for row in db.session.execute(
+        db.text("EXPLAIN QUERY PLAN SELECT id FROM user WHERE contact_key = 'sarah williams'")))
+    assert 'ix_user_contact_key' in plan
+
+
+def test_seed_backfills_missing_contact_keys(seeded_app):
+    db.session.execute(db.text("UPDATE user SET contact_key = NULL WHERE name != 'Adidas'"))
+    db.session.commit()
+    assert seeded_app.extensions['contacts'].lookup(db.session, [('name', 'sarah williams')]) == {}
+
+    create_db_and_seed()
+    assert User.query.filter(User.contact_key.is_(None)).count() == 0
+    assert db.session.get(User, SARAH_USER_ID).contact_key == 'sarah williams'
+    assert seeded_app.extensions['contacts'].lookup(db.session, [('name', 'sarah williams')]) == {
+        ('name', 'sarah williams'): SARAH_USER_ID}
+
+
+def test_create_split_reuses_existing_users(client):
+    users_before = User.query.count()
+    response = client.post('/api/requests/split', json={
+        'title': 'Lunch', 'deadlineHours': 0, 'participants': ['sarah williams', 'Sarah Williams', 'lisa thompson'],
+        'expenses': [{'desc': 'Lunch', 'amount': 90}], 'split_distribution': {'lisa thompson': 10}})
+
+    split_id = response.get_json()['id']
+    participants = RequestParticipant.query.filter_by(request_id=split_id).all()
+    assert User.query.count() == users_before
+    assert len(participants) == 3  # creator, Sarah (once), Lisa
+    assert [p.fixed_split_amount for p in participants if p.fixed_split_amount is not None] == [10]
+
+
+def test_create_invoice_resolves_client(client):
+    response = client.post('/api/requests/invoice', json={
+        'clientName': 'adidas', 'totalWithVat': 100, 'nextSteps': '', 'vat': 0, 'items': []})
+    participant = RequestParticipant.query.filter_by(request_id=response.get_json()['id']).one()
+    assert participant.user.name == 'Adidas'
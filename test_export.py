@@ -0,0 +1,132 @@
+import csv
+import io
+import json
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import (db, compact_ledger, iter_rows, ledger_export_entry,
+                 Comment, Pot, PotTransaction, Request, CURRENT_USER_ID, SARAH_USER_ID)
+from serialization import iter_csv
+
+POT_ID = 'pot-uuid-001'
+
+
+@pytest.fixture
+def client(client):
+    db.session.execute(db.insert(PotTransaction), [{
+        'id': f'ptx-{i:03d}', 'pot_id': POT_ID, 'user_id': CURRENT_USER_ID, 'type': 'Contribution',
+        'description': f'Contribution, "{i}"', 'amount': float(i), 'date': datetime(2025, 1, 1) + timedelta(days=i),
+    } for i in range(100)])
+    db.session.commit()
+    return client
+
+
+def read_csv(response):
+    return list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+
+def read_jsonl(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_ledger_csv(client):
+    response = client.get(f'/api/export/pots/{POT_ID}/ledger')
+    assert response.status_code == 200 and response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+
+    rows = read_csv(response)
+    assert len(rows) == PotTransaction.query.filter_by(pot_id=POT_ID).count()
+    assert rows[0]['id'] == 'ptx-000' and rows[0]['description'] == 'Contribution, "0"'
+    assert rows[0]['user_name'] == 'You (Admin)'
+    assert [r['date'] for r in rows] == sorted(r['date'] for r in rows)
+
+
+def test_ledger_jsonl_and_date_range(client):
+    response = client.get(f'/api/export/pots/{POT_ID}/ledger?format=jsonl&from=2025-01-11&to=2025-01-20')
+    assert response.mimetype == 'application/x-ndjson'
+    rows = read_jsonl(response)
+    assert [r['id'] for r in rows] == [f'ptx-{i:03d}' for i in range(10, 20)]
+    assert rows[0]['amount'] == 10.0 and rows[0]['date'] == '2025-01-11T00:00:00'
+
+
+def test_ledger_export_includes_archived_rows(client):
+    before = read_jsonl(client.get(f'/api/export/pots/{POT_ID}/ledger?format=jsonl'))
+    compact_ledger(datetime(2025, 3, 15), archive='table')
+    assert read_jsonl(client.get(f'/api/export/pots/{POT_ID}/ledger?format=jsonl')) == before
+
+
+def create_invoice(client, name):
+    response = client.post('/api/requests/invoice', json={
+        'clientName': name, 'totalWithVat': 121.0, 'nextSteps': 'Pay by Friday', 'vat': 21,
+        'items': [{'desc': 'Design', 'amount': 60}, {'desc': 'Build', 'amount': 40}]})
+    return response.get_json()['id']
+
+
+def test_request_book_exports(client):
+    invoice_ids = {create_invoice(client, 'Adidas'), create_invoice(client, 'Puma')}
+    client.post('/api/requests/split', json={'title': 'Trip', 'deadlineHours': 0, 'participants': ['Mike Ross'],
+                                             'expenses': [{'desc': 'Hotel', 'amount': 300}]})
+
+    requests = read_csv(client.get('/api/export/requests'))
+    assert {r['id'] for r in requests} == {r.id for r in Request.query.filter_by(creator_id=CURRENT_USER_ID)}
+
+    assert len(requests) == 3
+
+    invoices = read_jsonl(client.get('/api/export/requests?type=invoice&format=jsonl'))
+    assert {r['id'] for r in invoices} == invoice_ids
+    assert invoices[0]['invoice_note'] == 'Pay by Friday'
+
+    items = read_jsonl(client.get('/api/export/requests/items?format=jsonl&type=invoice'))
+    assert sorted(r['description'] for r in items) == ['Build', 'Build', 'Design', 'Design']
+    assert {r['request_id'] for r in items} == invoice_ids
+
+
+def test_comment_export(client):
+    invoice_id = create_invoice(client, 'Adidas')
+    db.session.execute(db.insert(Comment), [{
+        'id': f'c-{i}', 'request_id': invoice_id, 'user_id': SARAH_USER_ID,
+        'text_content': f'Note {i}', 'created_at': datetime(2025, 2, 1 + i),
+    } for i in range(5)])
+    db.session.commit()
+    rows = read_jsonl(client.get(f'/api/export/comments?format=jsonl&request_id={invoice_id}&from=2025-02-02&to=2025-02-04'))
+    assert [r['text'] for r in rows] == ['Note 1', 'Note 2', 'Note 3']
+    # Comments on other people's requests are not part of the export.
+    assert all(r['request_id'] == invoice_id for r in read_jsonl(client.get('/api/export/comments?format=jsonl')))
+
+
+def test_export_errors(client):
+    assert client.get('/api/export/pots/nope/ledger').status_code == 404
+    db.session.execute(db.update(Pot).where(Pot.id == POT_ID).values(admin_id=SARAH_USER_ID))
+    db.session.commit()
+    assert client.get(f'/api/export/pots/{POT_ID}/ledger?format=xml').status_code == 403
+    db.session.execute(db.update(Pot).where(Pot.id == POT_ID).values(admin_id=CURRENT_USER_ID))
+    db.session.commit()
+    assert client.get(f'/api/export/pots/{POT_ID}/ledger?format=xml').status_code == 400
+    assert client.get(f'/api/export/pots/{POT_ID}/ledger?from=yesterday').status_code == 400
+    assert client.get('/api/export/requests?to=2025-13-01').status_code == 400
+
+
+def test_export_memory_does_not_grow_with_rows(client):
+    def peak(n):
+        db.session.execute(db.delete(PotTransaction))
+        db.session.execute(db.insert(PotTransaction), [{
+            'id': f'big-{i}', 'pot_id': POT_ID, 'user_id': CURRENT_USER_ID, 'type': 'Contribution',
+            'description': 'Bulk', 'amount': 1.0, 'date': datetime(2025, 1, 1),
+        } for i in range(n)])
+        db.session.commit()
+        stmt = db.select(PotTransaction.id, PotTransaction.date, PotTransaction.type, PotTransaction.description,
+                         PotTransaction.amount, PotTransaction.currency, PotTransaction.original_amount,
+                         PotTransaction.user_id, db.literal('x').label('user_name'))
+        tracemalloc.start()
+        for _ in iter_csv(['id', 'date', 'type', 'description', 'amount', 'currency', 'original_amount',
+                           'user_id', 'user_name'],
+                          iter_rows(stmt, ledger_export_entry)):
+            pass
+        _, top = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return top
+
+    assert peak(20000) < 2 * peak(2000)
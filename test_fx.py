@@ -0,0 +1,199 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import (db, calculate_net_balances, import_fx_rates, fx_rates,
+                 simplify_debts, Request, RequestItem, RequestParticipant, User,
+                 CURRENT_USER_ID, SARAH_USER_ID)
+from conftest import SLACK
+from fx import MissingRateError, RateTable, parse_currency
+
+SPLIT = 'SPL-MASTER-001'
+POT_ID = 'pot-uuid-001'
+RATES = RateTable([
+    ('USD', date(2025, 1, 1), 1.10),
+    ('USD', date(2025, 3, 1), 1.25),
+    ('GBP', date(2025, 1, 1), 0.80),
+])
+
+
+def test_rates_follow_their_effective_dates():
+    assert RATES.rate('EUR') == 1.0
+    assert RATES.rate('USD', date(2025, 2, 15)) == 1.10
+    assert RATES.rate('USD', date(2025, 3, 1)) == 1.25
+    assert RATES.rate('USD') == 1.25  # today
+    with pytest.raises(MissingRateError):
+        RATES.rate('USD', date(2024, 12, 31))
+    with pytest.raises(MissingRateError):
+        RATES.rate('CHF')
+    assert RATES.currencies == ['EUR', 'GBP', 'USD']
+
+
+def test_convert_is_one_vectorized_step():
+    converted = RATES.convert([125.0, 80.0, 10.0, 0.0], ['USD', 'GBP', 'EUR', 'USD'], 'EUR')
+    assert converted.tolist() == [100.0, 100.0, 10.0, 0.0]
+    assert RATES.convert([100.0], ['GBP'], 'USD').tolist() == [156.25]
+    assert RATES.convert([], [], 'EUR').tolist() == []
+
+
+def test_convert_takes_one_date_per_amount():
+    days = [date(2025, 2, 1), date(2025, 3, 1), date(2025, 2, 1), date(2025, 3, 5)]
+    converted = RATES.convert([110.0, 125.0, 80.0, 10.0], ['USD', 'USD', 'GBP', 'EUR'], 'EUR', on=days)
+    assert converted.tolist() == [100.0, 100.0, 100.0, 10.0]
+    assert RATES.convert([100.0, 100.0], ['EUR', 'EUR'], 'USD', on=days[:2]).tolist() == [110.0, 125.0]
+    with pytest.raises(MissingRateError, match='2024-12-01'):
+        RATES.convert([1.0, 1.0], ['USD', 'USD'], 'EUR', on=[date(2025, 2, 1), date(2024, 12, 1)])
+
+
+def test_net_sums_each_persons_currencies():
+    balances = {('ann', 'EUR'): 50.0, ('ann', 'USD'): -62.5, ('bob', 'GBP'): 8.0, ('bob', 'EUR'): 0.0}
+    assert RATES.net(balances, 'EUR') == pytest.approx({'ann': 0.0, 'bob': 10.0})
+    assert RATES.net({}, 'EUR') == {}
+
+
+def test_parse_currency():
+    assert parse_currency(' usd ') == 'USD'
+    assert parse_currency(None) == 'EUR'
+    assert parse_currency('', default=None) is None
+    for bad in ('US', 'dollars', 12):
+        with pytest.raises(ValueError):
+            parse_currency(bad)
+
+
+def test_simplify_debts_nets_across_currencies():
+    plan = simplify_debts(transactions=[
+        {'payer': 'ann', 'payee': 'bob', 'amount': 125, 'currency': 'USD'},
+        {'payer': 'bob', 'payee': 'ann', 'amount': 40},
+        {'payer': 'carl', 'payee': 'bob', 'amount': 8, 'currency': 'GBP'},
+    ], currency='EUR', rates=RATES)
+    assert sorted((tx['from'], tx['to'], tx['amount']) for tx in plan) == [('ann', 'bob', 60.0), ('carl', 'bob', 10.0)]
+
+
+def test_split_settles_foreign_expenses_in_its_currency(client):
+    created = client.post('/api/requests/split', json={
+        'title': 'New York', 'currency': 'EUR', 'deadlineHours': 0, 'participants': ['Sarah Williams'],
+        'expenses': [{'desc': 'Hotel', 'amount': 216, 'currency': 'usd'}, {'desc': 'Museum', 'amount': 20}],
+    })
+    assert created.status_code == 201
+    assert created.get_json()['currency'] == 'EUR'
+    request_id = created.get_json()['id']
+    # 216 USD at 1.08 per euro is 200 EUR; with the 20 EUR museum, 110 each.
+    assert created.get_json()['amount'] == 220.0
+    shares = {p.user_id: p.net_share for p in RequestParticipant.query.filter_by(request_id=request_id)}
+    assert shares == pytest.approx({CURRENT_USER_ID: 110.0, SARAH_USER_ID: -110.0})
+
+    details = client.get(f'/api/requests/{request_id}').get_json()
+    assert details['currency'] == 'EUR'
+    assert sorted((item['desc'], item['currency']) for item in details['items']) == [('Hotel', 'USD'), ('Museum', 'EUR')]
+
+
+def test_expenses_and_previews_take_a_currency(client):
+    before = client.get(f'/api/requests/{SPLIT}/preview').get_json()['total']
+    preview = client.post(f'/api/requests/{SPLIT}/preview',
+                          json={'add': [{'description': 'Pub', 'amount': 17, 'currency': 'GBP'}]}).get_json()
+    assert preview['currency'] == 'EUR' and preview['total'] == pytest.approx(before + 20.0)
+
+    added = client.post(f'/api/requests/{SPLIT}/expenses', json={  # by the creator: approved right away
+        'description': 'Pub', 'amount': 17, 'currency': 'GBP', 'user_id': SARAH_USER_ID})
+    assert added.status_code == 201 and added.get_json()['item']['currency'] == 'GBP'
+    assert db.session.get(Request, SPLIT).total_amount == pytest.approx(preview['total'])
+
+    for currency in ('XYZ', 'pounds'):
+        response = client.post(f'/api/requests/{SPLIT}/expenses', json={'description': 'x', 'amount': 1, 'currency': currency})
+        assert response.status_code == 400
+    batch = client.post(f'/api/requests/{SPLIT}/expenses/batch', json={'expenses': [
+        {'description': 'ok', 'amount': 1, 'currency': 'CHF'}, {'description': 'bad', 'amount': 1, 'currency': 'XYZ'}]})
+    assert batch.status_code == 400 and batch.get_json()['details'][0]['index'] == 1
+
+
+def test_currencies_need_a_rate_in_effect_today(client):
+    import_fx_rates([('SEK', datetime.utcnow().date() + timedelta(days=30), 11.5)])
+    db.session.commit()
+    items_before = RequestItem.query.filter_by(request_id=SPLIT).count()
+    fika = {'description': 'Fika', 'amount': 50, 'currency': 'SEK', 'user_id': SARAH_USER_ID}
+    assert client.post(f'/api/requests/{SPLIT}/expenses', json=fika).status_code == 400
+    assert client.post(f'/api/requests/{SPLIT}/expenses/batch', json={'expenses': [fika]}).status_code == 400
+    assert client.post(f'/api/requests/{SPLIT}/preview', json={'add': [fika]}).status_code == 400
+    assert RequestItem.query.filter_by(request_id=SPLIT).count() == items_before
+
+    plain = client.post(f'/api/requests/{SPLIT}/expenses', json={'description': 'Cake', 'amount': 5, 'user_id': SARAH_USER_ID})
+    assert plain.status_code == 201
+
+    split = {'title': 'Stockholm', 'deadlineHours': 0, 'participants': ['Sarah Williams']}
+    for currency, expense_currency in (('EUR', 'SEK'), ('SEK', 'USD')):
+        response = client.post('/api/requests/split', json=dict(
+            split, currency=currency, expenses=[{'desc': 'Boat', 'amount': 10, 'currency': expense_currency}]))
+        assert response.status_code == 400
+    in_sek = client.post('/api/requests/split', json=dict(split, currency='SEK', expenses=[{'desc': 'Boat', 'amount': 10}]))
+    assert in_sek.status_code == 201  # nothing to convert
+
+
+def test_foreign_contribution_is_booked_in_the_pot_currency(client):
+    before = client.get(f'/api/pots/{POT_ID}').get_json()
+    assert before['currency'] == 'EUR'
+    response = client.post(f'/api/pots/{POT_ID}/contributions', json={'amount': 54, 'currency': 'USD'})
+    tx = response.get_json()['newTransaction']
+    assert (tx['amount'], tx['originalCurrency'], tx['originalAmount']) == (50.0, 'USD', 54.0)
+    assert response.get_json()['totalBalance'] == pytest.approx(before['totalBalance'] + 50.0)
+
+    plain = client.post(f'/api/pots/{POT_ID}/contributions', json={'amount': 5}).get_json()['newTransaction']
+    assert (plain['amount'], plain['originalCurrency'], plain['originalAmount']) == (5.0, None, None)
+    assert client.post(f'/api/pots/{POT_ID}/contributions', json={'amount': 5, 'currency': 'XYZ'}).status_code == 422
+    assert client.post('/api/pots/nope/contributions', json={'amount': 5, 'currency': 'USD'}).status_code == 404
+
+
+def test_settlements_keep_the_rate_of_each_expense(client):
+    db.session.add(RequestItem(request_id=SPLIT, description='Hotel', amount=108, currency='USD',
+                               paid_by_user_id=SARAH_USER_ID, is_approved=True, created_at=datetime(2025, 2, 1)))
+    db.session.commit()
+    before = calculate_net_balances(SPLIT)['total']
+
+    import_fx_rates([('USD', datetime.utcnow().date(), 2.16)])  # a much weaker dollar, from today on
+    db.session.commit()
+    assert calculate_net_balances(SPLIT)['total'] == pytest.approx(before)  # still 100 EUR
+
+    taxi = {'description': 'Taxi', 'amount': 21.6, 'currency': 'USD'}
+    preview = client.post(f'/api/requests/{SPLIT}/preview', json={'add': [taxi]})
+    assert preview.get_json()['total'] == pytest.approx(before + 10.0)  # added today, at today's rate
+
+
+def test_rate_imports_reload_the_cached_table(seeded_app, statements):
+    assert fx_rates().rate('USD') == 1.08
+    statements.clear()
+    fx_rates()
+    assert not any('fx_rate' in s for s in statements)  # served from the process, not the database
+
+    import_fx_rates([('USD', date(2025, 1, 1), 1.50)])
+    assert fx_rates().rate('USD') == 1.50  # our own transaction sees its import
+    db.session.rollback()
+    assert fx_rates().rate('USD') == 1.08  # the old version is back, and so is the old table
+
+    import_fx_rates([('USD', date(2025, 1, 1), 1.20), ('CHF', date(2025, 6, 1), 0.93)])
+    db.session.commit()
+    assert fx_rates().rate('USD') == 1.20 and fx_rates().rate('CHF', date(2025, 7, 1)) == 0.93
+
+
+def test_settlement_queries_dont_grow_with_foreign_items(seeded_app, statements):
+    rng = random.Random(44)
+    users = [User(name=f'Traveller {i}') for i in range(200)]
+    db.session.add_all(users)
+    db.session.flush()
+    req = Request(id='SPL-TRIP', type='split', title='Trip', creator_id=users[0].id, currency='GBP')
+    db.session.add(req)
+    db.session.add_all([RequestParticipant(request_id=req.id, user_id=user.id) for user in users])
+    db.session.add_all([RequestItem(request_id=req.id, description='x', amount=rng.uniform(1, 100), is_approved=True,
+                                    currency=rng.choice(['EUR', 'USD', 'JPY', None]), paid_by_user_id=user.id)
+                        for user in users for _ in range(5)])
+    db.session.commit()
+
+    fx_rates()
+    statements.clear()
+    started = time.perf_counter()
+    result = calculate_net_balances(req.id)
+    seconds = time.perf_counter() - started
+    assert len(statements) < 15
+    assert seconds < 1.0 * SLACK
+    assert sum(p.net_share for p in RequestParticipant.query.filter_by(request_id=req.id)) == pytest.approx(0, abs=1e-6)
+    assert result['total'] == pytest.approx(db.session.get(Request, req.id).total_amount)
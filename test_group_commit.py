@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app import create_app, create_db_and_seed, db, pot_balances_query, Pot, PotTransaction, User, CURRENT_USER_ID
+from group_commit import GroupCommitWriter
+
+POT_ID = 'pot-uuid-001'
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A file database: the writer thread uses its own pooled connection.
+    database = f'sqlite:///{tmp_path / "maxi.db"}'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database, 'TESTING': True,
+                      'CONTRIBUTION_GROUP_COMMIT': True, 'GROUP_COMMIT_WINDOW_MS': 20})
+    with app.app_context():
+        create_db_and_seed()
+        db.session.remove()
+        yield app
+        writer = app.extensions.get('group_commit')
+        if writer:
+            writer.close()
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def writer(app):
+    writer = GroupCommitWriter(db.engine, PotTransaction.__table__, Pot.__table__, User.__table__, pot_balances_query,
+                               window_ms=20)
+    yield writer
+    writer.close()
+
+
+def balance(pot_id=POT_ID):
+    return db.session.execute(
+        select(func.coalesce(func.sum(PotTransaction.amount), 0.0)).where(PotTransaction.pot_id == pot_id)
+    ).scalar()
+
+
+def test_each_caller_gets_its_own_row(app, writer):
+    start = balance()
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        futures = [pool.submit(lambda n=n: writer.submit(POT_ID, CURRENT_USER_ID, 'Contribution', f'c{n}', n + 1).result())
+                   for n in range(50)]
+        results = [f.result() for f in futures]
+
+    assert sorted(r['transaction']['description'] for r in results) == sorted(f'c{n}' for n in range(50))
+    assert len({r['transaction']['id'] for r in results}) == 50
+    assert all(r['transaction']['user_name'] == 'You (Admin)' for r in results)
+    # Every reported balance includes the caller's own row, the last one includes them all.
+    assert all(r['totalBalance'] >= start + r['transaction']['amount'] for r in results)
+    assert max(r['totalBalance'] for r in results) == pytest.approx(start + sum(range(1, 51)))
+    assert balance() == pytest.approx(start + sum(range(1, 51)))
+    assert writer.rows == 50 and writer.batches < 50
+
+
+def test_acknowledged_rows_are_committed(app, writer):
+    result = writer.submit(POT_ID, CURRENT_USER_ID, 'Contribution', 'durable', 7.0).result()
+    # A brand-new connection (not the writer's) already sees the row.
+    other = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+    with other.connect() as conn:
+        stored = conn.execute(select(PotTransaction.amount).where(PotTransaction.id == result['transaction']['id'])).scalar()
+    other.dispose()
+    assert stored == 7.0
+
+
+def test_bad_row_only_fails_its_caller(app, writer):
+    start = balance()
+    ok, bad = (writer.submit(POT_ID, CURRENT_USER_ID, 'Contribution', 'ok', 1.0),
+               writer.submit(POT_ID, CURRENT_USER_ID, 'Contribution', None, 3.0))  # description is NOT NULL
+    with pytest.raises(Exception):
+        bad.result()
+    assert ok.result()['transaction']['description'] == 'ok'
+    assert balance() == start + 1.0
+
+    # The writer keeps serving after a failed batch.
+    assert writer.submit(POT_ID, CURRENT_USER_ID, 'Contribution', 'after', 2.0).result()['totalBalance'] == start + 3.0
+
+
+def test_contribution_endpoint_uses_group_commit(app):
+    client = app.test_client()
+    start = client.get(f'/api/pots/{POT_ID}').get_json()['totalBalance']
+    response = client.post(f'/api/pots/{POT_ID}/contributions', json={'amount': 12.5, 'description': 'Grouped'})
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['newTransaction']['description'] == 'Grouped'
+    assert body['newTransaction']['user_name'] == 'You (Admin)'
+    assert body['totalBalance'] == start + 12.5
+    assert app.extensions['group_commit'].rows == 1
+    assert client.get(f'/api/pots/{POT_ID}').get_json()['totalBalance'] == start + 12.5
+
+
+def test_contributions_are_validated_before_queueing(app):
+    client = app.test_client()
+    for body in ({'amount': 5, 'description': None}, {'amount': 'nan'}, {'amount': -5}, {}):
+        assert client.post(f'/api/pots/{POT_ID}/contributions', json=body).status_code == 400
+    assert client.post('/api/pots/nope/contributions', json={'amount': 5}).status_code == 404
+    assert 'group_commit' not in app.extensions  # nothing reached the writer
@@ -0,0 +1,94 @@
+import gzip
+
+import pytest
+
+import http_cache
+from app import db, Comment, CURRENT_USER_ID
+
+
+@pytest.fixture
+def client(client):
+    http_cache.stats.reset()
+    return client
+
+
+def revalidate(client, url):
+    first = client.get(url)
+    assert first.status_code == 200 and first.headers['ETag'].startswith('W/')
+    return first, client.get(url, headers={'If-None-Match': first.headers['ETag']})
+
+
+@pytest.mark.parametrize('url', [
+    '/api/pots',
+    '/api/pots/pot-uuid-001',
+    '/api/requests/SPL-MASTER-001',
+    '/api/requests/sent',
+    '/api/requests/received',
+])
+def test_unchanged_resource_returns_304(client, url):
+    first, second = revalidate(client, url)
+    assert second.status_code == 304
+    assert second.data == b''
+    assert second.headers['ETag'] == first.headers['ETag']
+
+
+def test_304_skips_heavy_queries(client):
+    from sqlalchemy import event
+    first = client.get('/api/pots/pot-uuid-001')
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert client.get('/api/pots/pot-uuid-001', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert len(statements) == 1  # just the pot lookup, no sums or feed
+
+
+def test_contribution_invalidates_pot_and_pot_list(client):
+    pot = client.get('/api/pots/pot-uuid-001')
+    pots = client.get('/api/pots')
+    client.post('/api/pots/pot-uuid-001/contributions', json={'amount': 5})
+
+    again = client.get('/api/pots/pot-uuid-001', headers={'If-None-Match': pot.headers['ETag']})
+    assert again.status_code == 200
+    assert again.get_json()['totalBalance'] == 55.0
+    assert client.get('/api/pots', headers={'If-None-Match': pots.headers['ETag']}).status_code == 200
+
+
+def test_comment_invalidates_request_details(client):
+    first = client.get('/api/requests/SPL-MASTER-001')
+    client.post('/api/requests/SPL-MASTER-001/comments', json={'text': 'hi'})
+    again = client.get('/api/requests/SPL-MASTER-001', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 200
+    assert again.get_json()['comments'][-1]['text'] == 'hi'
+
+
+def test_hit_rates_are_reported(client):
+    revalidate(client, '/api/pots/pot-uuid-001')
+    client.get('/api/pots/pot-uuid-001')
+    metrics = client.get('/api/metrics/http-cache').get_json()
+    assert metrics['endpoints']['api.get_pot_details'] == {'hits': 1, 'misses': 2, 'hit_rate': 0.3333}
+
+
+def test_large_bodies_are_gzipped(client):
+    with client.application.app_context():
+        db.session.add_all([Comment(request_id='SPL-MASTER-001', user_id=CURRENT_USER_ID, text_content='x' * 100)
+                            for _ in range(50)])
+        db.session.commit()
+
+    plain = client.get('/api/requests/SPL-MASTER-001')
+    compressed = client.get('/api/requests/SPL-MASTER-001', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.data) == plain.data
+
+    streamed = client.get('/api/requests/SPL-MASTER-001?stream=1', headers={'Accept-Encoding': 'gzip'})
+    assert streamed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(streamed.data).startswith(b'{')
+
+
+def test_small_bodies_are_not_compressed(client):
+    response = client.get('/api/pots', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
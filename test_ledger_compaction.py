@@ -0,0 +1,112 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import (db, compact_ledger, ledger_history_query, pot_balance_query,
+                 Pot, PotSnapshot, PotTransaction, PotTransactionArchive, CURRENT_USER_ID)
+
+POT_ID = 'pot-uuid-001'
+NOW = datetime.utcnow()
+
+
+@pytest.fixture
+def client(client):
+    # Six months of history: one contribution and one expense per month.
+    rows = []
+    for months_ago in range(1, 7):
+        when = NOW - timedelta(days=31 * months_ago)
+        rows += [
+            {'id': f'old-c{months_ago}', 'pot_id': POT_ID, 'user_id': CURRENT_USER_ID, 'type': 'Contribution',
+             'description': 'Old contribution', 'amount': 10.0 * months_ago, 'date': when},
+            {'id': f'old-e{months_ago}', 'pot_id': POT_ID, 'user_id': CURRENT_USER_ID, 'type': 'Expense',
+             'description': 'Old expense', 'amount': -1.0 * months_ago, 'date': when},
+        ]
+    db.session.execute(db.insert(PotTransaction), rows)
+    db.session.commit()
+    return client
+
+
+def pot_state(client):
+    details = client.get(f'/api/pots/{POT_ID}').get_json()
+    summary = {p['id']: p['totalBalance'] for p in client.get('/api/pots').get_json()}
+    return details['totalBalance'], sorted((t['user_id'], t['total_paid']) for t in details['contributionTally']), summary
+
+
+@pytest.mark.parametrize('archive', [None, 'table', 'file'])
+def test_compaction_keeps_balances(client, tmp_path, archive):
+    before = pot_state(client)
+    live_before = PotTransaction.query.count()
+
+    compacted = compact_ledger(NOW, archive=archive, archive_path=tmp_path / 'ledger.jsonl')
+
+    assert compacted == 12
+    assert pot_state(client) == before
+    assert PotSnapshot.query.filter_by(pot_id=POT_ID).count() == 6
+    assert db.session.get(Pot, POT_ID).compacted_until == NOW.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    if archive is None:
+        assert PotTransaction.query.count() == live_before
+    else:
+        assert PotTransaction.query.count() == live_before - 12
+    if archive == 'table':
+        assert PotTransactionArchive.query.count() == 12
+        assert len(db.session.execute(ledger_history_query(POT_ID)).all()) == PotTransaction.query.filter_by(pot_id=POT_ID).count() + 12
+    if archive == 'file':
+        lines = [json.loads(line) for line in (tmp_path / 'ledger.jsonl').read_text().splitlines()]
+        assert sorted(line['id'] for line in lines) == sorted([f'old-c{m}' for m in range(1, 7)] + [f'old-e{m}' for m in range(1, 7)])
+
+
+def test_history_is_complete_after_archiving(client):
+    history_before = db.session.execute(ledger_history_query(POT_ID)).all()
+    compact_ledger(NOW, archive='table')
+    history_after = db.session.execute(ledger_history_query(POT_ID)).all()
+    assert history_after == history_before
+    assert [row.date for row in history_after] == sorted(row.date for row in history_after)
+
+
+def test_compaction_is_incremental(client):
+    compact_ledger(NOW - timedelta(days=31 * 3), archive='table')
+    first = PotSnapshot.query.count()
+    middle = pot_state(client)
+
+    assert compact_ledger(NOW - timedelta(days=31 * 3), archive='table') == 0
+    assert PotSnapshot.query.count() == first
+
+    compact_ledger(NOW, archive='table')
+    assert pot_state(client) == middle
+    assert PotTransactionArchive.query.count() == 12
+
+
+def test_new_activity_lands_in_the_tail(client):
+    compact_ledger(NOW)
+    balance = db.session.execute(pot_balance_query(POT_ID)).scalar()
+    response = client.post(f'/api/pots/{POT_ID}/contributions', json={'amount': 5})
+    assert response.get_json()['totalBalance'] == pytest.approx(balance + 5)
+    assert pot_state(client)[0] == pytest.approx(balance + 5)
+
+
+def test_future_cutoff_keeps_the_current_month_open(client):
+    compact_ledger(datetime(2099, 1, 1))
+    assert db.session.get(Pot, POT_ID).compacted_until == NOW.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    balance = db.session.execute(pot_balance_query(POT_ID)).scalar()
+    response = client.post(f'/api/pots/{POT_ID}/contributions', json={'amount': 100})
+    assert response.get_json()['totalBalance'] == pytest.approx(balance + 100)
+    assert pot_state(client)[0] == pytest.approx(balance + 100)
+
+
+def test_balance_query_only_scans_the_tail(client):
+    compact_ledger(NOW)
+    plan = ' '.join(str(row) for row in db.session.execute(
+        db.text('EXPLAIN QUERY PLAN ' + str(pot_balance_query(POT_ID).compile(compile_kwargs={'literal_binds': True})))))
+    assert 'ix_pot_transaction_pot_date' in plan
+    assert 'SCAN pot_transaction' not in plan
+
+
+def test_compact_ledger_command(client, tmp_path):
+    runner = client.application.test_cli_runner()
+    result = runner.invoke(args=['compact-ledger', '--archive', 'file', '--archive-path', str(tmp_path / 'a.jsonl')])
+    assert result.exit_code == 0, result.output
+    assert 'Compacted 12 ledger rows' in result.output
+    with pytest.raises(ValueError):
+        compact_ledger(NOW, archive='tape')
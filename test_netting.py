@@ -1,30 +1,348 @@
-# CHANGE THIS LINE: Import from 'app', not 'smart_netting'
-from app import simplify_debts  
-
-# --- Scenario: Trip to Paris ---
-# 1. Liability (The Split - "Who Ate What"):
-#    - Dinner (€300): Alice paid. Everyone owes €100.
-#    - Drinks (€100): Bob paid. Everyone owes €33.33.
-# 
-# 2. Net Positions (Calculated by app.py steps 4 & 5):
-#    - Alice: Paid €300, Expected €133.33 -> Net: +€166.67 (Owed)
-#    - Bob:   Paid €100, Expected €133.33 -> Net: -€33.33 (Owes)
-#    - Charlie: Paid €0, Expected €133.33 -> Net: -€133.33 (Owes)
-
-print("--- Testing Smart Netting ---")
-
-# This simulates the input_balances generated in Step 5 of calculate_net_balances
-calculated_net_positions = {
-    'Alice': 166.67,
-    'Bob': -33.33,
-    'Charlie': -133.34  # (Rounded for float balance)
+"""
+Regression harness for the Smart Netting engine (simplify_debts / calculate_net_balances).
+
+Property checks run over randomly generated groups (seeded, so failures reproduce),
+and the timed benchmarks fail when the netting hot path gets slower than its budget.
+
+    pytest -q test_netting.py                    # properties + 10 / 1k / 100k (+ itemized) benchmarks
+    MAXI_BENCH_LARGE=1 pytest -q test_netting.py # also calculate_net_balances at 100k
+    MAXI_BENCH_SLACK=3 pytest -q test_netting.py # loosen budgets on a slow machine
+
+The streaming engine for very large pools (netting.py) is checked here too; its
+10M-balance run with peak memory lives in bench_netting.py.
+"""
+import os
+import random
+import time
+import uuid
+
+import pytest
+
+from app import (db, simplify_debts, calculate_net_balances, parse_shared_by,
+                 User, Request, RequestParticipant, RequestItem, RequestItemShare)
+from conftest import SLACK
+from netting import stream_settlement, stream_transfers
+from shares import itemized_shares
+
+CENT = 0.01
+SEEDS = range(200)
+
+# Seconds allowed for one call (best of a few runs) before we call it a regression.
+BUDGETS = {
+    ('simplify_debts', 10): 0.005,
+    ('simplify_debts', 1000): 0.05,
+    ('simplify_debts', 100000): 2.0,
+    ('calculate_net_balances', 10): 0.1,
+    ('calculate_net_balances', 1000): 1.5,
+    ('calculate_net_balances', 100000): 120.0,
+    ('itemized_shares', 500): 0.1,
+    ('calculate_net_balances_itemized', 300): 1.5,
+    ('stream_transfers', 100000): 1.0,
 }
+LARGE = os.environ.get('MAXI_BENCH_LARGE') == '1'
+
+
+# --- Helpers ---
+def random_balances(rng, n, max_cents=100000):
+    """ n whole-cent balances that sum to exactly zero (as produced by a real split). """
+    cents = [rng.randint(-max_cents, max_cents) for _ in range(n - 1)]
+    cents.append(-sum(cents))
+    return {f'p{i}': c / 100.0 for i, c in enumerate(cents)}
+
+
+def settled_positions(plan):
+    """ Net position implied by a plan: received minus paid, per person. """
+    positions = {}
+    for tx in plan:
+        positions[tx['from']] = positions.get(tx['from'], 0) - tx['amount']
+        positions[tx['to']] = positions.get(tx['to'], 0) + tx['amount']
+    return positions
+
+
+def assert_valid_plan(balances, plan):
+    active = [p for p, amount in balances.items() if abs(round(amount, 2)) > CENT]
+
+    # No self-payments, no zero or negative transfers.
+    for tx in plan:
+        assert tx['from'] != tx['to']
+        assert tx['amount'] > 0
+
+    # Greedy matching settles at least one person per transfer.
+    assert len(plan) <= max(len(active) - 1, 0)
+
+    # Balances conserved: every person ends up where their balance says (to rounding).
+    positions = settled_positions(plan)
+    tolerance = CENT * (len(active) + 1)
+    for person, amount in balances.items():
+        assert positions.get(person, 0) == pytest.approx(amount, abs=tolerance)
+
+
+def best_of(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def assert_within_budget(name, n, seconds):
+    budget = BUDGETS[(name, n)] * SLACK
+    assert seconds <= budget, f"{name} at n={n} took {seconds:.4f}s (budget {budget:.4f}s)"
+
+
+def make_split(n, rng, payers=None, fixed=0):
+    """
+    Bulk-insert a split with n participants. A handful of them pay approved items,
+    and the first `fixed` participants get a fixed_split_amount.
+    """
+    request_id = f'SPL-TEST-{uuid.uuid4().hex[:8]}'
+    user_ids = [f'{request_id}-u{i}' for i in range(n)]
+    payers = payers or max(1, n // 10)
+
+    db.session.execute(db.insert(User), [{'id': u, 'name': f'User {i}', 'phone_number': u} for i, u in enumerate(user_ids)])
+    db.session.execute(db.insert(Request), [{'id': request_id, 'type': 'split', 'title': 'Test split', 'creator_id': user_ids[0]}])
+    db.session.execute(db.insert(RequestParticipant), [{
+        'id': f'{u}-p', 'request_id': request_id, 'user_id': u,
+        'fixed_split_amount': round(rng.uniform(1, 20), 2) if i < fixed else None,
+    } for i, u in enumerate(user_ids)])
+    db.session.execute(db.insert(RequestItem), [{
+        'id': f'{request_id}-i{i}', 'request_id': request_id, 'description': f'Item {i}',
+        'amount': round(rng.uniform(5, 500), 2), 'paid_by_user_id': rng.choice(user_ids), 'is_approved': True,
+    } for i in range(payers)])
+    db.session.commit()
+    return request_id
+
+
+def itemize(request_id, rng, share_of_items=0.5, max_sharers=5):
+    """ Assign about `share_of_items` of the split's items to a few weighted sharers each. """
+    user_ids = [p.user_id for p in RequestParticipant.query.filter_by(request_id=request_id)]
+    rows = []
+    for item in RequestItem.query.filter_by(request_id=request_id):
+        if rng.random() < share_of_items:
+            for u in rng.sample(user_ids, rng.randint(1, min(max_sharers, len(user_ids)))):
+                rows.append({'item_id': item.id, 'user_id': u, 'weight': rng.choice([0.5, 1, 1, 2])})
+    if rows:
+        db.session.execute(db.insert(RequestItemShare), rows)
+    db.session.commit()
+    return rows
+
+
+# --- The original "Trip to Paris" scenario ---
+def test_paris_trip_scenario():
+    # Dinner (€300) paid by Alice, drinks (€100) paid by Bob, everyone owes a third.
+    balances = {'Alice': 166.67, 'Bob': -33.33, 'Charlie': -133.34}
+    plan = simplify_debts(input_balances=dict(balances))
+
+    assert plan == [
+        {'from': 'Charlie', 'to': 'Alice', 'amount': 133.34},
+        {'from': 'Bob', 'to': 'Alice', 'amount': 33.33},
+    ]
+    assert_valid_plan(balances, plan)
+
+
+def test_raw_transactions_are_netted_first():
+    plan = simplify_debts(transactions=[
+        {'payer': 'A', 'payee': 'B', 'amount': 10},
+        {'payer': 'B', 'payee': 'C', 'amount': 10},
+    ])
+    assert plan == [{'from': 'A', 'to': 'C', 'amount': 10.0}]
+
+
+def test_settled_group_needs_no_transfers():
+    assert simplify_debts(input_balances={'A': 0.0, 'B': 0.004, 'C': -0.004}) == []
+
+
+def test_who_ate_what(app):
+    # Alice pays a €120 dinner: she and Bob shared the €90 wine (Bob drank twice as
+    # much), the €30 dessert was for everyone. Charlie only had dessert.
+    db.session.execute(db.insert(User), [{'id': n, 'name': n, 'phone_number': n} for n in ('Alice', 'Bob', 'Charlie')])
+    db.session.execute(db.insert(Request), [{'id': 'SPL-WINE', 'type': 'split', 'title': 'Dinner', 'creator_id': 'Alice'}])
+    db.session.execute(db.insert(RequestParticipant), [
+        {'id': f'{n}-p', 'request_id': 'SPL-WINE', 'user_id': n} for n in ('Alice', 'Bob', 'Charlie')])
+    db.session.execute(db.insert(RequestItem), [
+        {'id': 'wine', 'request_id': 'SPL-WINE', 'description': 'Wine', 'amount': 90.0, 'paid_by_user_id': 'Alice', 'is_approved': True},
+        {'id': 'dessert', 'request_id': 'SPL-WINE', 'description': 'Dessert', 'amount': 30.0, 'paid_by_user_id': 'Alice', 'is_approved': True},
+    ])
+    db.session.execute(db.insert(RequestItemShare), [
+        {'item_id': 'wine', 'user_id': 'Alice', 'weight': 1}, {'item_id': 'wine', 'user_id': 'Bob', 'weight': 2}])
+    db.session.commit()
+
+    result = calculate_net_balances('SPL-WINE')
+
+    shares = {p.user_id: p.net_share for p in RequestParticipant.query.filter_by(request_id='SPL-WINE')}
+    assert shares == pytest.approx({'Alice': 120 - 30 - 10, 'Bob': -60 - 10, 'Charlie': -10})
+    assert sorted((tx['from'], tx['amount']) for tx in result['plan']) == [('Bob', 70.0), ('Charlie', 10.0)]
+
+
+def test_parse_shared_by():
+    assert parse_shared_by(None) == {}
+    assert parse_shared_by(['a', 'b']) == {'a': 1.0, 'b': 1.0}
+    assert parse_shared_by({'a': '2', 'b': 1}) == {'a': 2.0, 'b': 1.0}
+    for bad in ('a', [{}], [['a']], {'a': 0}, {'a': 'inf'}, {'a': 'nan'}, {'a': 'x'}):
+        with pytest.raises(ValueError):
+            parse_shared_by(bad)
+    assert parse_shared_by(['a'], participants={'a', 'b'}) == {'a': 1.0}
+    with pytest.raises(ValueError, match='nobody'):
+        parse_shared_by({'a': 1, 'nobody': 2}, participants={'a', 'b'})
+
+
+def test_itemized_shares_matrix():
+    shares, total = itemized_shares(
+        {'a': 30.0, 'b': 10.0, 'c': 50.0},
+        [('a', 'x', 1), ('a', 'y', 2), ('b', 'z', 1), ('b', 'stranger', 5), ('c', 'stranger', 1), ('gone', 'x', 1)],
+        ['x', 'y', 'z'])
+    # 'c' is only shared by a non-participant, so it stays in the common pool.
+    assert shares == pytest.approx({'x': 10.0, 'y': 20.0, 'z': 10.0})
+    assert total == 40.0
+    assert itemized_shares({'a': 5.0}, [], ['x']) == ({}, 0.0)
+
+
+# --- Properties: simplify_debts ---
+@pytest.mark.parametrize('seed', SEEDS)
+def test_simplify_debts_properties(seed):
+    rng = random.Random(seed)
+    balances = random_balances(rng, rng.randint(2, 60))
+    plan = simplify_debts(input_balances=dict(balances))
+    assert_valid_plan(balances, plan)
+
+
+# --- Properties: calculate_net_balances ---
+@pytest.mark.parametrize('seed', range(25))
+def test_calculate_net_balances_properties(app, seed):
+    rng = random.Random(seed)
+    n = rng.randint(2, 40)
+    request_id = make_split(n, rng, payers=rng.randint(1, n), fixed=rng.randint(0, n // 4))
+
+    result = calculate_net_balances(request_id)
+
+    participants = RequestParticipant.query.filter_by(request_id=request_id).all()
+    items = RequestItem.query.filter_by(request_id=request_id).all()
+    assert result['total'] == pytest.approx(sum(i.amount for i in items))
+    assert db.session.get(Request, request_id).total_amount == pytest.approx(result['total'])
+
+    # Net shares are a zero-sum game.
+    assert sum(p.net_share for p in participants) == pytest.approx(0, abs=1e-6)
+
+    balances = {p.user_id: p.net_share for p in participants}
+    plan = [{'from': tx['from_id'], 'to': tx['to_id'], 'amount': tx['amount']} for tx in result['plan']]
+    assert_valid_plan(balances, plan)
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_itemized_calculate_net_balances_properties(app, seed):
+    rng = random.Random(seed)
+    n = rng.randint(2, 40)
+    request_id = make_split(n, rng, payers=rng.randint(1, 3 * n), fixed=rng.randint(0, n // 4))
+    itemize(request_id, rng)
+
+    result = calculate_net_balances(request_id)
+
+    participants = RequestParticipant.query.filter_by(request_id=request_id).all()
+    items = RequestItem.query.filter_by(request_id=request_id).all()
+    assert result['total'] == pytest.approx(sum(i.amount for i in items))
+    assert sum(p.net_share for p in participants) == pytest.approx(0, abs=1e-6)
+
+    balances = {p.user_id: p.net_share for p in participants}
+    plan = [{'from': tx['from_id'], 'to': tx['to_id'], 'amount': tx['amount']} for tx in result['plan']]
+    assert_valid_plan(balances, plan)
+
+
+# --- Properties: streaming netting ---
+@pytest.mark.parametrize('seed', SEEDS)
+@pytest.mark.parametrize('cap', [None, 2, 3])
+def test_stream_settlement_properties(seed, cap):
+    rng = random.Random(seed)
+    balances = random_balances(rng, rng.randint(2, 60))
+    plan = list(stream_settlement(balances, max_transfers=cap))
+    assert_valid_plan(balances, plan)
+
+    if cap:
+        transfers = {}
+        for tx in plan:
+            transfers[tx['from']] = transfers.get(tx['from'], 0) + 1
+            transfers[tx['to']] = transfers.get(tx['to'], 0) + 1
+        assert max(transfers.values(), default=0) <= cap
+
+
+def test_stream_matches_simplify_debts_uncapped():
+    balances = random_balances(random.Random(7), 50)
+    streamed = list(stream_settlement(iter(balances.items())))  # any iterable of pairs
+    assert len(streamed) == len(simplify_debts(input_balances=dict(balances)))
+    assert sum(tx['amount'] for tx in streamed) == pytest.approx(sum(a for a in balances.values() if a > 0))
+
+
+def test_stream_cap_relays_through_a_creditor():
+    # One debtor owes four creditors; with two transfers each, someone has to pass money on.
+    plan = list(stream_transfers([-400, 100, 100, 100, 100], max_transfers=2))
+    positions = [0] * 5
+    for debtor, creditor, cents in plan:
+        positions[debtor] -= cents
+        positions[creditor] += cents
+    assert positions == [-400, 100, 100, 100, 100]
+    assert all(sum(i in (d, c) for d, c, _ in plan) <= 2 for i in range(5))
+
+
+def test_stream_is_lazy_and_rejects_tiny_caps():
+    transfers = stream_transfers([-100, 100])
+    assert next(transfers) == (0, 1, 100)
+    assert next(transfers, None) is None
+    assert list(stream_transfers([0, 0])) == []
+    with pytest.raises(ValueError):
+        next(stream_transfers([-100, 100], max_transfers=1))
+
+
+# --- Benchmarks ---
+@pytest.mark.parametrize('n', [10, 1000, 100000])
+def test_benchmark_simplify_debts(n):
+    balances = random_balances(random.Random(n), n)
+    seconds = best_of(lambda: simplify_debts(input_balances=dict(balances)))
+    assert_within_budget('simplify_debts', n, seconds)
+
+
+@pytest.mark.parametrize('n', [
+    10,
+    1000,
+    pytest.param(100000, marks=pytest.mark.skipif(not LARGE, reason='set MAXI_BENCH_LARGE=1')),
+])
+def test_benchmark_calculate_net_balances(app, n):
+    request_id = make_split(n, random.Random(n))
+    calculate_net_balances(request_id)  # warm the connection and statement caches
+
+    def run():
+        calculate_net_balances(request_id)
+        db.session.expire_all()  # don't let the identity map hide the load cost
+
+    seconds = best_of(run, repeat=1 if n >= 100000 else 3)
+    assert_within_budget('calculate_net_balances', n, seconds)
+
+
+def test_benchmark_itemized_shares():
+    rng = random.Random(500)
+    people = [f'p{i}' for i in range(500)]
+    amounts = {f'i{i}': rng.uniform(1, 100) for i in range(500)}
+    assignments = [(item, person, rng.choice([1, 2])) for item in amounts for person in rng.sample(people, 50)]
+    seconds = best_of(lambda: itemized_shares(amounts, assignments, people))
+    assert_within_budget('itemized_shares', 500, seconds)
+
+
+def test_benchmark_itemized_calculate_net_balances(app):
+    rng = random.Random(300)
+    request_id = make_split(300, rng, payers=300)
+    itemize(request_id, rng, share_of_items=0.8, max_sharers=30)
+    calculate_net_balances(request_id)
+
+    def run():
+        calculate_net_balances(request_id)
+        db.session.expire_all()
 
-print(f"Net Positions: {calculated_net_positions}")
+    seconds = best_of(run)
+    assert_within_budget('calculate_net_balances_itemized', 300, seconds)
 
-# Run the algorithm
-plan = simplify_debts(input_balances=calculated_net_positions)
 
-print("\n--- Settlement Plan (How to Pay) ---")
-for tx in plan:
-    print(f"{tx['from']} pays {tx['to']} €{tx['amount']:.2f}")
\ No newline at end of file
+def test_benchmark_stream_transfers():
+    rng = random.Random(100000)
+    cents = [rng.randint(-100000, 100000) for _ in range(99999)]
+    cents.append(-sum(cents))
+    seconds = best_of(lambda: sum(1 for _ in stream_transfers(cents)))
+    assert_within_budget('stream_transfers', 100000, seconds)
@@ -0,0 +1,130 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import (db, refresh_scores, calculate_net_balances, user_display,
+                 Request, RequestItem, RequestParticipant, User, CURRENT_USER_ID, SARAH_USER_ID)
+import scores
+from conftest import SLACK
+from scores import ScoreAccumulator
+
+NOW = datetime(2025, 6, 1)
+
+
+def score_of(rows, now=NOW, chunk=None):
+    accumulator = ScoreAccumulator(now)
+    chunk = chunk or len(rows)
+    for start in range(0, len(rows), chunk):
+        accumulator.add(rows[start:start + chunk])
+    return accumulator.scores()
+
+
+def row(user, status, days_ago=60, deadline_days=None, paid_after_days=None):
+    created = NOW - timedelta(days=days_ago)
+    deadline = created + timedelta(days=deadline_days) if deadline_days is not None else None
+    paid_at = created + timedelta(days=paid_after_days) if paid_after_days is not None else None
+    return (user, status, created, deadline, paid_at)
+
+
+def expected(credits):
+    return round(100 * (sum(credits) + scores.PRIOR_WEIGHT * scores.PRIOR) / (len(credits) + scores.PRIOR_WEIGHT))
+
+
+def test_outcomes():
+    terms = scores.DEFAULT_TERMS_DAYS
+    late = terms + scores.LATE_HORIZON_DAYS / 2
+    result = score_of([
+        row('on-time', 'Paid', paid_after_days=1),
+        row('late', 'Paid', paid_after_days=late),
+        row('very-late', 'Paid', deadline_days=2, paid_after_days=200),
+        row('overdue', 'Overdue'),
+        row('disputed', 'Disputed'),
+        row('past-due', 'Promised', days_ago=30),
+        row('not-due', 'Pending', days_ago=1),
+        row('creditor', 'Creditor'),
+    ])
+    assert result == {
+        'on-time': expected([1.0]),
+        'late': expected([1 - scores.LATE_PENALTY / 2]),
+        'very-late': expected([1 - scores.LATE_PENALTY]),
+        'overdue': expected([0.0]),
+        'disputed': expected([scores.DISPUTE_CREDIT]),
+        'past-due': expected([0.0]),
+    }
+
+
+def test_chunking_does_not_change_scores():
+    rng = random.Random(7)
+    statuses = ['Paid', 'Pending', 'Promised', 'Overdue', 'Disputed', 'Creditor', 'Settled']
+    rows = [row(f'user-{rng.randrange(50)}', rng.choice(statuses), rng.randrange(1, 200),
+                rng.choice([None, 2, 10]), rng.choice([None, 0, 5, 40]))
+            for _ in range(2000)]
+    assert score_of(rows, chunk=37) == score_of(rows)
+
+
+def test_refresh_scores_from_database(seeded_app):
+    kevin = db.session.execute(db.select(User).where(User.name == 'Kevin (Guest)')).scalar_one()
+    old = datetime.utcnow() - timedelta(days=90)
+    for n in range(4):
+        req = Request(type='invoice', title=f'Invoice {n}', creator_id=SARAH_USER_ID, created_at=old)
+        db.session.add(req)
+        db.session.flush()
+        db.session.add(RequestParticipant(request_id=req.id, user_id=kevin.id, status='Overdue'))
+    db.session.commit()
+
+    assert refresh_scores([kevin.id]) == 1
+    db.session.refresh(kevin)
+    assert kevin.score == expected([0.0] * 4)
+    assert refresh_scores([kevin.id]) == 0  # unchanged scores are not rewritten
+    assert refresh_scores([]) == 0
+
+
+def test_users_without_history_keep_their_score(seeded_app):
+    refresh_scores()
+    adidas = db.session.execute(db.select(User).where(User.name == 'Adidas')).scalar_one()
+    assert adidas.score == 98
+
+
+def test_settlement_refreshes_changed_participants(seeded_app):
+    # The current user owes on Sarah's split; once Sarah's expense is gone they are settled.
+    req = db.session.get(Request, 'SPL-MASTER-001')
+    req.created_at = req.split_deadline = datetime.utcnow() - timedelta(days=30)
+    db.session.commit()
+    refresh_scores([CURRENT_USER_ID])
+    db.session.commit()
+    before = db.session.get(User, CURRENT_USER_ID).score
+
+    db.session.execute(db.delete(RequestItem).where(RequestItem.request_id == 'SPL-MASTER-001'))
+    calculate_net_balances('SPL-MASTER-001')
+    assert db.session.get(RequestParticipant, db.session.execute(
+        db.select(RequestParticipant.id).where(RequestParticipant.request_id == 'SPL-MASTER-001',
+                                               RequestParticipant.user_id == CURRENT_USER_ID)).scalar()).status == 'Settled'
+    db.session.expire_all()
+    assert db.session.get(User, CURRENT_USER_ID).score > before
+
+
+def test_recompute_scores_command(seeded_app):
+    user_ids = db.session.execute(db.select(User.id)).scalars().all()
+    user_display(user_ids)  # cached before the recompute
+    result = seeded_app.test_cli_runner().invoke(args=['recompute-scores'])
+    assert result.exit_code == 0
+    assert 'Updated' in result.output
+    stored = dict(db.session.execute(db.select(User.id, User.score)).all())
+    assert {user_id: user['score'] for user_id, user in user_display(user_ids).items()} == stored
+
+
+def test_benchmark_full_recompute():
+    """ The numpy core over a million participations, in yield_per-sized chunks. """
+    rng = random.Random(1)
+    statuses = ['Paid', 'Pending', 'Promised', 'Overdue', 'Disputed']
+    base = [row(f'user-{rng.randrange(100000)}', rng.choice(statuses), rng.randrange(1, 365),
+                rng.choice([None, 2]), rng.choice([None, 3, 30]))
+            for _ in range(50000)]
+    started = time.perf_counter()
+    accumulator = ScoreAccumulator(NOW)
+    for _ in range(20):
+        accumulator.add(base)
+    result = accumulator.scores()
+    elapsed = time.perf_counter() - started
+    assert len(result) > 30000
+    assert elapsed < 10.0 * SLACK, f'{elapsed:.1f}s for 1M participations'
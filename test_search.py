@@ -0,0 +1,129 @@
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app import (db, Comment, Pot, PotTransaction, Request, RequestItem, User,
+                 CURRENT_USER_ID, SARAH_USER_ID)
+import search
+from conftest import SLACK
+
+
+def hits(client, query, **params):
+    response = client.get('/api/search', query_string=dict(params, q=query))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_match_query_is_sanitized():
+    assert search.match_query('sushi  Dinner') == '"sushi"* "Dinner"*'
+    assert search.match_query('a"b OR NEAR(c') == '"a"* "b"* "OR"* "NEAR"* "c"*'
+    assert search.match_query(' -*" ') is None
+
+
+def test_seeded_rows_are_indexed(client):
+    body = hits(client, 'sakura')
+    found = {(hit['kind'], hit['title']) for hit in body['results']}
+    assert found == {('request', 'Dinner at Sakura'), ('item', 'Dinner at Sakura')}
+    assert body['has_more'] is False
+    assert all('**' in hit['snippet'] for hit in body['results'])
+
+
+def test_prefix_and_diacritics(client):
+    assert hits(client, 'cons')['results'][0]['snippet'].startswith('**Consulting')
+    comment = client.post('/api/requests/SPL-MASTER-001/comments', json={'text': 'Crème brûlée for everyone'})
+    assert comment.status_code == 201
+    assert [hit['kind'] for hit in hits(client, 'creme brulee')['results']] == ['comment']
+
+
+def test_results_are_ranked(client):
+    db.session.add_all([
+        Comment(request_id='SPL-MASTER-001', user_id=SARAH_USER_ID, text_content='karaoke'),
+        Comment(request_id='SPL-MASTER-001', user_id=SARAH_USER_ID,
+                text_content='karaoke was long, then the long walk home after a long night'),
+    ])
+    db.session.commit()
+    texts = [hit['snippet'] for hit in hits(client, 'karaoke')['results']]
+    assert texts[0] == '**karaoke**'
+    scores = [hit['score'] for hit in hits(client, 'karaoke')['results']]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_visibility(client):
+    # A request and a pot the current user has nothing to do with.
+    db.session.add(Request(id='HIDDEN-1', type='split', title='Secret zanzibar trip', creator_id=SARAH_USER_ID))
+    db.session.add(Pot(id='pot-hidden', name='Zanzibar fund', admin_id=SARAH_USER_ID))
+    db.session.add(PotTransaction(pot_id='pot-hidden', user_id=SARAH_USER_ID, type='Contribution',
+                                  description='zanzibar savings', amount=5))
+    db.session.commit()
+    assert hits(client, 'zanzibar')['results'] == []
+
+    pot, user = db.session.get(Pot, 'pot-hidden'), db.session.get(User, CURRENT_USER_ID)
+    pot.members.append(user)
+    db.session.commit()
+    [hit] = hits(client, 'zanzibar')['results']
+    assert (hit['kind'], hit['pot_id'], hit['title']) == ('pot_transaction', 'pot-hidden', 'Zanzibar fund')
+
+
+def test_index_follows_updates_and_deletes(client):
+    item = db.session.get(RequestItem, db.session.execute(
+        db.select(RequestItem.id).where(RequestItem.description == 'Uber ride (to & from)')).scalar())
+    item.description = 'Taxi ride'
+    db.session.commit()
+    assert hits(client, 'uber')['results'] == []
+    assert [hit['id'] for hit in hits(client, 'taxi')['results']] == [item.id]
+
+    db.session.delete(item)
+    db.session.commit()
+    assert hits(client, 'taxi')['results'] == []
+
+
+def test_filters_and_pagination(client):
+    db.session.add_all([
+        Comment(request_id='SPL-MASTER-001', user_id=SARAH_USER_ID, text_content=f'pagination note {n}',
+                created_at=datetime(2024, 1, n + 1))
+        for n in range(5)
+    ])
+    db.session.commit()
+    first = hits(client, 'pagination', per_page=2)
+    second = hits(client, 'pagination', per_page=2, page=3)
+    assert (len(first['results']), first['has_more']) == (2, True)
+    assert (len(second['results']), second['has_more']) == (1, False)
+    assert len(hits(client, 'pagination', **{'from': '2024-01-02', 'to': '2024-01-03'})['results']) == 2
+    assert hits(client, 'pagination', kind='item')['results'] == []
+
+
+@pytest.mark.parametrize('params', [{}, {'q': '!!'}, {'q': 'x', 'kind': 'user'},
+                                    {'q': 'x', 'page': 'two'}, {'q': 'x', 'from': 'yesterday'}])
+def test_bad_input(client, params):
+    assert client.get('/api/search', query_string=params).status_code == 400
+
+
+def test_rebuild_index(seeded_app):
+    runner = seeded_app.test_cli_runner()
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('DELETE FROM search_index')
+        conn.exec_driver_sql('DELETE FROM search_doc')
+    assert hits(seeded_app.test_client(), 'sakura')['results'] == []
+    result = runner.invoke(args=['rebuild-search-index'])
+    assert 'Indexed' in result.output
+    assert len(hits(seeded_app.test_client(), 'sakura')['results']) == 2
+
+
+def test_search_latency(client):
+    """ Selective queries stay well under 50ms on a 100k-document index. """
+    words = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel']
+    rows = [{'id': str(uuid.uuid4()), 'request_id': 'SPL-MASTER-001', 'user_id': SARAH_USER_ID,
+             'text_content': f'{words[n % 8]} {words[n * 7 % 8]} note {n}', 'created_at': datetime.utcnow()}
+            for n in range(100_000)]
+    db.session.execute(db.insert(Comment), rows)
+    db.session.commit()
+
+    hits(client, 'note 4242')  # warm up
+    started = time.perf_counter()
+    for _ in range(20):
+        body = hits(client, 'note 4242')
+    elapsed = (time.perf_counter() - started) / 20
+    assert body['results'][0]['snippet'].endswith('**note** **4242**')
+    assert elapsed < 0.05 * SLACK, f'{elapsed * 1000:.1f}ms per search'
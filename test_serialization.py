@@ -0,0 +1,99 @@
+import json
+import tracemalloc
+from datetime import datetime
+
+import pytest
+
+from app import create_app, db, Comment, PotTransaction, CURRENT_USER_ID, SARAH_USER_ID
+from serialization import OrjsonProvider, StdlibJSONProvider, iter_json_array, iter_json_object
+
+ENDPOINTS = [
+    '/api/pots/pot-uuid-002',
+    '/api/requests/SPL-MASTER-001',
+    '/api/requests/sent',
+    '/api/requests/received',
+]
+
+
+# Tests taking the client run once per JSON backend.
+EACH_BACKEND = pytest.mark.parametrize('seeded_app', [{'JSON_BACKEND': 'orjson'}, {'JSON_BACKEND': 'stdlib'}],
+                                       ids=['orjson', 'stdlib'], indirect=True)
+
+
+@pytest.fixture
+def client(client):
+    db.session.add_all([
+        Comment(request_id='SPL-MASTER-001', user_id=CURRENT_USER_ID, text_content=f'Comment {i}')
+        for i in range(50)
+    ])
+    db.session.commit()
+    return client
+
+
+def test_backend_selection():
+    assert isinstance(create_app({'JSON_BACKEND': 'orjson'}).json, OrjsonProvider)
+    assert type(create_app({'JSON_BACKEND': 'stdlib'}).json) is StdlibJSONProvider
+    with pytest.raises(ValueError):
+        create_app({'JSON_BACKEND': 'pickle'})
+
+
+@EACH_BACKEND
+@pytest.mark.parametrize('url', ENDPOINTS)
+def test_streamed_response_matches_regular_response(client, url):
+    regular = client.get(url)
+    streamed = client.get(url + '?stream=1')
+
+    assert regular.status_code == streamed.status_code == 200
+    assert streamed.is_streamed
+    assert json.loads(streamed.data) == regular.get_json()
+
+
+@EACH_BACKEND
+def test_streamed_feed_keeps_order(client):
+    data = json.loads(client.get('/api/requests/SPL-MASTER-001?stream=1').data)
+    assert [c['text'] for c in data['comments']] == [f'Comment {i}' for i in range(50)]
+
+
+def test_orjson_encodes_datetimes_and_non_str_keys():
+    app = create_app({'JSON_BACKEND': 'orjson'})
+    encoded = app.json.dumps({1: datetime(2025, 1, 2, 3, 4, 5)})
+    assert json.loads(encoded) == {'1': '2025-01-02T03:04:05'}
+
+
+@pytest.mark.parametrize('backend', ['orjson', 'stdlib'])
+def test_streaming_memory_does_not_grow_with_feed_length(backend):
+    app = create_app({'JSON_BACKEND': backend})
+    row = {'id': 'x' * 36, 'type': 'Contribution', 'description': 'User contributed', 'amount': 20.0}
+
+    def peak(n):
+        with app.app_context():
+            tracemalloc.start()
+            for _ in iter_json_object({'id': 'pot'}, 'transactionFeed', (dict(row) for _ in range(n))):
+                pass
+            _, top = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return top
+
+    assert peak(50000) < 2 * peak(5000)
+
+
+def test_iter_json_array_handles_empty_and_single():
+    app = create_app({'JSON_BACKEND': 'stdlib'})
+    with app.app_context():
+        assert b''.join(iter_json_array([])) == b'[]'
+        assert json.loads(b''.join(iter_json_array([{'a': 1}]))) == [{'a': 1}]
+        assert json.loads(b''.join(iter_json_object({}, 'k', []))) == {'k': []}
+
+
+@EACH_BACKEND
+def test_pot_feed_streams_from_database(client):
+    with client.application.app_context():
+        db.session.execute(db.insert(PotTransaction), [{
+            'id': f'ptx-{i}', 'pot_id': 'pot-uuid-001', 'user_id': SARAH_USER_ID if i % 2 else CURRENT_USER_ID,
+            'type': 'Contribution', 'description': 'Bulk', 'amount': 1.0, 'date': datetime(2024, 1, 1),
+        } for i in range(2000)])
+        db.session.commit()
+
+    data = json.loads(client.get('/api/pots/pot-uuid-001?stream=1').data)
+    assert len(data['transactionFeed']) == 2003
+    assert data['totalBalance'] == pytest.approx(2050.0)
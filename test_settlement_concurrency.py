@@ -0,0 +1,154 @@
+"""
+Optimistic concurrency for settlement (calculate_net_balances / claim_version).
+
+The stress tests approve expenses from a thread pool against a file database and
+then check the stored settlement against a fresh, single-threaded recomputation:
+any lost update would leave a stale total, net share or status behind.
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app as maxi
+from app import (create_app, create_db_and_seed, db, calculate_net_balances, claim_version,
+                 Request, RequestItem, RequestParticipant, StaleWriteError, User, CURRENT_USER_ID)
+
+THREADS = 8
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "maxi.db"}', 'TESTING': True})
+    with app.app_context():
+        create_db_and_seed()
+        db.session.remove()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def make_pending_split(rng, participants=6, items=30):
+    """ A split created by the current user with `items` expenses waiting for approval. """
+    request_id = f'SPL-RACE-{rng.randrange(16 ** 8):08x}'
+    user_ids = [CURRENT_USER_ID] + [f'{request_id}-u{i}' for i in range(1, participants)]
+    db.session.execute(db.insert(User), [{'id': u, 'name': f'User {u[-2:]}', 'phone_number': u} for u in user_ids[1:]])
+    db.session.execute(db.insert(Request), [{'id': request_id, 'type': 'split', 'title': 'Race', 'creator_id': CURRENT_USER_ID}])
+    db.session.execute(db.insert(RequestParticipant), [
+        {'id': f'{u}-{request_id}-p', 'request_id': request_id, 'user_id': u} for u in user_ids])
+    db.session.execute(db.insert(RequestItem), [{
+        'id': f'{request_id}-i{i}', 'request_id': request_id, 'description': f'Item {i}',
+        'amount': round(rng.uniform(1, 100), 2), 'paid_by_user_id': rng.choice(user_ids), 'is_approved': False,
+    } for i in range(items)])
+    db.session.commit()
+    return request_id
+
+
+def stored_settlement(request_id):
+    db.session.expire_all()
+    req = db.session.get(Request, request_id)
+    shares = {p.user_id: (round(p.net_share, 6), p.status)
+              for p in RequestParticipant.query.filter_by(request_id=request_id)}
+    return round(req.total_amount, 6), req.status, shares
+
+
+def approve_all(app, item_ids):
+    def approve(item_id):
+        return app.test_client().post(f'/api/requests/items/{item_id}/approve').status_code
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return list(pool.map(approve, item_ids))
+
+
+def test_concurrent_approvals_lose_no_updates(app):
+    request_id = make_pending_split(random.Random(1))
+    item_ids = [i.id for i in RequestItem.query.filter_by(request_id=request_id)]
+    db.session.remove()
+
+    assert approve_all(app, item_ids) == [200] * len(item_ids)
+
+    after_race = stored_settlement(request_id)
+    expected_total = round(sum(i.amount for i in RequestItem.query.filter_by(request_id=request_id)), 6)
+    assert after_race[0] == expected_total
+    assert sum(share for share, _ in after_race[2].values()) == pytest.approx(0, abs=1e-4)
+    # A quiet recomputation changes nothing: the last write saw every approval.
+    calculate_net_balances(request_id)
+    assert stored_settlement(request_id) == after_race
+
+
+def test_approvals_on_different_requests_run_side_by_side(app):
+    rng = random.Random(2)
+    request_ids = [make_pending_split(rng, items=8) for _ in range(4)]
+    item_ids = [i.id for i in RequestItem.query.filter(RequestItem.request_id.in_(request_ids))]
+    rng.shuffle(item_ids)
+    db.session.remove()
+
+    assert approve_all(app, item_ids) == [200] * len(item_ids)
+
+    for request_id in request_ids:
+        after_race = stored_settlement(request_id)
+        calculate_net_balances(request_id)
+        assert stored_settlement(request_id) == after_race
+
+
+def test_stale_write_is_redone(app, monkeypatch):
+    request_id = make_pending_split(random.Random(3), items=2)
+    RequestItem.query.filter_by(request_id=request_id).update({'is_approved': True})
+    db.session.commit()
+
+    # Another writer gets in between our read and our write, exactly once.
+    calls = []
+    simplify = maxi.simplify_debts
+
+    def interfering(**kwargs):
+        if not calls:
+            db.session.execute(db.update(RequestItem).where(RequestItem.id == f'{request_id}-i0').values(amount=500.0))
+            maxi.bump_version(Request, request_id)
+            db.session.commit()
+        calls.append(1)
+        return simplify(**kwargs)
+
+    monkeypatch.setattr(maxi, 'simplify_debts', interfering)
+    result = calculate_net_balances(request_id)
+
+    assert len(calls) == 2
+    assert result['total'] == stored_settlement(request_id)[0]
+    assert stored_settlement(request_id)[0] == pytest.approx(500.0 + RequestItem.query.get(f'{request_id}-i1').amount)
+
+
+def test_claim_version_is_compare_and_swap(app):
+    version = db.session.get(Request, 'SPL-MASTER-001').version
+    assert claim_version(Request, 'SPL-MASTER-001', version, status='Claimed')
+    assert not claim_version(Request, 'SPL-MASTER-001', version, status='Stale')
+    db.session.commit()
+    db.session.expire_all()
+    req = db.session.get(Request, 'SPL-MASTER-001')
+    assert (req.status, req.version) == ('Claimed', version + 1)
+
+
+def test_endless_contention_gives_up_with_409(app, monkeypatch):
+    monkeypatch.setattr(maxi, 'claim_version', lambda *args, **kwargs: False)
+    monkeypatch.setattr(maxi, 'SETTLEMENT_MAX_ATTEMPTS', 2)
+    with pytest.raises(StaleWriteError):
+        calculate_net_balances('SPL-MASTER-001')
+
+    item = RequestItem.query.filter_by(request_id='INV-MASTER-001').first()
+    req = db.session.get(Request, 'INV-MASTER-001')
+    monkeypatch.setattr(maxi, 'CURRENT_USER_ID', req.creator_id)
+    assert app.test_client().post(f'/api/requests/items/{item.id}/approve').status_code == 409
+
+
+def test_lost_approval_is_rolled_back(app, monkeypatch):
+    monkeypatch.setattr(maxi, 'claim_version', lambda *args, **kwargs: False)
+    monkeypatch.setattr(maxi, 'SETTLEMENT_MAX_ATTEMPTS', 2)
+    req = db.session.get(Request, 'SPL-MASTER-001')
+    before = stored_settlement(req.id), req.version
+    monkeypatch.setattr(maxi, 'CURRENT_USER_ID', req.creator_id)
+    client = app.test_client()
+
+    pending = RequestItem.query.filter_by(request_id=req.id, is_approved=False).first().id
+    assert client.post(f'/api/requests/items/{pending}/approve').status_code == 409
+    assert client.post(f'/api/requests/{req.id}/items/approve', json={'item_ids': [pending]}).status_code == 409
+    db.session.expire_all()
+    assert db.session.get(RequestItem, pending).is_approved is False
+    assert (stored_settlement(req.id), db.session.get(Request, req.id).version) == before
@@ -0,0 +1,122 @@
+from collections import namedtuple
+
+import pytest
+from sqlalchemy import event
+
+import app as maxi
+from app import (db, compute_settlement, calculate_net_balances,
+                 Request, RequestItem, RequestParticipant, SARAH_USER_ID, CURRENT_USER_ID)
+
+SPLIT = 'SPL-MASTER-001'
+Item = namedtuple('Item', 'id amount paid_by_user_id')
+Participant = namedtuple('Participant', 'id user_id status fixed_split_amount')
+
+
+@pytest.fixture
+def writes():
+    """ Every INSERT/UPDATE/DELETE statement run while the test is active. """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split()[0].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def stored_state(request_id):
+    db.session.expire_all()
+    req = db.session.get(Request, request_id)
+    return (req.version, req.total_amount, req.status,
+            sorted((p.user_id, p.net_share, p.status) for p in RequestParticipant.query.filter_by(request_id=request_id)))
+
+
+def shares_of(preview):
+    return {p['user_id']: p['net_share'] for p in preview['participants']}
+
+
+def test_compute_settlement_is_pure():
+    items = [Item('a', 90.0, 'alice'), Item('b', 30.0, 'bob')]
+    participants = [Participant('pa', 'alice', 'Pending', None), Participant('pb', 'bob', 'Pending', None),
+                    Participant('pc', 'carol', 'Paid', None)]
+    result = compute_settlement(items, participants)
+
+    assert result['total'] == 120.0
+    assert result['net_shares'] == pytest.approx({'alice': 50.0, 'bob': -10.0, 'carol': -40.0})
+    assert [p['status'] for p in result['participants']] == ['Creditor', 'Pending', 'Paid']
+    assert result['status'] == '2/3 Paid'
+    assert sorted((tx['from'], tx['amount']) for tx in result['plan']) == [('bob', 10.0), ('carol', 40.0)]
+    assert compute_settlement(items, [])['plan'] == []
+
+
+def test_preview_writes_nothing(client, writes):
+    before = stored_state(SPLIT)
+    pending = RequestItem.query.filter_by(request_id=SPLIT, is_approved=False).first().id
+
+    assert client.get(f'/api/requests/{SPLIT}/preview').status_code == 200
+    assert client.post(f'/api/requests/{SPLIT}/preview', json={
+        'add': [{'description': 'Taxi', 'amount': 30}], 'approve': [pending]}).status_code == 200
+
+    assert writes == []
+    assert stored_state(SPLIT) == before
+
+
+def test_preview_matches_the_real_settlement(client):
+    pending = RequestItem.query.filter_by(request_id=SPLIT, is_approved=False).first().id
+    preview = client.post(f'/api/requests/{SPLIT}/preview', json={'approve': [pending]}).get_json()
+
+    RequestItem.query.get(pending).is_approved = True
+    db.session.commit()
+    result = calculate_net_balances(SPLIT)
+
+    assert preview['total'] == result['total'] == 825.0
+    assert preview['settlement_plan'] == result['plan']
+    stored = {p.user_id: p.net_share for p in RequestParticipant.query.filter_by(request_id=SPLIT)}
+    assert shares_of(preview) == pytest.approx(stored)
+
+
+def test_preview_changes(client):
+    current = client.get(f'/api/requests/{SPLIT}/preview').get_json()
+    assert current['total'] == 750.0
+
+    sushi = RequestItem.query.filter_by(request_id=SPLIT, is_approved=True).first().id
+    assert client.post(f'/api/requests/{SPLIT}/preview', json={'remove': [sushi]}).get_json()['total'] == 0.0
+    assert client.post(f'/api/requests/{SPLIT}/preview', json={'unapprove': [sushi]}).get_json()['settlement_plan'] == []
+
+    added = client.post(f'/api/requests/{SPLIT}/preview', json={'add': [
+        {'description': 'Sake', 'amount': 60, 'user_id': CURRENT_USER_ID, 'shared_by': [CURRENT_USER_ID, SARAH_USER_ID]}]}).get_json()
+    assert added['total'] == 810.0
+    # The current user paid 60 and had half of it: 30 better off than before.
+    assert shares_of(added)[CURRENT_USER_ID] == pytest.approx(shares_of(current)[CURRENT_USER_ID] + 30)
+
+
+def test_preview_is_cached_per_version(client, monkeypatch):
+    calls = []
+    original = maxi.compute_settlement
+    monkeypatch.setattr(maxi, 'compute_settlement', lambda *args: calls.append(1) or original(*args))
+    url = f'/api/requests/{SPLIT}/preview'
+
+    first = client.post(url, json={'add': [{'description': 'Tea', 'amount': 9}]})
+    second = client.post(url, json={'add': [{'description': 'Tea', 'amount': 9}]})
+    assert second.get_json() == first.get_json() and len(calls) == 1
+    assert client.post(url, json={'add': [{'description': 'Tea', 'amount': 9}]},
+                       headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    client.post(f'/api/requests/{SPLIT}/comments', json={'text': 'new version'})
+    third = client.post(url, json={'add': [{'description': 'Tea', 'amount': 9}]})
+    assert third.headers['ETag'] != first.headers['ETag'] and len(calls) == 2
+    assert third.get_json()['version'] == first.get_json()['version'] + 1
+
+
+def test_preview_errors(client):
+    assert client.get('/api/requests/nope/preview').status_code == 404
+    assert client.post(f'/api/requests/{SPLIT}/preview', json={'add': [{'amount': 'x'}]}).status_code == 400
+    assert client.post(f'/api/requests/{SPLIT}/preview', json={'remove': 'abc'}).status_code == 400
+    for key in ('remove', 'unapprove', 'approve'):
+        assert client.post(f'/api/requests/{SPLIT}/preview', json={key: [{}]}).status_code == 400
+        assert client.post(f'/api/requests/{SPLIT}/preview', json={key: [['x']]}).status_code == 400
+    paid_by_a_list = {'description': 'x', 'amount': 1, 'user_id': [1]}
+    assert client.post(f'/api/requests/{SPLIT}/preview', json={'add': [paid_by_a_list]}).status_code == 400
+    assert client.post(f'/api/requests/{SPLIT}/preview', json=[1]).status_code == 400
@@ -0,0 +1,47 @@
+import sqlite3
+import subprocess
+import sys
+
+from app import create_app, db, User
+
+
+def test_import_does_not_load_heavy_backends():
+    code = (
+        "import sys, app\n"
+        "heavy = [m for m in ('google.cloud.vision', 'networkx', 'numpy') if m in sys.modules]\n"
+        "assert not heavy, heavy\n"
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_create_app_does_not_touch_the_database(tmp_path):
+    db_file = tmp_path / 'maxi.db'
+    create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_file}'})
+    assert not db_file.exists()
+
+
+def test_seed_and_reset_commands(tmp_path):
+    flask_app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "maxi.db"}'})
+    runner = flask_app.test_cli_runner()
+
+    assert runner.invoke(args=['seed']).exit_code == 0
+    assert runner.invoke(args=['seed']).exit_code == 0  # seeding twice is a no-op
+    with flask_app.app_context():
+        assert User.query.count() == 7
+        db.session.add(User(name='Extra', phone_number='+0'))
+        db.session.commit()
+
+    result = runner.invoke(args=['reset-db'])
+    assert result.exit_code == 0
+    with flask_app.app_context():
+        assert User.query.count() == 7
+
+
+def test_seed_explains_an_outdated_database(tmp_path):
+    db_file = tmp_path / 'maxi.db'
+    with sqlite3.connect(db_file) as conn:  # a user table from before contact_key
+        conn.execute("CREATE TABLE user (id VARCHAR(36) PRIMARY KEY, name VARCHAR(100) NOT NULL, "
+                     "phone_number VARCHAR(20), score INTEGER)")
+    result = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_file}'}).test_cli_runner().invoke(args=['seed'])
+    assert result.exit_code != 0
+    assert 'user.contact_key' in result.output and 'reset-db' in result.output